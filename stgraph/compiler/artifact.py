@@ -0,0 +1,212 @@
+"""Export and import of compiled contexts as versioned artifacts"""
+
+import functools
+import json
+
+import torch
+
+from .code_gen import code_gen
+from .cpu_kernel import cpu_op_table
+from .execution_unit import ExecutionUnit
+from .op.op import Op
+from .program import Var, Stmt, Program
+from .program_registry import CompiledProgram
+from .schema import Schema
+from .utils import is_const_scalar, var_prefix, ValType, ParallelMode
+
+from stgraph.compiler.debugging.stgraph_logger import print_log
+
+# Bumped whenever the layout of an artifact changes
+ARTIFACT_VERSION = 3
+
+# Node-wise ops whose traced callbacks only depend on the stmt itself
+node_op_table = dict(cpu_op_table)
+node_op_table.update({
+    'sum': lambda stmt, x, *args: x.sum(*args, **stmt.op_schema._params),
+    'view': lambda stmt, x, *args: x.view(-1, *args, **stmt.op_schema._params),
+})
+
+def context_key(func):
+    '''Identifies the function a context was created for across processes'''
+    return '{}.{}:{}'.format(func.__module__, func.__qualname__, func.__code__.co_firstlineno)
+
+def to_tuple(obj):
+    if isinstance(obj, list):
+        return tuple(to_tuple(o) for o in obj)
+    return obj
+
+def export_var(var):
+    return {
+        'val_type': var.val_type.name,
+        'shape': list(var.var_shape),
+        'dtype': str(var.var_dtype),
+        'device': str(var.device) if var.device is not None else None,
+        'requires_grad': var.requires_grad,
+        'grad': var._grad.id if var._grad is not None else None,
+    }
+
+def import_var(var_id, entry):
+    dtype = getattr(torch, entry['dtype'].split('.')[-1]) if entry['dtype'] != 'None' else None
+    device = torch.device(entry['device']) if entry['device'] is not None else None
+    return Var(var_id[len(var_prefix):], ValType[entry['val_type']], list(entry['shape']), dtype, device, entry['requires_grad'])
+
+def export_callback(stmt, nspace):
+    '''
+        Describes how to rebuild the callback of a stmt run by the backend.
+        Ops traced from the module are looked up by name, the callbacks of
+        TorchVal methods are rebuilt from the stmt.
+    '''
+    cells = stmt.callback.__closure__ or ()
+    op = next((cell.cell_contents for cell in cells if isinstance(cell.cell_contents, Op)), None)
+    if op is not None:
+        module, backend_module = nspace
+        for key, m in module._modules.items():
+            if m is op._op:
+                return {'kind': 'module', 'name': key}
+        for key, m in backend_module.__dict__.items():
+            if m is op._op:
+                return {'kind': 'function', 'name': key}
+    elif stmt.op_name.lower() in node_op_table:
+        return {'kind': 'op'}
+    raise NotImplementedError('Cannot export the callback of', stmt.op_name)
+
+def import_callback(stmt, entry, nspace):
+    module, backend_module = nspace
+    if entry['kind'] == 'module':
+        return module._modules[entry['name']]
+    if entry['kind'] == 'function':
+        return getattr(backend_module, entry['name'])
+    return functools.partial(node_op_table[stmt.op_name.lower()], stmt)
+
+def export_unit(unit, nspace):
+    stmts = []
+    for stmt in unit.program:
+        stmts.append({
+            'op': stmt.op_name,
+            'params': stmt.op_schema._params,
+            'args': [{'const': arg} if is_const_scalar(arg) else {'var': arg.id} for arg in stmt.args],
+            'ret': stmt.ret.id,
+            # The kernels of compiled units are rendered, only units run by the backend need callbacks
+            'callback': export_callback(stmt, nspace) if stmt.callback and not unit.compiled else None,
+        })
+    return {
+        'kernel_name': unit.kernel_name,
+        'compiled': unit.compiled,
+        'parallel_mode': unit.parallel_mode().name if unit.parallel_mode() else None,
+        'args': sorted(arg.id for arg in unit._args if not is_const_scalar(arg)),
+        'rets': sorted(ret.id for ret in unit._rets),
+        'tmps': sorted(tmp.id for tmp in unit._tmps),
+        'parents': sorted(parent.kernel_name for parent in unit._parent_units),
+        'stmts': stmts,
+    }
+
+def export_program(compiled, nspace):
+    '''Serializes a CompiledProgram into a dict of plain values'''
+    units = compiled.forward_exe_units + compiled.backward_exe_units
+    # Units hold copies of the vars, merged here by id along with their grads
+    seen = {}
+    pending = list(compiled.rets)
+    for unit in units:
+        pending += [arg for arg in unit._args if not is_const_scalar(arg)] + list(unit._rets) + list(unit._tmps)
+        for stmt in unit.program:
+            pending += [arg for arg in stmt.args if not is_const_scalar(arg)] + [stmt.ret]
+    while pending:
+        var = pending.pop()
+        if var.id not in seen or (seen[var.id]._grad is None and var._grad is not None):
+            seen[var.id] = var
+        if var._grad is not None and var._grad.id not in seen:
+            pending.append(var._grad)
+    return {
+        'vars': {var_id: export_var(var) for var_id, var in sorted(seen.items())},
+        'forward_units': [export_unit(unit, nspace) for unit in compiled.forward_exe_units],
+        'backward_units': [export_unit(unit, nspace) for unit in compiled.backward_exe_units],
+        'rets': [var.id for var in compiled.rets],
+        'input_ids': compiled.input_ids,
+        'source': compiled.source,
+    }
+
+def import_unit(entry, var_map, nspace):
+    def var_or_const(arg):
+        return arg['const'] if 'const' in arg else var_map[arg['var']]
+
+    prog = Program()
+    for st in entry['stmts']:
+        stmt = Stmt.create_stmt(Schema(st['op'], **st['params']), args=[var_or_const(arg) for arg in st['args']], ret=var_map[st['ret']])
+        if st['callback']:
+            stmt.callback = import_callback(stmt, st['callback'], nspace)
+        prog.append_stmt(stmt)
+    unit = ExecutionUnit(set(var_map[i] for i in entry['args']), set(var_map[i] for i in entry['tmps']), prog, entry['compiled'])
+    # The rendered kernels refer to the units by name
+    unit._kernel_name = entry['kernel_name']
+    ExecutionUnit.unit_count = max(ExecutionUnit.unit_count, int(entry['kernel_name'][1:]) + 1)
+    for ret in entry['rets']:
+        unit.add_ret_val(var_map[ret])
+    if entry['parallel_mode']:
+        unit.set_parallel_mode(ParallelMode[entry['parallel_mode']])
+    return unit
+
+def import_program(state, graph_type, target, nspace):
+    '''Rebuilds a CompiledProgram serialized by export_program, compiling its source'''
+    var_map = {var_id: import_var(var_id, entry) for var_id, entry in state['vars'].items()}
+    for var_id, entry in state['vars'].items():
+        if entry['grad']:
+            var_map[var_id].set_grad(var_map[entry['grad']])
+    forward_units = [import_unit(entry, var_map, nspace) for entry in state['forward_units']]
+    backward_units = [import_unit(entry, var_map, nspace) for entry in state['backward_units']]
+    for var_id, entry in state['vars'].items():
+        # Restored after the stmts are created, as create_stmt infers requires_grad
+        var_map[var_id]._requires_grad = entry['requires_grad']
+    units = {unit.kernel_name: unit for unit in forward_units + backward_units}
+    for unit, entry in zip(forward_units + backward_units, state['forward_units'] + state['backward_units']):
+        for parent in entry['parents']:
+            # Parents merged away by horizontal fusion are no longer part of the program
+            if parent in units:
+                unit.add_parent_unit(units[parent])
+
+    compiled_module = None
+    if state['source'] is not None:
+        compiled_module = code_gen.compile_code(state['source'], 'int', graph_type, target)
+    return CompiledProgram(forward_units, backward_units, compiled_module, [var_map[ret] for ret in state['rets']],
+                           state['input_ids'], state['source'])
+
+def save_compiled(module, path):
+    r"""Saves the programs compiled by every STGraph of module and its submodules
+
+    The artifact holds the optimized forward and backward execution units
+    of every traced input signature, along with their parallel modes,
+    kernel argument orders and the rendered kernel source. Loading it into
+    a freshly constructed module with ``load_compiled`` skips tracing,
+    fusion and autodiff, and the kernel compilation hits the kernel cache
+    whenever it holds the modules of the same source.
+
+    Parameters
+    ----------
+
+    module : torch.nn.Module
+        Module whose layers were run at least once with the inputs to serve
+    path : str
+        File the artifact is written to
+    """
+    from .stgraph import STGraph
+    stgraphs = {}
+    for name, m in module.named_modules():
+        for attr, val in vars(m).items():
+            if isinstance(val, STGraph):
+                stgraphs[name + ':' + attr] = val.export_programs()
+    with open(path, 'w') as f:
+        json.dump({'version': ARTIFACT_VERSION, 'stgraphs': stgraphs}, f)
+    print_log(f'[green bold]Artifact[/green bold]: Saved the programs of {len(stgraphs)} STGraph instances to {path}')
+
+def load_compiled(module, path):
+    '''Loads an artifact written by save_compiled into the STGraph instances of module'''
+    from .stgraph import STGraph
+    with open(path) as f:
+        artifact = json.load(f)
+    if artifact.get('version', None) != ARTIFACT_VERSION:
+        raise ValueError('Artifact version {} is not supported, expected {}'.format(artifact.get('version', None), ARTIFACT_VERSION))
+    for name, m in module.named_modules():
+        for attr, val in vars(m).items():
+            key = name + ':' + attr
+            if isinstance(val, STGraph) and key in artifact['stgraphs']:
+                val.load_programs(artifact['stgraphs'][key])
+    print_log(f'[green bold]Artifact[/green bold]: Loaded the programs of {len(artifact["stgraphs"])} STGraph instances from {path}')
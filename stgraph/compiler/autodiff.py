@@ -12,6 +12,7 @@ from .passes.mem_planning import mem_planning
 from .passes import optimize, fuse, visualize
 
 from stgraph.compiler.debugging.stgraph_logger import print_log
+from stgraph.compiler.debugging.compile_profiler import compile_profiler, count_stmts
 
 def diff(vars, grads, forward_units, fprog):
     """The forward graph differentiator
@@ -110,6 +111,10 @@ def diff(vars, grads, forward_units, fprog):
             if processed_count[x] == forward_num_users_of_var[x.id]:
                 q.append(x)
 
+    print_log("[cyan bold]Autodiff[/cyan bold]: Optimizing backward program")
+    optimize(BProg)
+
+    # Looked up after optimizing, as CF replaces grads such as Mul(grad, 1)
     need_grad_var = set()
     output_var = set()
     for unit in forward_units:
@@ -120,22 +125,23 @@ def diff(vars, grads, forward_units, fprog):
                     arg._grad = fprog.find_var_by_id(arg.id)._grad
             for ret in unit.unit_rets():
                 output_var.add(ret)
-    
-    print_log("[cyan bold]Autodiff[/cyan bold]: Optimizing backward program")
-    optimize(BProg)
     #visualize.plot_exec_units(forward_units)
     #visualize.plot_programs([unit._prog for unit in forward_units] + [BProg])
     
     print_log("[cyan bold]Autodiff[/cyan bold]: Gradient Driven MemPlanning")
     output_grad_map = {k:k._grad for k in need_grad_var}
-    bp_prog_list = mem_planning(forward_units, BProg, output_grad_map, grads)
+    with compile_profiler.phase('mem_planning', stmts_before=count_stmts(BProg)) as stats:
+        bp_prog_list = mem_planning(forward_units, BProg, output_grad_map, grads, vars)
+        stats['stmts_after'] = count_stmts(bp_prog_list)
     
     print_log("[cyan bold]Autodiff[/cyan bold]: Optimizing programs of each gradient")
     for prog in bp_prog_list:
         optimize(prog)
         
     print_log("[cyan bold]Autodiff[/cyan bold]: Fusing programs of each gradient")
-    backward_exe_units = fuse(bp_prog_list, [v for _, v in output_grad_map.items()])
+    with compile_profiler.phase('fuse', stmts_before=count_stmts(bp_prog_list)) as stats:
+        backward_exe_units = fuse(bp_prog_list, [v for _, v in output_grad_map.items()])
+        stats['units'] = len(backward_exe_units)
     
     print_log("[cyan bold]Autodiff[/cyan bold]: Completed")
     
@@ -0,0 +1,148 @@
+"""Autotuning of the launch parameters of the generated kernels"""
+
+import hashlib
+import json
+import math
+import os
+import tempfile
+import time
+
+import torch
+
+from stgraph.compiler.debugging.stgraph_logger import print_log
+
+DEFAULT_TUNING_PATH = os.path.join(os.path.expanduser("~"), ".stgraph", "autotune.json")
+# Bumped whenever the meaning of the stored configurations changes
+TUNING_VERSION = 1
+
+
+def size_bucket(n):
+    '''Graphs whose sizes round to the same power of two share their tuned configurations'''
+    return int(math.ceil(math.log2(n))) if n > 0 else 0
+
+def signature_hash(signature):
+    return hashlib.sha256(signature.encode()).hexdigest()[:16]
+
+
+class Autotuner():
+    r"""Benchmarks the launch parameters of the generated kernels
+
+    The launch parameters of the kernels are derived from heuristics: the
+    feature adaptive CUDA kernels pick their thread counts from the feature
+    size only and the OpenMP kernels use every thread with a fixed chunk
+    size. Once an autotuner is set, the first launch of every kernel on a
+    graph looks up the configuration tuned for it. On a miss, the candidate
+    configurations of the kernel are benchmarked on scratch outputs and the
+    fastest one is persisted.
+
+    The results are keyed on a hash of the kernel, the execution target,
+    the graph type and the size of the graph rounded to powers of two.
+    Kernels without a stored configuration keep the heuristic parameters.
+
+    .. code-block:: python
+
+        from stgraph.compiler.autotuner import Autotuner, set_autotuner
+
+        set_autotuner(Autotuner())
+
+    Parameters
+    ----------
+
+    path : str
+        JSON file the tuned configurations are persisted to
+    benchmark : bool
+        Whether missing configurations are benchmarked, otherwise only the
+        persisted ones are used
+    repeats : int
+        Number of timed launches of each candidate
+    """
+    def __init__(self, path=DEFAULT_TUNING_PATH, benchmark=True, repeats=5):
+        assert repeats >= 1, 'Autotuning needs at least one timed launch'
+        self.path = path
+        self.benchmark = benchmark
+        self.repeats = repeats
+        self.results = self.load()
+        self.tuned = 0
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if state.get('version', None) != TUNING_VERSION:
+            return {}
+        return state['results']
+
+    def save(self):
+        '''Atomically rewrites the persisted configurations'''
+        cache_dir = os.path.dirname(self.path) or '.'
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.tmp_', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': TUNING_VERSION, 'results': self.results}, f, indent=1, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def key(self, signature, target, graph_type, num_nodes, num_edges):
+        return '{}:{}:{}:n{}:e{}'.format(signature_hash(signature), target.name, graph_type,
+                                         size_bucket(num_nodes), size_bucket(num_edges))
+
+    def configure(self, kernel, key, tensor_ptrs, sync=None):
+        r"""Applies the configuration tuned for key to the kernel
+
+        Parameters
+        ----------
+
+        kernel : Kernel
+            Kernel to configure, providing candidate_configs and apply_config
+        key : str
+            Key of the kernel and graph, see Autotuner.key
+        tensor_ptrs : list[int]
+            Kernel arguments to benchmark with, the outputs pointing to scratch buffers
+        sync : callable
+            Waits for the launched kernels to finish
+        """
+        config = self.results.get(key, None)
+        candidates = kernel.candidate_configs()
+        if config is None and self.benchmark and len(candidates) > 1:
+            config = self.benchmark_kernel(kernel, candidates, tensor_ptrs, sync)
+            self.results[key] = config
+            self.tuned += 1
+            self.save()
+            print_log(f'[cyan bold]Autotuner[/cyan bold]: Tuned {key} to {config}')
+        kernel.apply_config(config)
+        kernel.tuning_key = key
+
+    def benchmark_kernel(self, kernel, candidates, tensor_ptrs, sync=None):
+        sync = sync if sync else (lambda: None)
+        timings = []
+        for config in candidates:
+            kernel.apply_config(config)
+            # The first launch is a warm-up
+            kernel.run(tensor_ptrs)
+            sync()
+            start = time.perf_counter()
+            for _ in range(self.repeats):
+                kernel.run(tensor_ptrs)
+            sync()
+            timings.append(time.perf_counter() - start)
+        return candidates[timings.index(min(timings))]
+
+
+_autotuner = None
+
+def get_autotuner():
+    '''Returns the process wide autotuner, None unless autotuning was opted into'''
+    return _autotuner
+
+def set_autotuner(tuner):
+    global _autotuner
+    _autotuner = tuner
+    return _autotuner
+
+def cuda_sync():
+    torch.cuda.synchronize()
@@ -10,13 +10,28 @@ class STGraphBackend(ABC):
     def new_zeros_call_back(self, size, dtype, device, requires_grad=True):
         pass
     
+    @abstractmethod
+    def new_empty_call_back(self, size, dtype, device):
+        pass
+    
+    @abstractmethod
+    def fill_zeros_call_back(self, tensor):
+        pass
+    
     @abstractmethod
     def tensor_raw_ptr(self, tensor):
         pass
     
+    @abstractmethod
+    def tensor_data_ptrs(self, tensors):
+        pass
+    
     def backend_cb(self, executor):
         executor.set_new_zeros_cb(self.new_zeros_call_back)
+        executor.set_new_empty_cb(self.new_empty_call_back)
+        executor.set_fill_zeros_cb(self.fill_zeros_call_back)
         executor.set_raw_ptr_cb(self.tensor_raw_ptr)
+        executor.set_data_ptrs_cb(self.tensor_data_ptrs)
         
         return executor.execute(self.kernel_wrapper)
     
\ No newline at end of file
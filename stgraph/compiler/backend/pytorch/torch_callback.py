@@ -17,5 +17,14 @@ class STGraphBackendTorch(STGraphBackend):
             size=size, dtype=dtype, device=device, requires_grad=requires_grad
         )
         
+    def new_empty_call_back(self, size, dtype, device):
+        return torch.empty(size=size, dtype=dtype, device=device)
+        
+    def fill_zeros_call_back(self, tensor):
+        return tensor.zero_()
+        
     def tensor_raw_ptr(self, tensor):
-        return ctypes.c_void_p(tensor.data_ptr())
\ No newline at end of file
+        return ctypes.c_void_p(tensor.data_ptr())
+        
+    def tensor_data_ptrs(self, tensors):
+        return [tensor.data_ptr() for tensor in tensors]
\ No newline at end of file
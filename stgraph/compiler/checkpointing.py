@@ -0,0 +1,51 @@
+"""Activation checkpointing of the tensors saved for backward across timestamps"""
+
+from .utils import CheckpointMode
+
+
+class ActivationCheckpointing():
+    r"""Decides which executions keep their saved tensors on the device
+
+    For temporal models every execution of a compiled function pushes the
+    tensors its backward pass needs onto the executor's stack until
+    backpropagation reaches it. With checkpointing only every ``every``-th
+    execution keeps them. The others either keep just their inputs and
+    recompute the intermediates in backward (``CheckpointMode.RECOMPUTE``)
+    or move the intermediates to pinned host memory
+    (``CheckpointMode.OFFLOAD``).
+
+    .. code-block:: python
+
+        from stgraph.compiler.checkpointing import set_activation_checkpointing
+        from stgraph.compiler.utils import CheckpointMode
+
+        set_activation_checkpointing(CheckpointMode.RECOMPUTE, every=8)
+
+    Parameters
+    ----------
+
+    mode : CheckpointMode
+        What happens to the executions that are not kept
+    every : int
+        Every ``every``-th execution since the start of the backprop window is kept
+    """
+    def __init__(self, mode=CheckpointMode.NONE, every=1):
+        assert every >= 1, 'Checkpointing interval must be at least 1'
+        self.mode = mode
+        self.every = every
+
+    def keeps(self, index):
+        '''Whether the execution at position index of the backprop window keeps its tensors'''
+        return self.mode == CheckpointMode.NONE or index % self.every == 0
+
+
+_activation_checkpointing = ActivationCheckpointing()
+
+def get_activation_checkpointing():
+    '''Returns the process wide checkpointing configuration'''
+    return _activation_checkpointing
+
+def set_activation_checkpointing(mode, every=1):
+    global _activation_checkpointing
+    _activation_checkpointing = ActivationCheckpointing(mode, every)
+    return _activation_checkpointing
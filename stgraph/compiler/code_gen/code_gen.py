@@ -1,12 +1,14 @@
-from ..utils import is_const_scalar, ParallelMode
+from ..utils import is_const_scalar, ParallelMode, ExecutionTarget, WriteLocation, REDUCED_PRECISION_C_DTYPES, EDGE_PARALLEL_GRAPH_TYPES
 from collections import namedtuple
-from .compiler import compile_cuda
+from ..registry import TMP_SUFFIX
+from .compiler import compile_cuda, compile_openmp
 from jinja2 import Environment, PackageLoader
 
 EdgeInfo = namedtuple('EdgeInfo', ['load', 'compute', 'inner_write'])
 NodeInfo = namedtuple('NodeInfo', ['load', 'compute', 'inner_write'])
 ArgInfo = namedtuple('ArgInfo', ['name', 'type', 'is_ptr'])
-AggInfo = namedtuple('AggInfo', ['init', 'compute', 'inner_write', 'outter_write'])
+AggInfo = namedtuple('AggInfo', ['init', 'compute', 'inner_write', 'outter_write', 'state'])
+CarryInfo = namedtuple('CarryInfo', ['tmp', 'write', 'atomic_write'])
 
 const_id = 0
 def gen_arg_info(arg):
@@ -30,14 +32,32 @@ def gen_edge_info(stmt, ctx):
         raise NotImplementedError('Cannot generate code for', stmt)
     return EdgeInfo(**m)
 
+def gen_carry_info(stmt, ctx):
+    '''Adds the partial aggregate of a row split between workers of an edge-balanced kernel'''
+    var = stmt.ret.id + ctx.query_offset(stmt.ret)
+    tmp = stmt.ret.id + TMP_SUFFIX
+    return CarryInfo(tmp=tmp,
+                     write='{var} += {tmp};'.format(var=var, tmp=tmp),
+                     atomic_write='atomicAdd({ptr}, {tmp});'.format(ptr=var.replace('[', '+').rstrip(']'), tmp=tmp))
+
 def gen_node_info(stmt, ctx):
     m = stmt.gen_code(ctx)
     if not m:
         raise NotImplementedError('Cannot generate code for', stmt)
     return NodeInfo(**m)
 
-def gen_code(exe_units, index_type, graph_type):
-    '''Generating cuda code by instantiate code template'''
+def gen_code(exe_units, index_type, graph_type, target=ExecutionTarget.CUDA):
+    '''Generating cuda (or OpenMP C++) code by instantiate code template and compiling it'''
+    return compile_code(render_code(exe_units, index_type, graph_type, target), index_type, graph_type, target)
+
+def compile_code(source, index_type, graph_type, target=ExecutionTarget.CUDA):
+    '''Compiles source rendered by render_code into a loaded module'''
+    if target == ExecutionTarget.OPENMP:
+        return compile_openmp(source, index_type, graph_type)
+    return compile_cuda(source, index_type, graph_type)
+
+def render_code(exe_units, index_type, graph_type, target=ExecutionTarget.CUDA):
+    '''Renders the source of the kernels of the compiled units'''
     if not isinstance(exe_units, list):
         exe_units = [exe_units]
     configs = []
@@ -48,19 +68,23 @@ def gen_code(exe_units, index_type, graph_type):
         nodeinfos = []
         agginfos = []
         edgeinfos = []
+        carryinfos = []
         for var in unit.kernel_args():
             arginfos.append(gen_arg_info(var))
         ctx = unit.create_context(index_type)
-        after_agg = False
+        # Node-wise stmts not depending on an aggregation are evaluated per edge
+        _, _, node_stmts = unit.stmt_sections()
+        node_stmts = set(id(stmt) for stmt in node_stmts)
         for stmt in unit.program:
             ctx.set_stmt_ctx(stmt)
             if stmt.is_agg():
                 agginfos.append(gen_agg_info(stmt, ctx))
-                after_agg = True
+                if ctx.cur_stmt_ctx.write_location == WriteLocation.OUTER:
+                    carryinfos.append(gen_carry_info(stmt, ctx))
             elif stmt.is_edgewise():
                 edgeinfos.append(gen_edge_info(stmt, ctx))
             elif stmt.is_nodewise():
-                if after_agg:
+                if id(stmt) in node_stmts:
                     nodeinfos.append(gen_node_info(stmt, ctx))
                 else:
                     edgeinfos.append(gen_edge_info(stmt, ctx))
@@ -78,19 +102,29 @@ def gen_code(exe_units, index_type, graph_type):
             'col_index': 'src_id' if dst_parallel else 'dst_id',
             'init_inner_offset': (ctx.src_var_offset_init if dst_parallel else ctx.dst_var_offset_init) + ctx.edge_var_offset_init,
             'template_name': ctx.template_name,
-            'graph_type': graph_type
+            'graph_type': graph_type,
+            'edge_parallel': unit.supports_edge_parallel() and graph_type in EDGE_PARALLEL_GRAPH_TYPES,
+            'carries': carryinfos,
         })
-    return gen_cuda(configs)
+    if target == ExecutionTarget.OPENMP:
+        return render_openmp(configs, index_type, graph_type)
+    return render_cuda(configs, index_type, graph_type)
 
-def render_template(config, template_name):
+def render_template(config, template_name, template_dir='fa'):
     env = Environment(
     loader=PackageLoader("stgraph.compiler.code_gen"),
     )
-    tpl = env.get_template("fa/{}.jinja".format(template_name))
+    tpl = env.get_template("{}/{}.jinja".format(template_dir, template_name))
     return tpl.render(**config)
 
-def gen_cuda(configs):
+def uses_reduced_precision(configs):
+    return any(arg.type in REDUCED_PRECISION_C_DTYPES for config in configs for arg in config['args'])
+
+def render_cuda(configs, index_type='int', graph_type=''):
     h = ''
+    if uses_reduced_precision(configs):
+        # Only included when needed, the headers are large and not found by nvrtc
+        h = render_template({}, "tpl_fa_header")
     for config in configs:
         if config['template_name'] == 'fa':
             if config['graph_type'] == 'csr':
@@ -107,10 +141,34 @@ def gen_cuda(configs):
                 rendered_tpl = render_template(config, "tpl_fa_gpma_unsorted")
             else:
                 raise NotImplementedError('{} Template for {} is not supported'.format(config['template_name'],config['graph_type']))
+            if config['edge_parallel']:
+                rendered_tpl += render_template(config, "tpl_fa_csr_ep")
         elif config['template_name'] == 'v2':
             raise NotImplementedError('{} Template for {} is not supported'.format(config['template_name'],config['graph_type']))
         else:
             raise NotImplementedError('{} Template not supported'.format(config['template_name']))
         h += rendered_tpl
     
-    return compile_cuda(h)
+    return h
+
+def render_openmp(configs, index_type='int', graph_type=''):
+    h = render_template({}, "tpl_omp_header", "omp")
+    for config in configs:
+        if config['template_name'] == 'fa':
+            if config['graph_type'] == 'csr':
+                rendered_tpl = render_template(config, "tpl_omp_csr", "omp")
+            elif config['graph_type'] == 'csr_unsorted':
+                rendered_tpl = render_template(config, "tpl_omp_csr_unsorted", "omp")
+            elif config['graph_type'] == 'pcsr':
+                rendered_tpl = render_template(config, "tpl_omp_pcsr", "omp")
+            elif config['graph_type'] == 'gpma':
+                rendered_tpl = render_template(config, "tpl_omp_gpma", "omp")
+            else:
+                raise NotImplementedError('OpenMP {} Template for {} is not supported'.format(config['template_name'],config['graph_type']))
+            if config['edge_parallel']:
+                rendered_tpl += render_template(config, "tpl_omp_csr_ep", "omp")
+        else:
+            raise NotImplementedError('OpenMP {} Template not supported'.format(config['template_name']))
+        h += rendered_tpl
+
+    return h
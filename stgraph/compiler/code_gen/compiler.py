@@ -1,44 +1,105 @@
 from .cuda_driver import *
 from pynvrtc.compiler import Program, ProgramException
 from .device_info import DeviceInfo
+from .kernel_cache import get_kernel_cache
+from ..debugging.compile_profiler import compile_profiler
 import subprocess
 import ctypes
+import os
+import platform
+import shutil
+import tempfile
 import snoop
 from ctypes import c_void_p, c_char_p, byref
 from .cuda_error import ASSERT_DRV
 
-PTX_PATH='./egl_kernel.ptx'
-CU_PATH='./egl_kernel.cu'
+NVCC_FLAGS = ['-ptx', '-lineinfo']
+GXX_FLAGS = ['-O3', '-march=native', '-fopenmp', '-shared', '-fPIC']
 
 
-def compile_with_nvcc(cuda_text):
-    with open(CU_PATH, 'w+') as f:
+def compile_with_nvcc(cuda_text, build_dir, arch):
+    cu_path = os.path.join(build_dir, 'egl_kernel.cu')
+    ptx_path = os.path.join(build_dir, 'egl_kernel.ptx')
+    with open(cu_path, 'w+') as f:
         f.write(cuda_text)
-    device = DeviceInfo()
-    nvcc_path = device.nvcc_path
-    cp = str(device.cc_major * 10 + device.cc_minor)
-    extra_flags = ' -lineinfo'
-    cmd = nvcc_path + ' ' + CU_PATH + ' -arch=compute_' + cp + ' -ptx ' + extra_flags
+    nvcc_path = DeviceInfo().nvcc_path
+    cmd = [nvcc_path, cu_path, '-arch=' + arch, '-o', ptx_path] + NVCC_FLAGS
 
     # Trying to set max register count
-    # cmd = nvcc_path + ' ' + CU_PATH + ' -arch=compute_' + cp + ' -ptx ' + ' -maxrregcount=32 ' + extra_flags
+    # cmd += ['-maxrregcount=32']
 
-    ret = subprocess.check_output(cmd, shell=True)
+    ret = subprocess.check_output(cmd)
+    return ptx_path
 
-def compile_with_nvrtc(cuda_text):
+def compile_with_nvrtc(cuda_text, build_dir, arch):
+    ptx_path = os.path.join(build_dir, 'egl_kernel.ptx')
     c = Program(cuda_text)
-    device = DeviceInfo()
-    cp = str(device.cc_major * 10 + device.cc_minor)
-    ptx = c.compile(['-arch=compute_' + cp])
-    with open(PTX_PATH, 'w+') as f:
+    ptx = c.compile(['-arch=' + arch])
+    with open(ptx_path, 'w+') as f:
         f.write(ptx)
+    return ptx_path
 
-def compile_cuda(cuda_text):
+def cuda_arch():
+    device = DeviceInfo()
+    return 'compute_' + str(device.cc_major * 10 + device.cc_minor)
+
+def host_arch():
+    '''Identifies the host CPU, kernels built with -march=native are only valid on it'''
+    model = ''
     try:
-        compile_with_nvcc(cuda_text)
-        char_p = (PTX_PATH).encode()
-        ret, cu_module = cuModuleLoad(char_p)
-        ASSERT_DRV(ret)
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    model = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return platform.machine() + ' ' + (model or platform.processor())
+
+def load_ptx(ptx_path):
+    ret, cu_module = cuModuleLoad(ptx_path.encode())
+    if ret in (cuda.CUresult.CUDA_ERROR_FILE_NOT_FOUND, cuda.CUresult.CUDA_ERROR_INVALID_PTX,
+               cuda.CUresult.CUDA_ERROR_INVALID_IMAGE):
+        raise OSError('Cannot load {}: {}'.format(ptx_path, ret))
+    ASSERT_DRV(ret)
+    return cu_module
+
+def compile_cuda(cuda_text, index_type='int', graph_type=''):
+    try:
+        cache = get_kernel_cache()
+        arch = cuda_arch()
+        key = cache.key(cuda_text, index_type, graph_type, NVCC_FLAGS, arch)
+        cu_module = cache.load(key, '.ptx', load_ptx)
+        with compile_profiler.phase('compiler', compiler='nvcc', source_bytes=len(cuda_text), cache_hit=cu_module is not None):
+            if cu_module is None:
+                with tempfile.TemporaryDirectory(prefix='stgraph_') as build_dir:
+                    ptx_path = cache.store(key, '.ptx', compile_with_nvcc(cuda_text, build_dir, arch))
+                cu_module = load_ptx(ptx_path)
         return cu_module
     except Exception as e:
         raise e
+
+def compile_with_gxx(cpp_text, build_dir):
+    cpp_path = os.path.join(build_dir, 'egl_kernel.cpp')
+    so_path = os.path.join(build_dir, 'egl_kernel.so')
+    with open(cpp_path, 'w+') as f:
+        f.write(cpp_text)
+    gxx_path = shutil.which('g++')
+    if not gxx_path:
+        raise RuntimeError('g++ is required to compile OpenMP kernels')
+    cmd = [gxx_path, cpp_path, '-o', so_path] + GXX_FLAGS
+    ret = subprocess.check_output(cmd)
+    return so_path
+
+def compile_openmp(cpp_text, index_type='int', graph_type=''):
+    # Cached modules are content addressed, so reloading a path always
+    # refers to the same code even though dlopen reuses loaded libraries
+    cache = get_kernel_cache()
+    key = cache.key(cpp_text, index_type, graph_type, GXX_FLAGS, host_arch())
+    module = cache.load(key, '.so', ctypes.CDLL)
+    with compile_profiler.phase('compiler', compiler='g++', source_bytes=len(cpp_text), cache_hit=module is not None):
+        if module is None:
+            with tempfile.TemporaryDirectory(prefix='stgraph_') as build_dir:
+                so_path = cache.store(key, '.so', compile_with_gxx(cpp_text, build_dir))
+            module = ctypes.CDLL(so_path)
+    return module
@@ -0,0 +1,166 @@
+"""Persistent on-disk cache of compiled kernel modules"""
+
+import hashlib
+import os
+import tempfile
+
+from stgraph.compiler.debugging.stgraph_logger import print_log
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".stgraph", "kernel_cache")
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class KernelCache():
+    r"""Content addressed cache of compiled kernel modules
+
+    Every entry is a single file named after the hash of everything that
+    influences the compiled binary: the rendered source, the index type,
+    the graph type, the compiler flags and the target architecture.
+    Entries are written to a temporary file first and then renamed into
+    place, so concurrent workers sharing the cache directory never observe
+    a partially written module.
+
+    The cache is bounded in size. Looking up an entry refreshes its
+    modification time and once the total size exceeds ``max_bytes`` the
+    least recently used entries are evicted.
+
+    Parameters
+    ----------
+
+    cache_dir : str
+        Directory holding the cached modules
+    max_bytes : int
+        Upper bound on the total size of the cached modules
+    """
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, source, index_type, graph_type, flags, arch):
+        h = hashlib.sha256()
+        for part in (source, index_type, graph_type, ' '.join(flags), arch):
+            h.update(str(part).encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def lookup(self, key, suffix):
+        '''Returns the path of the cached module or None on a miss'''
+        path = self.path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            print_log(f'[cyan bold]Kernel Cache[/cyan bold]: Miss for {key[:16]}')
+            return None
+        self.hits += 1
+        print_log(f'[cyan bold]Kernel Cache[/cyan bold]: Hit for {key[:16]}')
+        return path
+
+    def load(self, key, suffix, loader):
+        '''
+            Returns loader applied to the path of the cached module or None on
+            a miss. A module that cannot be loaded, because another worker
+            evicted it after the lookup or it is damaged, is dropped and
+            counted as a miss so that it gets compiled again.
+        '''
+        path = self.lookup(key, suffix)
+        if path is None:
+            return None
+        try:
+            return loader(path)
+        except OSError as e:
+            self.hits -= 1
+            self.misses += 1
+            print_log(f'[cyan bold]Kernel Cache[/cyan bold]: Cannot load {key[:16]}, recompiling ({e})')
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+    def store(self, key, suffix, src_path):
+        '''Atomically moves the module at src_path into the cache and returns its new path'''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp_', suffix=suffix)
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(src_path, 'rb') as src:
+                dst.write(src.read())
+            os.replace(tmp_path, self.path(key, suffix))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.evict(keep=self.path(key, suffix))
+        return self.path(key, suffix)
+
+    def entries(self):
+        '''Returns (mtime, size, path) of every cached module'''
+        ret = []
+        if not os.path.isdir(self.cache_dir):
+            return ret
+        for name in os.listdir(self.cache_dir):
+            if name.startswith('.tmp_'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                # Evicted by another worker in the meantime
+                continue
+            ret.append((st.st_mtime, st.st_size, path))
+        return ret
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self, keep=None):
+        '''Removes the least recently used modules until the cache fits in max_bytes'''
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries()),
+            'bytes': self.size(),
+        }
+
+
+_kernel_cache = None
+
+def get_kernel_cache():
+    '''Returns the process wide kernel cache'''
+    global _kernel_cache
+    if _kernel_cache is None:
+        _kernel_cache = KernelCache()
+    return _kernel_cache
+
+def set_kernel_cache(cache):
+    '''Replaces the process wide kernel cache, e.g. to relocate or bound it differently'''
+    global _kernel_cache
+    _kernel_cache = cache
@@ -22,7 +22,8 @@ class KernelContext():
 
     def init_offset_cache(self):
         for s in self.unit.program:
-            for arg in self.kernel_argument_used_in_stmt(s):
+            # Sorted so that the generated source is identical across runs
+            for arg in sorted(self.kernel_argument_used_in_stmt(s), key=lambda x: x.id):
                 offset_key = self.get_offset_key(arg)
                 if offset_key not in self.offset_cache:
                     offset = self.query_offset(arg).strip('[]')
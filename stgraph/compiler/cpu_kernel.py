@@ -0,0 +1,287 @@
+"""Reference CPU execution of compiled execution units"""
+
+import ctypes
+
+import numpy as np
+import torch
+
+from .utils import is_const_scalar, ParallelMode
+
+
+def _negative_slope(stmt):
+    return stmt.op_schema._params['negative_slope']
+
+def _leaky_relu(stmt, x):
+    return torch.where(x > 0, x, x * _negative_slope(stmt))
+
+def _backward_leaky_relu(stmt, x):
+    return torch.where(x > 0, torch.ones_like(x), torch.full_like(x, _negative_slope(stmt)))
+
+def _backward_relu(stmt, x, grad):
+    return torch.where(x > 0, grad, torch.zeros_like(grad))
+
+def _backward_amax(stmt, x, y):
+    # Rounded like the stored result it is compared with
+    x_stored = x.to(stmt.args[1].var_dtype).to(x.dtype)
+    return (x_stored == y).to(x.dtype)
+
+def _clamp(stmt, x):
+    low, high = stmt.op_impl.bounds()
+    return torch.clamp(x, low, high)
+
+def _backward_clamp(stmt, x):
+    low, high = stmt.op_schema._params['min'], stmt.op_schema._params['max']
+    inside = torch.ones_like(x, dtype=torch.bool)
+    if low is not None:
+        inside &= x >= low
+    if high is not None:
+        inside &= x <= high
+    return inside.to(x.dtype)
+
+# Element-wise ops keyed the same way as impl_registry. Each entry mirrors the
+# expression emitted by the gen_code method of the corresponding OpImpl.
+cpu_op_table = {
+    'add': lambda stmt, x, y: x + y,
+    'sub': lambda stmt, x, y: x - y,
+    'mul': lambda stmt, x, y: x * y,
+    'truediv': lambda stmt, x, y: x / y,
+    'exp': lambda stmt, x: torch.exp(x),
+    'relu': lambda stmt, x: torch.relu(x),
+    'backwardrelu': _backward_relu,
+    'leakyrelu': _leaky_relu,
+    'backwardleakyrelu': _backward_leaky_relu,
+    'backwardamax': _backward_amax,
+    'sigmoid': lambda stmt, x: torch.sigmoid(x),
+    'backwardsigmoid': lambda stmt, y: y * (1 - y),
+    'tanh': lambda stmt, x: torch.tanh(x),
+    'backwardtanh': lambda stmt, y: 1 - y * y,
+    'clamp': _clamp,
+    'hardtanh': _clamp,
+    'relu6': _clamp,
+    'backwardclamp': _backward_clamp,
+}
+
+# Aggregation ops mapped to their scatter reduction
+cpu_agg_table = {
+    'aggsum': 'sum',
+    'aggmax': 'amax',
+    'aggmin': 'amin',
+    'aggmean': 'mean',
+    'aggcount': 'count',
+}
+
+def host_array(ptr, size):
+    '''Wraps an int32 array living in host memory without copying it'''
+    if size == 0:
+        return torch.zeros(0, dtype=torch.int32)
+    buf = (ctypes.c_int * size).from_address(ptr)
+    return torch.from_numpy(np.ctypeslib.as_array(buf))
+
+def fit_to_shape(val, shape):
+    '''
+        Brings a computed value to the shape of the var that stores it.
+        A ret var that is narrower than its arguments is the result of a
+        reduction that the CUDA kernels implement with atomic writes, hence
+        the broadcast dimensions are summed.
+    '''
+    if list(val.shape) == shape:
+        return val
+    if val.dim() == len(shape) and all(v == s or s == 1 for v, s in zip(val.shape, shape)):
+        return val.sum_to_size(shape)
+    return val.expand(shape)
+
+def merge_path_partition(row_offsets, num_workers):
+    '''
+        Splits the merge path of the row ends and the edges of a CSR into
+        even shares, the way the edge-balanced kernels do. Returns the rows
+        and the edges preceding the start of every share, the last entries
+        being the number of rows and edges.
+    '''
+    num_nodes = len(row_offsets) - 1
+    num_edges = int(row_offsets[-1])
+    items = num_nodes + num_edges
+    items_per_worker = (items + num_workers - 1) // num_workers
+    diagonals = torch.clamp(torch.arange(num_workers + 1) * items_per_worker, max=items)
+    # The end of row i is preceded by the edges up to row_offsets[i+1] and the i row ends before it
+    row_ends = row_offsets[1:] + torch.arange(num_nodes)
+    rows = torch.searchsorted(row_ends, diagonals)
+    return rows, diagonals - rows
+
+class CPUKernel():
+    r"""Vectorized CPU execution of a compiled execution unit
+
+    Instead of launching a generated kernel, the program of the unit is
+    evaluated with torch over the whole graph at once. Node-wise statements
+    run over node tensors, edge-wise statements run over edge tensors that
+    are gathered through the CSR arrays, and aggregations scatter the edge
+    values back into node tensors with ``index_add_``/``scatter_reduce_``.
+
+    The graph pointers passed to this kernel must point to host memory.
+
+    Parameters
+    ----------
+
+    unit : ExecutionUnit
+        The compiled execution unit to run
+    num_nodes : int
+        Number of nodes present in the graph
+    row_offsets_ptr : int
+        Host pointer to the row offset array
+    col_indices_ptr : int
+        Host pointer to the column indices array
+    eids_ptr : int
+        Host pointer to the edge id array
+    node_ids_ptr : int
+        Host pointer to the degree sorted node id array
+    edge_parallel : bool
+        Whether the aggregations written per row split the edges evenly
+        between workers instead of assigning rows to them, see
+        merge_path_partition
+    """
+    NODE = 0
+    EDGE = 1
+    EDGE_BY_EID = 2
+    PARAM = 3
+
+    def __init__(self, unit, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, edge_parallel=False):
+        self.unit = unit
+        self.edge_parallel = edge_parallel
+        self._graph_key = None
+        self.reset_graph_info(num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr)
+
+    def reset_graph_info(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr):
+        graph_key = (num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr)
+        if graph_key == self._graph_key:
+            return
+        if row_offsets_ptr is None:
+            # Dynamic graphs expose their backward CSR once backprop starts
+            return
+        row_offsets = host_array(row_offsets_ptr, num_nodes + 1).long()
+        num_edges = int(row_offsets[-1]) if num_nodes > 0 else 0
+        col_indices = host_array(col_indices_ptr, num_edges).long()
+        row_ids = torch.repeat_interleave(torch.arange(num_nodes), row_offsets.diff())
+        if self.unit.parallel_mode() == ParallelMode.DstParallel:
+            self.dst_ids, self.src_ids = row_ids, col_indices
+        else:
+            self.src_ids, self.dst_ids = row_ids, col_indices
+        self.eids = host_array(eids_ptr, num_edges).long()
+        if self.edge_parallel:
+            num_workers = max(1, min(torch.get_num_threads() * 4, num_nodes + num_edges))
+            self.share_slots = self.partition_slots(row_offsets, row_ids, num_workers)
+        self.num_nodes = num_nodes
+        self.num_edges = num_edges
+        self._graph_key = graph_key
+
+    def run(self, tensor_list):
+        env = {}
+        outputs = {}
+        rets = set(self.unit.unit_rets())
+        for var, tensor in zip(self.unit.kernel_args(), tensor_list):
+            if var in rets:
+                outputs[var.id] = tensor
+            else:
+                env[var.id] = self.bind_arg(var, tensor)
+
+        for stmt in self.unit.program:
+            ret = stmt.ret
+            op_name = stmt.op_name.lower()
+            if stmt.is_agg():
+                if op_name not in cpu_agg_table:
+                    raise NotImplementedError('CPU execution for', stmt.op_name, 'is not implemented')
+                val = fit_to_shape(self.edge_value(stmt.args[0], env), [self.num_edges] + list(ret.var_shape))
+                env[ret.id] = (CPUKernel.NODE, self.aggregate(val, ret, cpu_agg_table[op_name]))
+            else:
+                if op_name not in cpu_op_table:
+                    raise NotImplementedError('CPU execution for', stmt.op_name, 'is not implemented')
+                if stmt.is_edgewise():
+                    level, rows = CPUKernel.EDGE, self.num_edges
+                    vals = [self.edge_value(arg, env) for arg in stmt.args]
+                else:
+                    level, rows = CPUKernel.NODE, self.num_nodes
+                    vals = [self.node_value(arg, env) for arg in stmt.args]
+                val = cpu_op_table[op_name](stmt, *vals)
+                env[ret.id] = (level, fit_to_shape(val, [rows] + list(ret.var_shape)))
+            if ret.id in outputs:
+                self.write_output(outputs[ret.id], *env[ret.id])
+
+    def bind_arg(self, var, tensor):
+        if tensor.dtype in (torch.float16, torch.bfloat16):
+            # Computed on as float like the generated kernels, rounded when written
+            tensor = tensor.float()
+        if var.is_nodevar():
+            return CPUKernel.NODE, tensor.reshape([tensor.shape[0]] + list(var.var_shape))
+        elif var.is_edgevar():
+            return CPUKernel.EDGE_BY_EID, tensor.reshape([tensor.shape[0]] + list(var.var_shape))
+        return CPUKernel.PARAM, tensor.reshape(var.var_shape)
+
+    def edge_value(self, var, env):
+        '''Value of var for every edge, in the edge order of the CSR'''
+        if is_const_scalar(var):
+            return var
+        level, val = env[var.id]
+        if level == CPUKernel.NODE:
+            return val[self.src_ids] if var.is_srcvar() else val[self.dst_ids]
+        elif level == CPUKernel.EDGE_BY_EID:
+            return val[self.eids]
+        return val
+
+    def node_value(self, var, env):
+        if is_const_scalar(var):
+            return var
+        return env[var.id][1]
+
+    def aggregate(self, val, ret, reduce):
+        index = self.dst_ids if ret.is_dstvar() else self.src_ids
+        row_side = ret.is_dstvar() == (self.unit.parallel_mode() == ParallelMode.DstParallel)
+        if self.edge_parallel and row_side:
+            if reduce != 'sum':
+                raise NotImplementedError('Edge-balanced aggregation is only supported for sums, not', reduce)
+            return self.aggregate_edge_parallel(val)
+        out = val.new_zeros([self.num_nodes] + list(val.shape[1:]))
+        if reduce == 'sum':
+            return out.index_add_(0, index, val)
+        if reduce == 'count':
+            return out.index_add_(0, index, torch.ones_like(val))
+        index = index.view([-1] + [1] * (val.dim() - 1)).expand_as(val)
+        return out.scatter_reduce_(0, index, val, reduce=reduce, include_self=False)
+
+    @staticmethod
+    def partition_slots(row_offsets, row_ids, num_workers):
+        '''
+            Lays out the partial sums of the shares of the merge path in one
+            buffer. Every share gets a slot per row it ends followed by a
+            slot carrying the partial sum of the row it stops in. Returns the
+            number of slots, the slot of every edge, the slots of the rows in
+            row order, and the carry slots with the rows they are added to.
+        '''
+        rows, edges = merge_path_partition(row_offsets, num_workers)
+        sizes = rows.diff() + 1
+        offsets = torch.cumsum(sizes, 0) - sizes
+        share_of_edge = torch.repeat_interleave(torch.arange(num_workers), edges.diff())
+        edge_slots = row_ids + (offsets - rows[:-1])[share_of_edge]
+        carry_slots = offsets + sizes - 1
+        is_row_slot = torch.ones(int(sizes.sum()), dtype=torch.bool)
+        is_row_slot[carry_slots] = False
+        # The last share stops past the last row, it carries nothing
+        has_carry = rows[1:] < len(row_offsets) - 1
+        return (len(is_row_slot), edge_slots, is_row_slot.nonzero().squeeze(1),
+                carry_slots[has_carry], rows[1:][has_carry])
+
+    def aggregate_edge_parallel(self, val):
+        '''
+            Sums the edges of each share of the merge path on their own. The
+            rows ended in a share are assigned, the partial sum of the row a
+            share stops in is carried and added once all shares are done.
+        '''
+        num_slots, edge_slots, row_slots, carry_slots, carry_rows = self.share_slots
+        partial = val.new_zeros([num_slots] + list(val.shape[1:]))
+        partial.index_add_(0, edge_slots, val)
+        out = partial[row_slots]
+        return out.index_add_(0, carry_rows, partial[carry_slots])
+
+    def write_output(self, tensor, level, val):
+        out = tensor.view([tensor.shape[0]] + list(val.shape[1:]))
+        if level == CPUKernel.EDGE:
+            out.index_copy_(0, self.eids, val.to(out.dtype))
+        else:
+            out.copy_(val)
@@ -0,0 +1,120 @@
+"""Opt-in profiling of the phases of the STGraph compile pipeline"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+def count_stmts(progs):
+    '''Number of statements in a program or a list of programs'''
+    if not isinstance(progs, (list, tuple)):
+        progs = [progs]
+    return sum(sum(1 for _ in prog) for prog in progs)
+
+
+class CompileProfiler():
+    r"""Records wall time and size statistics of every compile phase
+
+    Phases are recorded while the profiler is enabled. Every record holds
+    the label of the compiled function (the context), made of the class of
+    its module, its name and the id of the context, the phase name, its
+    start time and duration in seconds and the statistics reported by the
+    phase itself, e.g. ``stmts_before``/``stmts_after`` for program passes,
+    ``units`` for fusion and ``source_bytes`` for code generation.
+
+    .. code-block:: python
+
+        from stgraph.compiler.debugging.compile_profiler import compile_profiler
+
+        compile_profiler.enable()
+        model(graph, features)
+        compile_profiler.export_chrome_trace("compile_trace.json")
+    """
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self._contexts = []
+        self._origin = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.records = []
+
+    @contextmanager
+    def context(self, name):
+        '''Attributes the phases recorded inside the block to the context name'''
+        self._contexts.append(name)
+        try:
+            yield
+        finally:
+            self._contexts.pop()
+
+    @contextmanager
+    def phase(self, name, **stats):
+        '''
+            Times the block as phase name. The yielded dict can be filled with
+            statistics only known once the phase completed.
+        '''
+        if not self.enabled:
+            yield stats
+            return
+        record = {
+            'context': self._contexts[-1] if self._contexts else None,
+            'phase': name,
+            'start': time.perf_counter() - self._origin,
+            'duration': 0.0,
+        }
+        try:
+            yield stats
+        finally:
+            record['duration'] = time.perf_counter() - self._origin - record['start']
+            record.update(stats)
+            self.records.append(record)
+
+    def summary(self):
+        '''Total time and number of invocations of each phase'''
+        ret = {}
+        for record in self.records:
+            phase = ret.setdefault(record['phase'], {'count': 0, 'duration': 0.0})
+            phase['count'] += 1
+            phase['duration'] += record['duration']
+        return ret
+
+    def to_json(self):
+        return json.dumps({'records': self.records, 'summary': self.summary()}, indent=2, default=str)
+
+    def to_chrome_trace(self):
+        pid = os.getpid()
+        tid = threading.get_ident()
+        events = []
+        for record in self.records:
+            args = {k: v for k, v in record.items() if k not in ('phase', 'start', 'duration')}
+            events.append({
+                'name': record['phase'],
+                'cat': 'compile',
+                'ph': 'X',
+                'ts': record['start'] * 1e6,
+                'dur': record['duration'] * 1e6,
+                'pid': pid,
+                'tid': tid,
+                'args': args,
+            })
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            f.write(self.to_chrome_trace())
+
+
+compile_profiler = CompileProfiler()
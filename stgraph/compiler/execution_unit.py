@@ -1,11 +1,16 @@
 """The fundamental execution unit of STGraph"""
 
 import math
+import os
 import snoop
+import torch
 from .code_gen.cuda_driver import *
 from .code_gen.kernel_context import KernelContext, LinearizedKernelContext
-from .utils import is_const_scalar, ParallelMode, MAX_THREAD_PER_BLOCK, MAX_BLOCK 
+from .utils import is_const_scalar, ParallelMode, ExecutionTarget, WriteType, WriteLocation, MAX_THREAD_PER_BLOCK, MAX_BLOCK, \
+    EDGE_PARALLEL_GRAPH_TYPES, EDGE_PARALLEL_ITEMS_PER_WORKER
 from .code_gen.cuda_error import ASSERT_DRV
+from .cpu_kernel import CPUKernel
+from .autotuner import get_autotuner, cuda_sync
 
 from stgraph.compiler.debugging.stgraph_logger import print_log
 
@@ -25,7 +30,11 @@ class ExecutionUnit(object):
         self._unit_rets_cached = None
         self._unit_args_cached = None
         self._max_dims_cached = None
+        self._accumulated_rets_cached = None
+        self._edge_parallel_cached = None
+        self._tuning_signature_cached = None
         self._parent_units = set()
+        self._kernels = {}
         if self.feature_size() >= 0:
             self._template_name = 'fa'
         else:
@@ -203,6 +212,23 @@ class ExecutionUnit(object):
     
     def kernel_args(self):
         return self.unit_args() + self.unit_rets()
+
+    def accumulated_rets(self):
+        '''
+            The rets that the generated kernel accumulates into (atomic or +=
+            writes), the buffers of these have to be zero-filled before launch.
+            Every other ret is assigned for each node or edge.
+        '''
+        if self._accumulated_rets_cached is None:
+            self._accumulated_rets_cached = set()
+            ctx = self.create_context('int')
+            rets = set(self.unit_rets())
+            for stmt in self.program:
+                if stmt.ret in rets:
+                    ctx.set_stmt_ctx(stmt)
+                    if ctx.cur_stmt_ctx.write_type in (WriteType.ATOMIC, WriteType.ADD):
+                        self._accumulated_rets_cached.add(stmt.ret)
+        return self._accumulated_rets_cached
     
     def materilized_vars(self):
         if self.compiled:
@@ -234,23 +260,75 @@ class ExecutionUnit(object):
     
     def add_ret_val(self, ret_val):
         self._rets.add(ret_val)
+
+    def remove_rets(self, rets):
+        self._rets = self._rets.difference(rets)
+        self.clear_cached()
+
+    def update_vars(self):
+        '''Recomputes the args and tmps after stmts have been removed from the program'''
+        self._tmps = self.all_rets()
+        self._args = self.get_all_args().difference(self._tmps)
+        self.clear_cached()
+
+    def clear_cached(self):
+        self._unit_args_cached = None
+        self._unit_rets_cached = None
+        self._max_dims_cached = None
+        self._accumulated_rets_cached = None
+        self._edge_parallel_cached = None
+        self._tuning_signature_cached = None
     
     def max_ret_id(self):
         return sorted([ret.int_id for ret in self.unit_rets()])[-1]
 
-    def prepare_compiled_kernel(self, graph, compiled_module):
+    def supports_edge_parallel(self):
+        '''
+            Whether the kernel can split the edges of a row between workers, see
+            tpl_omp_csr_ep. The partial aggregates of a split row are added to
+            the row once all workers are done, hence the aggregations written
+            per row have to be float sums that no node-wise stmt reads.
+        '''
+        if self._edge_parallel_cached is None:
+            _, aggs, nodes = self.stmt_sections()
+            supported = self.compiled and self.use_fa_tmpl() and not nodes
+            ctx = self.create_context('int')
+            for stmt in aggs:
+                ctx.set_stmt_ctx(stmt)
+                if ctx.cur_stmt_ctx.write_location == WriteLocation.OUTER:
+                    supported = supported and stmt.op_name == 'AggSum' and \
+                                ctx.cur_stmt_ctx.write_type == WriteType.ASSIGN and stmt.ret.dtype_str == 'float'
+            self._edge_parallel_cached = supported
+        return self._edge_parallel_cached
+
+    def use_edge_parallel(self, graph):
+        '''Edge-balanced kernels run on the graphs whose rows were found skewed when their CSR was built'''
+        if not self.supports_edge_parallel() or graph.graph_type() not in EDGE_PARALLEL_GRAPH_TYPES:
+            return False
         if self.parallel_mode() == ParallelMode.DstParallel:
-            row_offsets_ptr = graph.fwd_row_offset_ptr
-            col_indices_ptr = graph.fwd_column_indices_ptr
-            eids_ptr = graph.fwd_eids_ptr
-            node_ids_ptr = graph.fwd_node_ids_ptr
-        else:
-            #TODO: Will probably have to change this so that this accesses 
-            #backward row_offset, col_indices, eids
-            row_offsets_ptr = graph.bwd_row_offset_ptr
-            col_indices_ptr = graph.bwd_column_indices_ptr
-            eids_ptr = graph.bwd_eids_ptr
-            node_ids_ptr = graph.bwd_node_ids_ptr
+            return graph.fwd_edge_parallel
+        return graph.bwd_edge_parallel
+
+    def graph_ptrs(self, graph):
+        if self.parallel_mode() == ParallelMode.DstParallel:
+            return graph.fwd_row_offset_ptr, graph.fwd_column_indices_ptr, graph.fwd_eids_ptr, graph.fwd_node_ids_ptr
+        #TODO: Will probably have to change this so that this accesses 
+        #backward row_offset, col_indices, eids
+        return graph.bwd_row_offset_ptr, graph.bwd_column_indices_ptr, graph.bwd_eids_ptr, graph.bwd_node_ids_ptr
+
+    def prepare_compiled_kernel(self, graph, compiled_module, target=ExecutionTarget.CUDA):
+        self._compiled_module = compiled_module
+        self._target = target
+        self._kernels = {}
+        self._edge_parallel = self.use_edge_parallel(graph)
+        self._graph_stats = (graph.graph_type(), graph.get_num_nodes(), graph.get_num_edges())
+        self._K = self.create_kernel(graph, self._edge_parallel)
+
+    def create_kernel(self, graph, edge_parallel):
+        row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr = self.graph_ptrs(graph)
+        compiled_module = self._compiled_module
+        target = self._target
+        kernel_name = self._kernel_name + '_ep' if edge_parallel else self._kernel_name
         max_dims = [1, 1]
         if len(self.max_dims()) == 1:
             max_dims[-1] = self.max_dims()[-1]
@@ -259,59 +337,145 @@ class ExecutionUnit(object):
         else:
             raise NotImplementedError('Feature dimension larger than 2 are not supported.')
         num_nodes = graph.get_num_nodes()
-        if self.use_fa_tmpl():
+        num_tensors = len(self.kernel_args())
+        if target == ExecutionTarget.CPU:
+            print_log(f'[yellow bold]Execution Unit[/yellow bold]:  Preparing CPU Kernel with num_nodes: {str(num_nodes)}, edge_parallel: {str(edge_parallel)}')
+            K = CPUKernel(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, edge_parallel)
+        elif target == ExecutionTarget.OPENMP:
+            print_log(f'[yellow bold]Execution Unit[/yellow bold]:  Preparing OpenMP Kernel {kernel_name} with num_nodes: {str(num_nodes)}')
+            K = OpenMPKernel(num_tensors, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module, edge_parallel)
+        elif edge_parallel:
+            num_edges = graph.get_num_edges()
+            print_log(f'[yellow bold]Execution Unit[/yellow bold]:  Generating edge-balanced FA Kernel with num_nodes: {str(num_nodes)}, num_edges: {str(num_edges)}')
+            K = EdgeParallelKernel(num_tensors, num_nodes, num_edges, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module,
+                                   self.calculate_kernel_params_fa, self.num_carries())
+        elif self.use_fa_tmpl():
             launch_config = self.calculate_kernel_params_fa(num_nodes)
             print_log(f'[yellow bold]Execution Unit[/yellow bold]:  Generating FA Kernel with num_nodes: {str(num_nodes)}, launch_config: {str(launch_config)}')
-            self._K = FeatureAdaptiveKernel(num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, self._kernel_name, compiled_module, launch_config)
+            K = FeatureAdaptiveKernel(num_tensors, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module, self.calculate_kernel_params_fa)
         else:
             launch_config, tile_sizes = self.calculate_kernel_params(num_nodes)
             print_log(f'[yellow bold]Execution Unit[/yellow bold]:  Generating V2 Kernel with num_nodes: {str(num_nodes)}, launch_config: {str(launch_config)}, tile_size: {str(tile_sizes)}, max_dims: {str(max_dims)}')
-            self._K = V2Kernel(num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, max_dims, self._kernel_name, compiled_module, launch_config, tile_sizes)
+            K = V2Kernel(num_tensors, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, max_dims, kernel_name, compiled_module, self.calculate_kernel_params, tile_sizes)
+        self._kernels[edge_parallel] = K
+        return K
+
+    def num_carries(self):
+        '''Number of aggregations an edge-balanced kernel carries across workers'''
+        ctx = self.create_context('int')
+        count = 0
+        for stmt in self.program:
+            if stmt.is_agg():
+                ctx.set_stmt_ctx(stmt)
+                if ctx.cur_stmt_ctx.write_location == WriteLocation.OUTER:
+                    count += 1
+        return count
 
     def reset_graph_info(self, graph):
-        if self.parallel_mode() == ParallelMode.DstParallel:
-            row_offsets_ptr = graph.fwd_row_offset_ptr
-            col_indices_ptr = graph.fwd_column_indices_ptr
-            eids_ptr = graph.fwd_eids_ptr
-            node_ids_ptr = graph.fwd_node_ids_ptr
+        edge_parallel = self.use_edge_parallel(graph)
+        if edge_parallel != self._edge_parallel:
+            # The skew of the rows differs between the snapshots of a dynamic graph
+            self._edge_parallel = edge_parallel
+            if edge_parallel in self._kernels:
+                self._K = self._kernels[edge_parallel]
+            else:
+                self._K = self.create_kernel(graph, edge_parallel)
+        self._graph_stats = (graph.graph_type(), graph.get_num_nodes(), graph.get_num_edges())
+        row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr = self.graph_ptrs(graph)
+        if isinstance(self._K, EdgeParallelKernel):
+            self._K.reset_graph_info(graph.get_num_nodes(), row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, graph.get_num_edges())
         else:
-            row_offsets_ptr = graph.bwd_row_offset_ptr
-            col_indices_ptr = graph.bwd_column_indices_ptr
-            eids_ptr = graph.bwd_eids_ptr
-            node_ids_ptr = graph.bwd_node_ids_ptr
-        self._K.reset_graph_info(graph.get_num_nodes(), row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr)
+            self._K.reset_graph_info(graph.get_num_nodes(), row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr)
 
     def kernel_run(self, tensor_list):
         assert self._K, 'Must call prepare_compiled_kernel before call kernel_run.'
+        tuner = get_autotuner()
+        if tuner is not None and self._target != ExecutionTarget.CPU:
+            graph_type, num_nodes, num_edges = self._graph_stats
+            signature = self.tuning_signature() + ('\nedge_parallel' if self._edge_parallel else '')
+            key = tuner.key(signature, self._target, graph_type, num_nodes, num_edges)
+            if key != self._K.tuning_key:
+                scratch = self.scratch_rets(num_nodes, num_edges)
+                ptrs = [scratch[var].data_ptr() if var in scratch else ptr for var, ptr in zip(self.kernel_args(), tensor_list)]
+                tuner.configure(self._K, key, ptrs, cuda_sync if self._target == ExecutionTarget.CUDA else None)
         self._K.run(tensor_list)
+
+    def tuning_signature(self):
+        '''Describes the generated kernel independently of the names of the unit and its vars'''
+        if self._tuning_signature_cached is None:
+            positions = {var.id: i for i, var in enumerate(self.kernel_args())}
+            def describe(var):
+                if is_const_scalar(var):
+                    return repr(var)
+                return '{}:{}:{}:{}'.format(positions.get(var.id, 'tmp'), var.val_type.name, list(var.var_shape), var.var_dtype)
+            lines = [str(self.parallel_mode()), str(self.max_dims())]
+            for stmt in self.program:
+                lines.append('{} {} {} -> {}'.format(stmt.op_name, sorted(stmt.op_schema._params.items()),
+                                                     [describe(arg) for arg in stmt.args], describe(stmt.ret)))
+            self._tuning_signature_cached = '\n'.join(lines)
+        return self._tuning_signature_cached
+
+    def scratch_rets(self, num_nodes, num_edges):
+        '''Buffers the kernel writes to while its launch parameters are benchmarked'''
+        device = 'cuda' if self._target == ExecutionTarget.CUDA else 'cpu'
+        scratch = {}
+        for var in self.unit_rets():
+            rows = num_edges if var.is_edgevar() else (num_nodes if var.is_nodevar() else 1)
+            scratch[var] = torch.zeros([rows] + list(var.var_shape), dtype=var.var_dtype, device=device)
+        return scratch
     
+    def stmt_sections(self):
+        '''
+            Splits the program the way code_gen places it in the kernel: stmts
+            evaluated per edge, the aggregations and the node-wise stmts that
+            depend on the aggregations and are evaluated once per node.
+        '''
+        edges, aggs, nodes = [], [], []
+        aggregated = set()
+        for stmt in self._prog:
+            if stmt.is_agg():
+                aggs.append(stmt)
+                aggregated.add(stmt.ret)
+            elif stmt.is_nodewise() and any(arg in aggregated for arg in stmt.args if not is_const_scalar(arg)):
+                nodes.append(stmt)
+                aggregated.add(stmt.ret)
+            else:
+                edges.append(stmt)
+        return edges, aggs, nodes
+
+    @staticmethod
+    def merged_parallel_mode(units):
+        '''The side most aggregations of the units write to, the others are written atomically'''
+        dst_parallel_count = 0
+        for unit in units:
+            for s in unit.program:
+                if s.is_agg():
+                    if s.ret.is_dstvar():
+                        dst_parallel_count += 1
+                    else:
+                        dst_parallel_count -= 1
+        if dst_parallel_count >= 0:
+            return ParallelMode.DstParallel
+        return ParallelMode.SrcParallel
+
     def merge_with_independent_unit(self, other):
         # union their inputs and outputs
-        self._unit_args_cached = None
-        self._unit_rets_cached = None
-        self._max_dims_cached = None
+        self.clear_cached()
         self._args = self._args.union(other._args)
         self._rets = self._rets.union(other._rets)
         self._tmps = self._tmps.union(other._tmps)
-        # merge stmts
-        first_agg = None
-        for s in self._prog:
-            if s.is_agg():
-                first_agg = s
-                break
-        self._prog.insert_stmts_before(first_agg, list(other._prog))
+        self._parent_units = self._parent_units.union(other._parent_units)
+        # merge stmts section by section, so that the merged kernel walks the edges once
+        mode = ExecutionUnit.merged_parallel_mode([self, other])
+        sections = [a + b for a, b in zip(self.stmt_sections(), other.stmt_sections())]
+        seen_var = self._prog.seen_var
+        self._prog.clear_stmts()
+        self._prog.seen_var = seen_var
+        for section in sections:
+            for s in section:
+                self._prog.tail.insert_before(s)
         # adjust parallel mode
-        dst_parallel_count = 0
-        for s in  self._prog:
-            if s.is_agg():
-                if s.ret.is_dstvar():
-                    dst_parallel_count += 1
-                else:
-                    dst_parallel_count -= 1
-        if dst_parallel_count >= 0:
-            self._parallel_mode = ParallelMode.DstParallel
-        else:
-            self._parallel_mode = ParallelMode.SrcParallel
+        self._parallel_mode = mode
         return self
     
     def depends_on(self, other):
@@ -345,21 +509,72 @@ class ExecutionUnit(object):
     def kernel_name(self):
         return self._kernel_name
 
+class LaunchPlan():
+    r"""Pre-packed kernel arguments of an execution unit
+
+    Kernels take the tensor pointers of the unit followed by the graph
+    pointers and scalar arguments. Every argument lives in a ctypes value
+    that is updated in place, so the array of argument addresses handed to
+    the driver is built once. A launch only patches the values of the
+    pointers that changed since the previous launch.
+
+    Parameters
+    ----------
+
+    num_tensors : int
+        Number of tensor arguments of the kernel
+    const_args : list[c_types]
+        Graph pointers and scalar arguments following the tensors
+    """
+    def __init__(self, num_tensors, const_args):
+        self.tensor_args = [c_void_p() for _ in range(num_tensors)]
+        self.tensor_ptrs = [None] * num_tensors
+        self.const_args = const_args
+        self.args = self.tensor_args + self.const_args
+        self.params = (c_void_p * len(self.args))(*[addressof(v) for v in self.args])
+
+    def set_tensor_ptrs(self, ptrs):
+        if ptrs == self.tensor_ptrs:
+            return
+        for i, ptr in enumerate(ptrs):
+            if ptr != self.tensor_ptrs[i]:
+                self.tensor_args[i].value = ptr
+        self.tensor_ptrs = ptrs
+
+    def set_const(self, i, value):
+        if self.const_args[i].value != value:
+            self.const_args[i].value = value
+
 class Kernel():
-    def reset_graph_info(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr):
-        self.const_kernel_args[0] = c_void_p(row_offsets_ptr)
-        self.const_kernel_args[1] = c_void_p(eids_ptr)
-        self.const_kernel_args[2] = c_void_p(col_indices_ptr)
-        self.const_kernel_args[3] = c_void_p(node_ids_ptr)
-        self.const_kernel_args[4] = c_int(num_nodes)
+    def __init__(self, num_tensors, const_args, launch_config_fn, num_nodes):
+        self.plan = LaunchPlan(num_tensors, const_args)
+        self.launch_config_fn = launch_config_fn
+        self.num_nodes = num_nodes
+        self.launch_config = launch_config_fn(num_nodes)
+        # Key of the autotuned configuration applied to the kernel, see Autotuner.configure
+        self.tuning_key = None
+
+    def candidate_configs(self):
+        '''Launch configurations the autotuner benchmarks, kernels without any keep their heuristics'''
+        return []
 
-        for i in range(5):
-            self.const_kernel_ptrs[i] = c_void_p(addressof(self.const_kernel_args[i]))
+    def apply_config(self, config):
+        '''Applies a configuration returned by candidate_configs, None restores the heuristic one'''
+        pass
+
+    def reset_graph_info(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr):
+        self.plan.set_const(0, row_offsets_ptr)
+        self.plan.set_const(1, eids_ptr)
+        self.plan.set_const(2, col_indices_ptr)
+        self.plan.set_const(3, node_ids_ptr)
+        self.plan.set_const(4, num_nodes)
+        if num_nodes != self.num_nodes:
+            self.num_nodes = num_nodes
+            self.launch_config = self.launch_config_fn(num_nodes)
 
-    def run(self, tensor_list):
+    def run(self, tensor_ptrs):
         try:
-            kernel_ptrs = [c_void_p(addressof(arg)) for arg in tensor_list] + self.const_kernel_ptrs
-            params =  (c_void_p * len(kernel_ptrs))(*kernel_ptrs)
+            self.plan.set_tensor_ptrs(tensor_ptrs)
             ret = cuLaunchKernel(self.K, 
                                  self.launch_config[0], 
                                  self.launch_config[1],
@@ -367,7 +582,7 @@ class Kernel():
                                  self.launch_config[3],
                                  self.launch_config[4],
                                  self.launch_config[5],
-                                 0, None, params, 0)
+                                 0, None, self.plan.params, 0)
             
             ASSERT_DRV(ret)
         except Exception as e:
@@ -382,6 +597,8 @@ class V2Kernel(Kernel):
     Parameters
     ----------
     
+    num_tensors : int
+        Number of tensor arguments of the kernel
     num_nodes : int
         Number of nodes present in the graph
     row_offsets_ptr : c_type
@@ -391,25 +608,169 @@ class V2Kernel(Kernel):
     
     Attributes
     ----------
-    scalar_args : list[c_types]
-        List of the scalar arguments passed to the kernel
+    plan : LaunchPlan
+        The packed arguments passed to the kernel
     launch_config : list[int]
         List of the kernel launch configurations
     """
-    def __init__(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, max_dims, kernel_name, compiled_module, launch_config, tile_sizes):
-        self.scalar_args = [c_int(num_nodes), c_int(max_dims[1]), c_int(max_dims[0]), c_int(tile_sizes[0]), c_int(tile_sizes[1])]
-        self.const_kernel_args =  [c_void_p(row_offsets_ptr), c_void_p(eids_ptr), c_void_p(col_indices_ptr)] + self.scalar_args
-        self.const_kernel_ptrs = [c_void_p(addressof(v)) for v in self.const_kernel_args]
+    def __init__(self, num_tensors, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, max_dims, kernel_name, compiled_module, calculate_kernel_params, tile_sizes):
+        # The V2 template does not take node ids
+        const_args = [c_void_p(row_offsets_ptr), c_void_p(eids_ptr), c_void_p(col_indices_ptr), c_int(num_nodes),
+                      c_int(max_dims[1]), c_int(max_dims[0]), c_int(tile_sizes[0]), c_int(tile_sizes[1])]
+        launch_config_fn = lambda n: V2Kernel.grid(calculate_kernel_params(n)[0])
+        super().__init__(num_tensors, const_args, launch_config_fn, num_nodes)
         ret, self.K = cuModuleGetFunction(compiled_module, kernel_name.encode())
         ASSERT_DRV(ret)
-        self.launch_config = launch_config[0],launch_config[1], 1, launch_config[2], launch_config[3],1
+
+    @staticmethod
+    def grid(launch_config):
+        return launch_config[0], launch_config[1], 1, launch_config[2], launch_config[3], 1
+
+    def reset_graph_info(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr):
+        self.plan.set_const(0, row_offsets_ptr)
+        self.plan.set_const(1, eids_ptr)
+        self.plan.set_const(2, col_indices_ptr)
+        self.plan.set_const(3, num_nodes)
+        if num_nodes != self.num_nodes:
+            self.num_nodes = num_nodes
+            self.launch_config = self.launch_config_fn(num_nodes)
 
 class FeatureAdaptiveKernel(Kernel):
-    def __init__(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module, launch_config):
-        self.scalar_args = [c_int(num_nodes), c_int(max_dims[1]), c_int(max_dims[0]), c_int(launch_config[2]), c_int(launch_config[3])]
-        self.const_kernel_args =  [c_void_p(row_offsets_ptr), c_void_p(eids_ptr), c_void_p(col_indices_ptr), c_void_p(node_ids_ptr)] + self.scalar_args
-        self.const_kernel_ptrs = [c_void_p(addressof(v)) for v in self.const_kernel_args]
+    def __init__(self, num_tensors, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module, calculate_kernel_params_fa):
+        self.feat_len = max_dims[0] * max_dims[1]
+        self.calculate_kernel_params_fa = calculate_kernel_params_fa
+        launch_config = calculate_kernel_params_fa(num_nodes)
+        const_args = [c_void_p(row_offsets_ptr), c_void_p(eids_ptr), c_void_p(col_indices_ptr), c_void_p(node_ids_ptr), c_int(num_nodes),
+                      c_int(max_dims[1]), c_int(max_dims[0]), c_int(launch_config[2]), c_int(launch_config[3])]
+        launch_config_fn = lambda n: FeatureAdaptiveKernel.grid(calculate_kernel_params_fa(n))
+        super().__init__(num_tensors, const_args, launch_config_fn, num_nodes)
 
         ret, self.K = cuModuleGetFunction(compiled_module, kernel_name.encode())
         ASSERT_DRV(ret)
-        self.launch_config = launch_config[0],1,1,launch_config[1],1,1
\ No newline at end of file
+
+    @staticmethod
+    def grid(launch_config):
+        return launch_config[0], 1, 1, launch_config[1], 1, 1
+
+    def candidate_configs(self):
+        # Groups of up to the feature size rounded to a power of two, the threads of a group stride over the features
+        max_group = 1 << max(0, self.feat_len - 1).bit_length()
+        configs = []
+        for nthrs in (64, 128, 256, 512):
+            thrs_per_group = min(32, max_group)
+            while thrs_per_group <= min(nthrs, max_group):
+                configs.append({'threads': nthrs, 'thrs_per_group': thrs_per_group, 'nodes_per_block': nthrs // thrs_per_group})
+                thrs_per_group *= 2
+        return configs
+
+    def apply_config(self, config):
+        if config is None:
+            params_fn = self.calculate_kernel_params_fa
+        else:
+            params_fn = lambda n: ((n + config['nodes_per_block'] - 1) // config['nodes_per_block'], config['threads'],
+                                   config['thrs_per_group'], config['nodes_per_block'])
+        params = params_fn(self.num_nodes)
+        self.plan.set_const(7, params[2])
+        self.plan.set_const(8, params[3])
+        self.launch_config_fn = lambda n: FeatureAdaptiveKernel.grid(params_fn(n))
+        self.launch_config = self.launch_config_fn(self.num_nodes)
+
+class EdgeParallelKernel(FeatureAdaptiveKernel):
+    r"""Edge-balanced variant of the FeatureAdaptiveKernel
+
+    Instead of a node, each thread group walks an even share of the merge
+    path of the row ends and the edges, so that the high degree rows of a
+    skewed graph are split between groups. The partial aggregates of the
+    rows a group stops in are carried in scratch buffers and added to the
+    rows by a second launch of the fixup kernel.
+
+    Parameters
+    ----------
+
+    num_edges : int
+        Number of edges present in the graph
+    num_carries : int
+        Number of aggregations written per row by the kernel
+    """
+    def __init__(self, num_tensors, num_nodes, num_edges, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module, calculate_kernel_params_fa, num_carries):
+        self.feat_len = max_dims[0] * max_dims[1]
+        self.calculate_kernel_params_fa = calculate_kernel_params_fa
+        self.num_carries = num_carries
+        num_workers = EdgeParallelKernel.workers(num_nodes, num_edges)
+        self.allocate_carries(num_workers)
+        launch_config = calculate_kernel_params_fa(num_workers)
+        const_args = [c_void_p(row_offsets_ptr), c_void_p(eids_ptr), c_void_p(col_indices_ptr), c_void_p(node_ids_ptr), c_int(num_nodes),
+                      c_int(max_dims[1]), c_int(max_dims[0]), c_int(launch_config[2]), c_int(launch_config[3]), c_int(num_workers),
+                      c_void_p(self.carry_rows.data_ptr()), c_void_p(self.carry_vals.data_ptr())]
+        launch_config_fn = lambda n: FeatureAdaptiveKernel.grid(calculate_kernel_params_fa(n))
+        # The thread groups are launched for the workers instead of the nodes
+        Kernel.__init__(self, num_tensors, const_args, launch_config_fn, num_workers)
+
+        ret, self.K = cuModuleGetFunction(compiled_module, kernel_name.encode())
+        ASSERT_DRV(ret)
+        ret, self.K_fixup = cuModuleGetFunction(compiled_module, (kernel_name + '_fixup').encode())
+        ASSERT_DRV(ret)
+
+    @staticmethod
+    def workers(num_nodes, num_edges):
+        return max(1, (num_nodes + num_edges + EDGE_PARALLEL_ITEMS_PER_WORKER - 1) // EDGE_PARALLEL_ITEMS_PER_WORKER)
+
+    def allocate_carries(self, num_workers):
+        self.carry_rows = torch.empty(num_workers, dtype=torch.int32, device='cuda')
+        self.carry_vals = torch.empty(max(1, self.num_carries * num_workers * self.feat_len), dtype=torch.float32, device='cuda')
+
+    def reset_graph_info(self, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, num_edges):
+        self.plan.set_const(0, row_offsets_ptr)
+        self.plan.set_const(1, eids_ptr)
+        self.plan.set_const(2, col_indices_ptr)
+        self.plan.set_const(3, node_ids_ptr)
+        self.plan.set_const(4, num_nodes)
+        num_workers = EdgeParallelKernel.workers(num_nodes, num_edges)
+        if num_workers != self.num_nodes:
+            self.num_nodes = num_workers
+            self.launch_config = self.launch_config_fn(num_workers)
+            self.allocate_carries(num_workers)
+            self.plan.set_const(9, num_workers)
+            self.plan.set_const(10, self.carry_rows.data_ptr())
+            self.plan.set_const(11, self.carry_vals.data_ptr())
+
+    def run(self, tensor_ptrs):
+        super().run(tensor_ptrs)
+        if self.num_carries:
+            ret = cuLaunchKernel(self.K_fixup, *self.launch_config, 0, None, self.plan.params, 0)
+            ASSERT_DRV(ret)
+
+class OpenMPKernel(Kernel):
+    r"""Kernel generated from the OpenMP templates
+
+    The compiled module is a shared object loaded with ctypes and the
+    kernel is a plain C function, it is called directly instead of being
+    launched through the CUDA driver.
+    """
+    # Chunk size of the dynamic schedule, a thread count of 0 uses the OpenMP default
+    DEFAULT_CONFIG = {'chunk_size': 64, 'num_threads': 0}
+
+    def __init__(self, num_tensors, num_nodes, row_offsets_ptr, col_indices_ptr, eids_ptr, node_ids_ptr, max_dims, kernel_name, compiled_module, edge_parallel=False):
+        const_args = [c_void_p(row_offsets_ptr), c_void_p(eids_ptr), c_void_p(col_indices_ptr), c_void_p(node_ids_ptr), c_int(num_nodes),
+                      c_int(max_dims[1]), c_int(max_dims[0]), c_int(OpenMPKernel.DEFAULT_CONFIG['chunk_size']),
+                      c_int(OpenMPKernel.DEFAULT_CONFIG['num_threads'])]
+        super().__init__(num_tensors, const_args, lambda n: None, num_nodes)
+        self.edge_parallel = edge_parallel
+        self.K = getattr(compiled_module, kernel_name)
+        self.K.restype = None
+
+    def candidate_configs(self):
+        max_threads = os.cpu_count() or 1
+        threads = sorted(set(max(1, max_threads // d) for d in (1, 2, 4)))
+        # Edge-balanced kernels split the edges statically, only their thread count matters
+        chunk_sizes = [OpenMPKernel.DEFAULT_CONFIG['chunk_size']] if self.edge_parallel else [16, 64, 256]
+        return [{'chunk_size': c, 'num_threads': t} for t in threads for c in chunk_sizes]
+
+    def apply_config(self, config):
+        config = config if config else OpenMPKernel.DEFAULT_CONFIG
+        self.plan.set_const(7, config['chunk_size'])
+        self.plan.set_const(8, config['num_threads'])
+
+    def run(self, tensor_ptrs):
+        self.plan.set_tensor_ptrs(tensor_ptrs)
+        self.K(*self.plan.args)
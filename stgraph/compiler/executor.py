@@ -1,8 +1,12 @@
-from .utils import is_const_scalar, ParallelMode
+from .utils import is_const_scalar, ParallelMode, ExecutionTarget, CheckpointMode, ValType
+from .checkpointing import get_activation_checkpointing
+from .cpu_kernel import cpu_op_table
 import snoop
-from collections import deque
+from collections import deque, OrderedDict
 from ..graph.dynamic.dynamic_graph import DynamicGraph
+from .passes.mem_planning import plan_storage, var_elems
 from stgraph.compiler.debugging.stgraph_logger import print_log
+from stgraph.compiler.debugging.compile_profiler import compile_profiler
 import torch
 
 
@@ -21,6 +25,9 @@ class Stack:
     def top(self):
         return self.content[-1]
 
+    def __len__(self):
+        return len(self.content)
+
     def print(self):
         for elem in self.content:
             print(elem)
@@ -35,6 +42,15 @@ class ExeState(object):
         # contains timestamps of graphs that were forward propagated
         self.graph_timestamp_stack = Stack()
 
+        # contains the planned slot buffers of all previous executions still awaiting backward
+        self.slot_stack = Stack()
+
+        # contains the planned slot buffers of the current execution
+        self.current_slots = {}
+
+        # contains how the saved tensors of each entry of tensor_map_stack are kept
+        self.checkpoint_stack = Stack()
+
         # contains arg tensors for the current execution of nb_compute only
         self.current_tensor_map = {}
 
@@ -76,6 +92,7 @@ class ExeState(object):
         self.num_bunits = len(bunits)
         # deletes all tensors that were previously stored here (verified)
         self.current_tensor_map = {key: val for key, val in input_map.items()}
+        self.current_slots = {}
         self.executed_bunit.clear()
 
     def track_executed_bu(self, bu):
@@ -105,6 +122,85 @@ class ExeState(object):
     #         self.tensor_map.pop(k)
 
 
+class TensorArena(object):
+    """Recycles the slot buffers of the storage plan across executions
+
+    Buffers are flat and keyed by (capacity, dtype, device). The capacity
+    is the requested number of elements rounded up to a bucket, so that
+    requests of slightly different sizes, e.g. for the snapshots of a
+    dynamic graph, share buffers; callers view the elements they need. A
+    buffer released back to the arena is handed out again to the next
+    request of the same bucket, and is only zero-filled when asked to.
+
+    The free buffers take at most max_free_bytes in total, the least
+    recently released ones are freed first.
+    """
+
+    # Number of buckets between two consecutive powers of two
+    BUCKET_DIVISIONS = 4
+    # Upper bound on the bytes of the free buffers kept by an arena
+    MAX_FREE_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, max_free_bytes=MAX_FREE_BYTES):
+        self.free = OrderedDict()
+        self.free_bytes = 0
+        self.max_free_bytes = max_free_bytes
+        self.new_zeros = None
+        self.new_empty = None
+        self.fill_zeros = None
+        self.allocated = 0
+        self.reused = 0
+        self.evicted = 0
+
+    @staticmethod
+    def capacity(numel):
+        """Rounds numel up to its bucket"""
+        if numel <= 1:
+            return numel
+        power = 1 << (numel - 1).bit_length()
+        step = max(1, power // (2 * TensorArena.BUCKET_DIVISIONS))
+        return -(-numel // step) * step
+
+    def acquire(self, numel, dtype, device, zero):
+        """Returns a flat buffer of at least numel elements"""
+        capacity = TensorArena.capacity(numel)
+        key = (capacity, dtype, str(device))
+        free_list = self.free.get(key, None)
+        if free_list:
+            self.reused += 1
+            buf = free_list.pop()
+            if not free_list:
+                del self.free[key]
+            self.free_bytes -= buf.numel() * buf.element_size()
+            if zero:
+                self.fill_zeros(buf)
+            return buf
+        self.allocated += 1
+        if zero:
+            return self.new_zeros(size=[capacity], dtype=dtype, device=device, requires_grad=False)
+        return self.new_empty(size=[capacity], dtype=dtype, device=device)
+
+    def release(self, buf):
+        nbytes = buf.numel() * buf.element_size()
+        if nbytes > self.max_free_bytes:
+            return
+        key = (buf.numel(), buf.dtype, str(buf.device))
+        self.free.setdefault(key, []).append(buf)
+        self.free.move_to_end(key)
+        self.free_bytes += nbytes
+        while self.free_bytes > self.max_free_bytes:
+            key, free_list = next(iter(self.free.items()))
+            evicted = free_list.pop(0)
+            if not free_list:
+                del self.free[key]
+            self.free_bytes -= evicted.numel() * evicted.element_size()
+            self.evicted += 1
+
+    def clear(self):
+        self.free = OrderedDict()
+        self.free_bytes = 0
+
+
 class MergedUnit(object):
     def __init__(self, units):
         self.units = units
@@ -160,6 +256,12 @@ class MergedUnit(object):
             self._union_of_rets = var_set
         return self._union_of_rets
 
+    def accumulated_rets(self):
+        var_set = set()
+        for u in self.units:
+            var_set = var_set.union(u.accumulated_rets())
+        return var_set
+
     def kernel_arg_list(self):
         if not self._kernel_args:
             args = self.joint_args()
@@ -186,7 +288,14 @@ class MergedUnit(object):
 
 class Executor(object):
     def __init__(
-        self, graph, forward_exec_units, backward_exec_units, compiled_module, rets
+        self,
+        graph,
+        forward_exec_units,
+        backward_exec_units,
+        compiled_module,
+        rets,
+        target=ExecutionTarget.CUDA,
+        input_alias=None,
     ):
         self.forward_exec_units = self.merge_units(forward_exec_units)
         self.bulist = backward_exec_units
@@ -195,18 +304,62 @@ class Executor(object):
         )
         self._rets = rets
         self.ts = ExeState()
+        self.arena = TensorArena()
+        # Largest number of elements each slot of the storage plan was needed at
+        self.slot_capacity = {}
         self.new_zeros = None
         self.raw_ptr = None
+        self.data_ptrs = None
         self.num_nodes = graph.get_num_nodes()
         self.num_edges = graph.get_num_edges()
         self.graph = graph
+        self.target = target
+        # Maps input ids of the owning context to the ids used by shared units
+        self.input_alias = input_alias if input_alias else {}
         for mu in self.forward_exec_units:
             for u in mu:
                 if u.compiled:
-                    u.prepare_compiled_kernel(graph, compiled_module)
+                    u.prepare_compiled_kernel(graph, compiled_module, target)
         for u in self.bulist:
             if u.compiled:
-                u.prepare_compiled_kernel(graph, compiled_module)
+                u.prepare_compiled_kernel(graph, compiled_module, target)
+        self.plan_memory()
+
+    def plan_memory(self):
+        """
+        Plans the storage of the intermediates. Vars handed to the backend,
+        i.e. the rets of the merged units and the grads returned by
+        backward_cb, keep buffers of their own.
+        """
+        pinned = set(self._rets)
+        for mu in self.forward_exec_units:
+            if mu.compiled():
+                pinned = pinned.union(mu.joint_rets())
+                pinned = pinned.union(ret._grad for ret in mu.joint_rets())
+                pinned = pinned.union(getattr(arg, "_grad", None) for arg in mu.joint_inputs())
+        forward_units = [u for mu in self.forward_exec_units for u in mu]
+        with compile_profiler.phase('storage_planning') as stats:
+            self.mem_plan = plan_storage(forward_units, self.bulist, pinned)
+            report = self.memory_report()
+            stats.update(report)
+        print_log(
+            "[green bold]Executor[/green bold]: Planned {} vars into {} slots, peak bytes {} -> {}".format(
+                report["vars"], report["slots"], report["peak_bytes_before"], report["peak_bytes_after"]
+            )
+        )
+
+        self.bwd_accumulated = set()
+        bwd_writes = set()
+        for bu in self.bulist:
+            if bu.compiled:
+                # Grads written by several backward units are accumulated
+                self.bwd_accumulated = self.bwd_accumulated.union(bwd_writes.intersection(bu.unit_rets()))
+                self.bwd_accumulated = self.bwd_accumulated.union(bu.accumulated_rets())
+                bwd_writes = bwd_writes.union(bu.unit_rets())
+
+    def memory_report(self):
+        """Peak bytes of the intermediates before and after storage planning, for the current graph"""
+        return self.mem_plan.report(self.num_nodes, self.num_edges)
 
     def construct_backward_mappping(self, funits, bunits):
         ret = {}
@@ -235,6 +388,10 @@ class Executor(object):
 
     def restart(self, input_map, graph=None):
         # print("ENTERING RESTART")
+        if self.input_alias:
+            aliased_map = {k: v for k, v in input_map.items() if k not in self.input_alias}
+            aliased_map.update({self.input_alias[k]: v for k, v in input_map.items() if k in self.input_alias})
+            input_map = aliased_map
         self.ts.reset(input_map, self.forward_exec_units, self.bulist)
         if graph != None:
 
@@ -257,12 +414,24 @@ class Executor(object):
 
             self.num_nodes = graph.get_num_nodes()
             self.num_edges = graph.get_num_edges()
+            # The backward units are bound to this graph in backward_cb
+            self.graph = graph
 
     def set_raw_ptr_cb(self, cb):
         self.raw_ptr = cb
 
+    def set_data_ptrs_cb(self, cb):
+        self.data_ptrs = cb
+
     def set_new_zeros_cb(self, cb):
         self.new_zeros = cb
+        self.arena.new_zeros = cb
+
+    def set_new_empty_cb(self, cb):
+        self.arena.new_empty = cb
+
+    def set_fill_zeros_cb(self, cb):
+        self.arena.fill_zeros = cb
 
     def execute(self, FuncWrapper):
         """Execute forward pass"""
@@ -290,14 +459,46 @@ class Executor(object):
 
         return ret
 
-    def create_tensor_for_vars(self, var_list):
+    def alloc_tensor_for_var(self, var, zero):
+        size = [self.num_edges if var.is_edgevar() else self.num_nodes] + list(var.var_shape)
+        if zero:
+            return self.new_zeros(size=size, dtype=var.var_dtype, device=var.device, requires_grad=False)
+        return self.arena.new_empty(size=size, dtype=var.var_dtype, device=var.device)
+
+    def bind_planned_var(self, var, slots):
+        """
+        Returns a view of the slot buffer the var is planned into, sized by
+        the current graph. Slots are acquired with the largest size they were
+        needed at so far, so that the snapshots of a dynamic graph, whose
+        sizes vary, recycle the same buffers.
+        """
+        slot = self.mem_plan.slot_of[var.id]
+        rows = self.num_edges if var.is_edgevar() else self.num_nodes
+        numel = rows * var_elems(var)
+        capacity = max(self.slot_capacity.get(slot.sid, 0), slot.rows(self.num_nodes, self.num_edges) * slot.elems)
+        self.slot_capacity[slot.sid] = capacity
+        if slot.sid not in slots:
+            slots[slot.sid] = self.arena.acquire(capacity, slot.dtype, slot.device, False)
+        buf = slots[slot.sid]
+        if buf.numel() < numel:
+            # Acquired for a smaller graph, e.g. in the forward of an earlier snapshot
+            return self.alloc_tensor_for_var(var, False)
+        return buf[:numel].view([rows] + list(var.var_shape))
+
+    def release_slots(self, slots, last_pos=None):
+        """Hands the slot buffers whose vars are all dead after last_pos back to the arena"""
+        for slot in self.mem_plan.slots:
+            if slot.sid in slots and (last_pos is None or slot.last_use <= last_pos):
+                self.arena.release(slots.pop(slot.sid))
+
+    def create_tensor_for_vars(self, var_list, accumulated_vars):
+        # Planned vars are zero-filled right before the unit writing them, as
+        # their slot may still be in use by an earlier var until then
         ret_tensors = {
-            var.id: self.new_zeros(
-                size=[self.num_edges if var.is_edgevar() else self.num_nodes]
-                + list(var.var_shape),
-                dtype=var.var_dtype,
-                device=var.device,
-                requires_grad=False,
+            var.id: (
+                self.bind_planned_var(var, self.ts.current_slots)
+                if self.mem_plan.is_planned(var)
+                else self.alloc_tensor_for_var(var, var in accumulated_vars)
             )
             for var in var_list
             if var.id not in self.ts.current_tensor_map
@@ -306,31 +507,33 @@ class Executor(object):
         for key, val in ret_tensors.items():
             self.ts.track_tensor(key, val)
 
-    def create_tensor_for_grad_vars(self, var_list, tensor_map):
-        ret_tensors = {
-            var.id: self.new_zeros(
-                size=[self.num_edges if var.is_edgevar() else self.num_nodes]
-                + list(var.var_shape),
-                dtype=var.var_dtype,
-                device=var.device,
-                requires_grad=False,
-            )
-            for var in var_list
-            if var.id not in tensor_map
-        }
+    def create_tensor_for_grad_vars(self, var_list, tensor_map, slots):
+        ret_tensors = {}
+        for var in var_list:
+            if var.id in tensor_map:
+                continue
+            zero = var in self.bwd_accumulated
+            if self.mem_plan.is_planned(var):
+                ret_tensors[var.id] = self.bind_planned_var(var, slots)
+                if zero:
+                    self.arena.fill_zeros(ret_tensors[var.id])
+            else:
+                ret_tensors[var.id] = self.alloc_tensor_for_var(var, zero)
         tensor_map = {**tensor_map, **ret_tensors}
         return tensor_map
 
     def execute_unit(self, unit, tensor_list):
-        arg_ptr = [self.raw_ptr(arg) for arg in tensor_list]
-        unit.kernel_run(arg_ptr)
+        if self.target == ExecutionTarget.CPU:
+            # CPU kernels operate on the tensors themselves
+            unit.kernel_run(tensor_list)
+            return
+        unit.kernel_run(self.data_ptrs(tensor_list))
 
     def execute_compiled(self, uid, FuncWrapper):
         units = self.forward_exec_units[uid]
         args = units.joint_args()
         rets = units.joint_rets()
-        for unit in units:
-            self.create_tensor_for_vars(unit.unit_rets())
+        self.create_tensor_for_vars(units.union_of_rets(), units.accumulated_rets())
 
         kernel_arg_list = units.kernel_arg_list()
         ret_tensors = FuncWrapper.apply(
@@ -345,18 +548,85 @@ class Executor(object):
         for i, ret in enumerate(rets):
             self.ts.track_tensor(ret.id, ret_tensors[i])
 
+    def zero_planned_accumulated_rets(self, unit, tensor_map):
+        """Planned vars the unit accumulates into are zero-filled right before it runs"""
+        for ret in unit.accumulated_rets():
+            if self.mem_plan.is_planned(ret) and self.mem_plan.starts_at(ret, unit):
+                self.arena.fill_zeros(tensor_map[ret.id])
+
+    def recompute_intermediates(self, units, inputs, slots):
+        """Reruns the forward units of a checkpointed execution from its inputs"""
+        tensor_map = dict(inputs)
+        accumulated_vars = units.accumulated_rets()
+        for var in units.union_of_rets():
+            if self.mem_plan.is_planned(var):
+                tensor_map[var.id] = self.bind_planned_var(var, slots)
+            else:
+                tensor_map[var.id] = self.alloc_tensor_for_var(var, var in accumulated_vars)
+        for unit in units:
+            unit.reset_graph_info(self.graph)
+            self.zero_planned_accumulated_rets(unit, tensor_map)
+            self.execute_unit(unit, [tensor_map[arg.id] for arg in unit.kernel_args()])
+        return tensor_map
+
+    def offload_intermediates(self, units, saved):
+        """Moves the saved intermediates of an execution to pinned host memory"""
+        ret_ids = set(var.id for var in units.union_of_rets())
+        offloaded = {}
+        for key, val in saved.items():
+            if key in ret_ids:
+                if val.is_cuda:
+                    host = torch.empty(val.shape, dtype=val.dtype, pin_memory=True)
+                    host.copy_(val)
+                    val = host
+                else:
+                    # Already on the host, only detach it from the shared slots
+                    val = val.clone()
+            offloaded[key] = val
+        return offloaded
+
+    def restore_intermediates(self, units, saved):
+        ret_ids = set(var.id for var in units.union_of_rets())
+        device = {var.id: var.device for var in units.union_of_rets()}
+        return {
+            key: val.to(device[key], non_blocking=True) if key in ret_ids else val
+            for key, val in saved.items()
+        }
+
     def forward_cb(self, uid, kernel_args, rets, tensor_list):
         """FuncWrapper will call this function in forward pass"""
         units = self.forward_exec_units[uid]
         for i, unit in enumerate(units):
+            # Units are shared with the executors of other contexts through the
+            # program registry, they are bound to our graph right before running
+            unit.reset_graph_info(self.graph)
+            self.zero_planned_accumulated_rets(unit, self.ts.current_tensor_map)
             self.execute_unit(unit, [tensor_list[tidx] for tidx in kernel_args[i]])
 
-        self.ts.tensor_map_stack.push(
-            {
-                key: self.ts.current_tensor_map[key]
-                for key in self.ts.bwd_common_tensor_list
+        saved = {
+            key: self.ts.current_tensor_map[key]
+            for key in self.ts.bwd_common_tensor_list
+        }
+        checkpointing = get_activation_checkpointing()
+        mode = CheckpointMode.NONE
+        if not checkpointing.keeps(len(self.ts.tensor_map_stack)):
+            mode = checkpointing.mode
+        if mode == CheckpointMode.RECOMPUTE:
+            # Only the inputs are kept, backward_cb recomputes the rest
+            saved = {
+                var.id: tensor_list[i]
+                for i, var in enumerate(units.joint_args())
+                if var in units.joint_inputs()
             }
-        )
+        elif mode == CheckpointMode.OFFLOAD:
+            saved = self.offload_intermediates(units, saved)
+        self.ts.tensor_map_stack.push(saved)
+        self.ts.checkpoint_stack.push(mode)
+        self.ts.slot_stack.push(self.ts.current_slots)
+        if mode == CheckpointMode.NONE:
+            self.release_slots(self.ts.current_slots, self.mem_plan.positions[units.last()])
+        else:
+            self.release_slots(self.ts.current_slots)
         # self.ts.tensor_map_stack.push(self.ts.current_tensor_map)
 
         if isinstance(self.graph, DynamicGraph):
@@ -381,14 +651,33 @@ class Executor(object):
             ret._grad for ret in rets
         ]  # ret_grads corresponds vars in grad_list
         tensor_map = self.ts.tensor_map_stack.top()
+        mode = self.ts.checkpoint_stack.top()
+        slots = self.ts.slot_stack.top()
 
         if isinstance(self.graph, DynamicGraph):
             current_timestamp = self.ts.graph_timestamp_stack.top()
-            self.graph.get_backward_graph(current_timestamp)
+            if mode == CheckpointMode.RECOMPUTE:
+                self.graph.get_graph_for_recompute(current_timestamp)
+            else:
+                self.graph.get_backward_graph(current_timestamp)
+            # Buffers of this timestamp are sized by its snapshot
+            self.num_nodes = self.graph.get_num_nodes()
+            self.num_edges = self.graph.get_num_edges()
+
+        if mode == CheckpointMode.RECOMPUTE:
+            tensor_map = self.recompute_intermediates(funits, tensor_map, slots)
+            if isinstance(self.graph, DynamicGraph):
+                self.graph.end_recompute()
+        elif mode == CheckpointMode.OFFLOAD:
+            tensor_map = self.restore_intermediates(funits, tensor_map)
 
         for i, grad in enumerate(ret_grads):
             # We track the ret_grads as its value is fixed to grad_list
-            tensor_map[grad.id] = grad_list[i]
+            if grad is not None:
+                # None for rets only materialized for backward, e.g. the result of AggMax
+                # Kernels index the grads as dense arrays, while autograd hands
+                # out expanded views, e.g. the grad of sum()
+                tensor_map[grad.id] = grad_list[i].contiguous() if grad_list[i] is not None else None
         arg_grads = [
             arg._grad if arg in inputs and arg.requires_grad else None for arg in args
         ]  # arg_grads corresponds to the grads of funit.unit_args
@@ -402,7 +691,7 @@ class Executor(object):
                 bu.reset_graph_info(self.graph)
 
                 tensor_map = self.create_tensor_for_grad_vars(
-                    bu.unit_rets(), tensor_map
+                    bu.unit_rets(), tensor_map, slots
                 )
 
                 self.execute_unit(bu, [tensor_map[arg.id] for arg in bu.kernel_args()])
@@ -410,21 +699,44 @@ class Executor(object):
                 # self.ts.track_executed_bu(bu)
             else:
                 # The backward pass of some forward unit may be splitted into compiled and uncompiled parts
-                self.execute_prog([bu])
+                self.execute_nodewise(bu, tensor_map)
 
         ret = tuple(
-            [tensor_map[grad.id] if grad != None else None for grad in arg_grads]
+            [
+                self.reduce_param_grad(arg, tensor_map[grad.id]) if grad != None else None
+                for arg, grad in zip(args, arg_grads)
+            ]
             + [None for grad in ret_grads]
         )
 
+        self.release_slots(slots)
+
         del tensor_map
         self.ts.tensor_map_stack.pop()
+        self.ts.checkpoint_stack.pop()
+        self.ts.slot_stack.pop()
 
         if isinstance(self.graph, DynamicGraph):
             self.ts.graph_timestamp_stack.pop()
 
         return ret
 
+    def reduce_param_grad(self, arg, grad):
+        """A param broadcast over the nodes, e.g. a fused bias, gets the grads of all nodes summed"""
+        if arg.val_type == ValType.PARAM and grad.dim() > len(arg.var_shape):
+            return grad.sum(0)
+        return grad
+
+    def execute_nodewise(self, unit, tensor_map):
+        """Runs the node-wise stmts of an uncompiled backward unit over whole node tensors"""
+        for stmt in unit.program:
+            args = [tensor_map[arg.id] if not is_const_scalar(arg) else arg for arg in stmt.args]
+            if stmt.callback:
+                tensor_map[stmt.ret.id] = stmt.execute(args)
+            else:
+                # Grad stmts created by autodiff have no traced callback
+                tensor_map[stmt.ret.id] = cpu_op_table[stmt.op_name.lower()](stmt, *args)
+
     def execute_prog(self, units):
         current_tensor_map = self.ts.current_tensor_map
         self.ts.clear_current_tensor_state()
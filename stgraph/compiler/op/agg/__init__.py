@@ -0,0 +1 @@
+from .agg_op import agg_max, agg_mean, agg_min
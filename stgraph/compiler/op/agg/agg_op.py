@@ -1,23 +1,26 @@
 import abc
 
-from ..program import Stmt
-from ..schema import Schema
+from stgraph.compiler.program import Stmt
+from stgraph.compiler.schema import Schema
 
 from stgraph.compiler.val.val import Val
 from stgraph.compiler.utils import ValType
-from stgraph.compiler.val.val_factory import ValFactory
 
 class AggOp(abc.ABC):
-    def __call__(self, fprog, args):
-        bkend = args[0].backend
+    '''
+        Aggregates the values of the neighbours of the central node, the way
+        sum() does through TorchVal.__radd__, e.g.
+        agg_mean([nb.h for nb in v.innbs])
+    '''
+    def __call__(self, vals):
+        vals = list(vals)
+        assert len(vals) > 0, 'Nothing to aggregate'
+        val = vals[0]
+        assert isinstance(val, Val) and val.val_type in (ValType.SRC, ValType.EDGE)
         vtype = ValType.DEST # Aggregation op are almost always used in forward propagation. This assumption may break in the future.
-        t = args[0].v 
-        val_factory = ValFactory()
-        ret_val = val_factory.create(vtype, t.clone().detach().requires_grad_(False), bkend, None, fprog, False)
-        fprog.append_stmt(Stmt.create_stmt(self.to_schema(),
-                                                args=list((arg.var if isinstance(arg, Val) else arg for arg in args)),
-                                                ret = ret_val.var,
-                                                callback=None))
+        ret_val = val.val_factory.create(vtype, val.v.clone().detach().requires_grad_(False), val.backend, None, val.fprog, False)
+        # The callback is omitted since we will generate code for it
+        val.fprog.append_stmt(Stmt.create_stmt(self.to_schema(), args=[val.var], ret=ret_val.var))
         return ret_val
 
     @abc.abstractmethod
@@ -34,4 +37,8 @@ class AggMinOp(AggOp):
 
 class AggMeanOp(AggOp):
     def to_schema(self):
-        return Schema('AggMean')
\ No newline at end of file
+        return Schema('AggMean')
+
+agg_max = AggMaxOp()
+agg_min = AggMinOp()
+agg_mean = AggMeanOp()
@@ -1,12 +1,45 @@
 from .cse import CSE
 from .cf import CF
-from .dce import DCE
+from .dce import DCE, joint_DCE
 from .fusion import fuse
-from .mem_planning import mem_planning
+from .mem_planning import mem_planning, plan_storage, var_bytes
+
+from stgraph.compiler.debugging.compile_profiler import compile_profiler, count_stmts
+from stgraph.compiler.debugging.stgraph_logger import print_log
 
 def optimize(prog):
-    CF(prog)
-    CSE(prog)
+    with compile_profiler.phase('optimize', stmts_before=count_stmts(prog)) as stats:
+        CF(prog)
+        CSE(prog)
+        stats['stmts_after'] = count_stmts(prog)
+
+def saved_vars(forward_units, backward_units):
+    '''Vars of the forward pass the backward units read, kept per execution until its backward'''
+    produced = set()
+    read = set()
+    for unit in backward_units:
+        produced = produced.union(unit.all_rets())
+        read = read.union(unit.unit_args())
+    return read.difference(produced)
 
-def joint_optimize(F, B):
-    DCE(F, B)
\ No newline at end of file
+def joint_optimize(forward_units, backward_units, outputs, num_nodes, num_edges):
+    '''
+        Optimizes the forward and backward execution units together, removing
+        the stmts, units and saved tensors that neither the outputs nor the
+        grads depend on. The removed bytes are reported for the given graph size.
+    '''
+    units_before = len(forward_units) + len(backward_units)
+    stmts_before = sum(len(unit.program) for unit in forward_units + backward_units)
+    saved_before = saved_vars(forward_units, backward_units)
+    with compile_profiler.phase('joint_optimize', units_before=units_before, stmts_before=stmts_before) as stats:
+        forward_units, backward_units, removed = joint_DCE(forward_units, backward_units, outputs)
+        removed = set(removed).union(saved_before.difference(saved_vars(forward_units, backward_units)))
+        report = {
+            'units_removed': units_before - len(forward_units) - len(backward_units),
+            'stmts_removed': stmts_before - sum(len(unit.program) for unit in forward_units + backward_units),
+            'bytes_removed': sum(var_bytes(var, num_nodes, num_edges) for var in removed),
+        }
+        stats.update(report)
+    print_log('[cyan bold]Joint Optimize[/cyan bold]: Removed {} units, {} stmts and {} bytes of materialized vars'.format(
+        report['units_removed'], report['stmts_removed'], report['bytes_removed']))
+    return forward_units, backward_units, report
\ No newline at end of file
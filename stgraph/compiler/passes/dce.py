@@ -6,4 +6,63 @@ def DCE(prog, output_vars):
     '''
     for s in reversed(prog): 
         if len(s.ret.users) == 0 and s.ret not in output_vars:
-            s.remove_cur()
\ No newline at end of file
+            s.remove_cur()
+
+def prune_unit(unit, live_vars):
+    '''
+        Stops materializing the rets of unit outside live_vars and removes
+        the stmts neither of the remaining rets depends on.
+        Returns the rets no longer written.
+    '''
+    dead = [ret for ret in unit.unit_rets() if ret not in live_vars]
+    unit.remove_rets(dead)
+    if unit.compiled:
+        DCE(unit.program, unit.unit_rets())
+    else:
+        # Every stmt of an uncompiled unit writes a tensor that later units may read
+        DCE(unit.program, live_vars)
+    unit.update_vars()
+    return dead
+
+def joint_DCE(forward_units, backward_units, outputs):
+    '''
+        DCE across the forward and backward execution units, modify units in place.
+        The backward units are pruned to the grads handed back to the backend,
+        i.e. those of the args of compiled forward units requiring grad. The
+        forward units are pruned to the outputs and the vars the remaining
+        backward units read. Units left without rets are removed.
+
+        Returns the remaining forward and backward units along with the
+        vars no longer materialized
+    '''
+    grads = set()
+    for unit in forward_units:
+        if unit.compiled:
+            grads = grads.union(arg._grad for arg in unit.unit_args() if arg.requires_grad and arg._grad is not None)
+
+    def prune(units, needed):
+        removed = []
+        changed = True
+        while changed:
+            live = set(needed)
+            for unit in units:
+                live = live.union(unit.unit_args())
+            changed = False
+            kept = []
+            for unit in units:
+                dead = prune_unit(unit, live)
+                removed += dead
+                changed = changed or len(dead) > 0
+                if len(unit.program) > 0:
+                    kept.append(unit)
+                else:
+                    changed = True
+            units = kept
+        return units, removed
+
+    backward_units, removed_bwd = prune(backward_units, grads)
+    saved = set()
+    for unit in backward_units:
+        saved = saved.union(unit.unit_args())
+    forward_units, removed_fwd = prune(forward_units, saved.union(outputs))
+    return forward_units, backward_units, removed_fwd + removed_bwd
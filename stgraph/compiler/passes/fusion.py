@@ -22,12 +22,19 @@ class FusionStateMachine():
     def __init__(self, init_stmt=None):
         self.cur = 0
         if init_stmt:
-            self.accept(init_stmt)
+            # Starting from the downstream stmt, so that a node-wise stmt
+            # feeding an aggregation cannot take a second one along
+            self.advance(init_stmt)
     
     def accept(self, stmt):
         trans = FusionStateMachine.stmt_to_trans(stmt)
         return trans in FusionStateMachine.state_trans[self.cur]
 
+    def computes_per_edge(self, stmt):
+        '''Node-wise stmts fused ahead of the edge stage are evaluated for each edge'''
+        trans = FusionStateMachine.stmt_to_trans(stmt)
+        return stmt.is_nodewise() and FusionStateMachine.state_trans[self.cur].get(trans) == 2
+
     def advance(self, stmt):
         trans = FusionStateMachine.stmt_to_trans(stmt)
         if trans in FusionStateMachine.state_trans[self.cur]:
@@ -95,7 +102,7 @@ def find_var(var, prog_list):
             return ret
     return None
 
-def fusable(downstream_s, upstream_s, stmt2state_machine, new_fsm):
+def fusable(downstream_s, upstream_s, stmt2state_machine, new_fsm, output_ids):
     if 'gtypecast' in upstream_s.op_name.lower():
         # type casts are fusion breaker
         return False
@@ -103,6 +110,9 @@ def fusable(downstream_s, upstream_s, stmt2state_machine, new_fsm):
     b = upstream_s.is_supported()
     if a and b:
         fsm = stmt2state_machine[downstream_s]
+        if upstream_s.ret.id in output_ids and fsm.computes_per_edge(upstream_s):
+            # Written from the edge loop, the output would miss nodes without edges
+            return False
         if fsm.accept(upstream_s):
             if new_fsm:
                 nfsm = copy.deepcopy(fsm)
@@ -116,11 +126,11 @@ def fusable(downstream_s, upstream_s, stmt2state_machine, new_fsm):
         return True
     return False
 
-def merge_stmt(cur_stmt, p_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm):
+def merge_stmt(cur_stmt, p_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm, output_ids):
     if 'gtypecast' in cur_stmt.op_name.lower():
         stmt_stack.append(p_stmt)
         return
-    if fusable(cur_stmt, p_stmt, stmt2state_machine, new_fsm):
+    if fusable(cur_stmt, p_stmt, stmt2state_machine, new_fsm, output_ids):
         if p_stmt in stmt2fused_prog:
             if cur_stmt in stmt2fused_prog:
                 cur_prog = stmt2fused_prog[cur_stmt]
@@ -156,27 +166,101 @@ def merge_stmt(cur_stmt, p_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack
 def unit_independent(u1, u2):
     return not u1.depends_on(u2) and not u2.depends_on(u1)
 
-def merge_independent(exec_units):
-    # Merge units that share the same inputs and has no dependency among each other
-    # Check dependency and propose candidate
-    candidates = {}
-    for i in range(len(exec_units)):
-        candidates[i] = []
-        for j in range(i+1, len(exec_units)):
-            if unit_independent(exec_units[i], exec_units[j]) and exec_units[i].compiled == exec_units[j].compiled:
-                candidates[i].append(j)
+def fits_dims(var, dims):
+    '''Mirrors the element-wise and broadcast offsets LinearizedKernelContext generates'''
+    var_dim = 1
+    for d in var.var_shape:
+        var_dim *= d
+    unit_dim = 1
+    for d in dims:
+        unit_dim *= d
+    if var_dim == unit_dim:
+        return True
+    if len(dims) == 2:
+        return var_dim == dims[-2]
+    return var_dim == 1
+
+def dims_compatible(u1, u2):
+    d1, d2 = u1.max_dims(), u2.max_dims()
+    if d1 == d2:
+        return True
+    if len(d1) != len(d2):
+        return False
+    dims = [max(a, b) for a, b in zip(d1, d2)]
+    return all(fits_dims(var, dims) for var in u1.get_all_vars().union(u2.get_all_vars()))
+
+def parallel_mode_compatible(units):
+    '''
+        Aggregations writing to the other side than the merged parallel mode are
+        written atomically from the edge loop, hence only complete at the end of
+        the kernel. Their units must not use them in node-wise stmts, and only
+        sums can be accumulated into the zero-filled output that way.
+    '''
+    mode = ExecutionUnit.merged_parallel_mode(units)
+    for unit in units:
+        _, aggs, nodes = unit.stmt_sections()
+        for agg in aggs:
+            on_row = agg.ret.is_dstvar() == (mode == ParallelMode.DstParallel)
+            if not on_row and (nodes or 'sum' not in agg.op_name.lower()):
+                return False
+    return True
+
+def horizontally_fusable(group, unit):
+    if any(member.compiled != unit.compiled or not unit_independent(member, unit) for member in group):
+        return False
+    if not unit.compiled:
+        return True
+    return all(dims_compatible(member, unit) for member in group) and parallel_mode_compatible(group + [unit])
+
+def has_cycle(groups):
+    '''Whether executing the groups as single units leaves no valid order'''
+    deps = {i: {j for j, other in enumerate(groups) if j != i and
+                any(u.depends_on(o) for u in group for o in other)} for i, group in enumerate(groups)}
+    state = {}
+    def visit(i):
+        state[i] = 1
+        for j in deps[i]:
+            if state.get(j) == 1 or (j not in state and visit(j)):
+                return True
+        state[i] = 2
+        return False
+    return any(i not in state and visit(i) for i in deps)
+
+def horizontal_fusion(exec_units):
+    '''
+        Merges sibling units, which do not depend on each other, into one
+        multi-output unit, so that the adjacency is traversed once for all of
+        them instead of once per unit. Units must be in execution order.
+    '''
+    groups = []
+    for unit in exec_units:
+        for group in groups:
+            if horizontally_fusable(group, unit):
+                group.append(unit)
+                if not has_cycle(groups):
+                    break
+                # Merging would put the group both before and after another unit
+                group.pop()
+        else:
+            groups.append([unit])
+
+    # Order the groups by their dependencies, keeping the original order otherwise
+    ordered = []
+    remaining = list(groups)
+    while remaining:
+        for group in remaining:
+            if not any(u.depends_on(o) for u in group for other in remaining if other is not group for o in other):
+                ordered.append(group)
+                remaining.remove(group)
+                break
 
-    # Merge candidates
     merged_units = []
-    merged_set = set()
-    for tar_id, src_id_list in candidates.items():
-        if tar_id in merged_set:
-            continue
-        tar_unit = exec_units[tar_id]
-        for sid in src_id_list:
-            src_unit = exec_units[sid]
+    for group in ordered:
+        tar_unit = group[0]
+        for src_unit in group[1:]:
             tar_unit.merge_with_independent_unit(src_unit)
-            merged_set.add(sid)
+        if len(group) > 1:
+            print_log(f"[orange1 bold]Fusion[/orange1 bold]: Horizontally fused {len(group)} units into {tar_unit.kernel_name}")
         merged_units.append(tar_unit)
     return merged_units
 
@@ -205,6 +289,7 @@ def fuse(progs, outputs):
         if ret:
             var_list.append(ret)
     var_list.sort(key=lambda var: var.int_id)
+    output_ids = {var.id for var in var_list}
     var_stack = deque(var_list)
     
     while var_stack:
@@ -227,17 +312,17 @@ def fuse(progs, outputs):
                 stmt2state_machine[cur_stmt] = FusionStateMachine(cur_stmt)
             if len(dep_stmts) == 1:
                 p_stmt = dep_stmts[0]
-                merge_stmt(cur_stmt, p_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=False)
+                merge_stmt(cur_stmt, p_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=False, output_ids=output_ids)
             elif len(dep_stmts) == 2:
                 l_stmt = dep_stmts[0]
                 r_stmt = dep_stmts[1]
                 if l_stmt.depends_on(r_stmt):
-                    merge_stmt(cur_stmt, l_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=False)
+                    merge_stmt(cur_stmt, l_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=False, output_ids=output_ids)
                 elif r_stmt.depends_on(l_stmt):
-                    merge_stmt(cur_stmt, r_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=False)
+                    merge_stmt(cur_stmt, r_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=False, output_ids=output_ids)
                 else:
-                    merge_stmt(cur_stmt, r_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=True)
-                    merge_stmt(cur_stmt, l_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=True)
+                    merge_stmt(cur_stmt, r_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=True, output_ids=output_ids)
+                    merge_stmt(cur_stmt, l_stmt, stmt2fused_prog, stmt2state_machine, stmt_stack, var_stack, prog_list, new_fsm=True, output_ids=output_ids)
             else:
                 raise NotImplementedError('Currenty we assume num of oprands of all operators is no larger than 2')
             
@@ -285,11 +370,12 @@ def fuse(progs, outputs):
             if var in unit.tmps:
                 unit.add_ret_val(var)
 
-    # Materialize aggregation results for backward use (s.b.j. to mem-planning) except sum
+    # Materialize aggregation results for backward use (s.b.j. to mem-planning),
+    # only max and min need them
     for u in exe_units:
         for stmt in u.program:
             if stmt.is_agg():
-                if 'sum' not in stmt.op_name.lower():
+                if 'max' in stmt.op_name.lower() or 'min' in stmt.op_name.lower():
                     u.add_ret_val(stmt.ret)
                 if stmt.ret.is_dstvar():
                     u.set_parallel_mode(ParallelMode.DstParallel)
@@ -299,7 +385,7 @@ def fuse(progs, outputs):
     # Sort by return id in order to satisfy the dependency between execution unit
     # Correctness remains quesationable
     exe_units.sort(key=lambda x:x.max_ret_id())
-    exe_units = merge_independent(exe_units)
+    exe_units = horizontal_fusion(exe_units)
     
     print_log("[orange1 bold]Fusion[/orange1 bold]: Constructing execution unit completed")
     
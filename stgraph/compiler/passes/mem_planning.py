@@ -5,26 +5,314 @@ from ..utils import is_const_scalar
 
 from stgraph.compiler.debugging.stgraph_logger import print_log
 
-def mem_planning(funits, BProg, grad_map, grads):
+# FLOPs per element of the element-wise ops cheap enough to be rebuilt in the
+# backward kernels, keyed by the lower case op name as in cpu_op_table.
+# Transcendental functions count as several FLOPs.
+RECOMPUTE_FLOPS = {
+    'add': 1,
+    'sub': 1,
+    'mul': 1,
+    'truediv': 1,
+    'relu': 1,
+    'leakyrelu': 1,
+    'clamp': 1,
+    'hardtanh': 1,
+    'relu6': 1,
+    'exp': 4,
+    'sigmoid': 4,
+    'tanh': 4,
+}
+# A saved var is rebuilt instead when the extra FLOPs per edge stay below
+# this many per byte no longer saved
+MAX_RECOMPUTE_FLOPS_PER_BYTE = 4.0
+
+def mem_planning(funits, BProg, grad_map, grads, outputs=()):
     ''' 
         Conduct memory planning by considering both FProg and BProg
-        Create annotations for the graph so that code-generation can be done
-        TODO:
-        Add cost-model to choose a different materialized vars
+        Create annotations for the graph so that code-generation can be done.
+        The materialized vars the cost model finds cheaper to rebuild are
+        recomputed by the backward programs instead of being saved. PH still
+        rewrites in terms of every materialized var, the rebuilt ones it
+        introduces are then saved as before.
     '''
 
     materialized_vars = set(grads)
     for unit in funits:
         materialized_vars = materialized_vars.union(unit.materilized_vars())
+    saved_vars = choose_materialized_vars(funits, materialized_vars, grad_map.values(), outputs)
 
     print_log("[red bold]Peephole[/red bold]: Starting Peephole optimization")
 
     bp_list = []
     for var, grad in grad_map.items():
-        bp_list.append(dep_program(grad, stopping_vars=materialized_vars))
+        bp_list.append(dep_program(grad, stopping_vars=saved_vars))
 
     for bp in bp_list:
         PH(bp, materialized_vars, set([grad_map[key] for key in grad_map]))
         
     print_log("[red bold]Peephole[/red bold]: Peephole optimization completed")
-    return bp_list
\ No newline at end of file
+    return bp_list
+
+def recompute_stmts(var, stopping_vars):
+    '''
+        The stmts computing var from stopping_vars, without modifying the program.
+        Returns None if var cannot be rebuilt by cheap element-wise stmts.
+    '''
+    stmts = []
+    seen = set()
+    stack = [var]
+    while stack:
+        cur = stack.pop()
+        if cur in seen:
+            continue
+        seen.add(cur)
+        stmt = cur.stmt
+        if stmt is None or stmt.op_name.lower() not in RECOMPUTE_FLOPS or not stmt.is_element_wise_fusable():
+            return None
+        stmts.append(stmt)
+        for arg in stmt.args:
+            if not is_const_scalar(arg) and arg not in stopping_vars:
+                stack.append(arg)
+    return stmts
+
+def rebuilt_vars(roots, stopping_vars):
+    '''Vars the programs of roots compute, those of the forward pass are already rebuilt in backward'''
+    seen = set()
+    stack = list(roots)
+    while stack:
+        cur = stack.pop()
+        if cur in seen:
+            continue
+        seen.add(cur)
+        if cur.stmt is not None:
+            stack.extend(arg for arg in cur.stmt.args if not is_const_scalar(arg) and arg not in stopping_vars)
+    return seen
+
+def recompute_flops(stmts, rebuilt):
+    '''FLOPs per row of the stmts not already rebuilt in backward'''
+    return sum(RECOMPUTE_FLOPS[stmt.op_name.lower()] * var_elems(stmt.ret)
+               for stmt in stmts if stmt.ret not in rebuilt)
+
+def choose_materialized_vars(funits, materialized_vars, grads, outputs=()):
+    '''
+        Cost model choosing which of the materialized vars the backward pass
+        reads are saved and which are rebuilt. A var is rebuilt when the
+        element-wise stmts computing it from the vars that stay saved take
+        fewer than MAX_RECOMPUTE_FLOPS_PER_BYTE FLOPs per byte it frees,
+        counting only the stmts the backward pass does not rebuild already.
+
+        Only edge vars are considered: they take the average degree times the
+        bytes of node vars, while rebuilding node vars in the edge-wise
+        backward kernels would repeat the work for every edge.
+
+        Returns the vars to keep materialized
+    '''
+    materialized_vars = set(materialized_vars)
+    forward_rets = set()
+    for unit in funits:
+        if unit.compiled:
+            forward_rets = forward_rets.union(unit.unit_rets())
+    rebuilt = rebuilt_vars(grads, materialized_vars)
+    read = set()
+    for var in rebuilt:
+        if var.stmt is not None:
+            read = read.union(arg for arg in var.stmt.args if not is_const_scalar(arg))
+
+    # The vars as read by the backward pass, these lead to the stmts computing them
+    candidates = [var for var in read
+                  if var.is_edgevar() and var in materialized_vars and var in forward_rets and var not in outputs]
+    # Largest first, these free the most bytes
+    candidates.sort(key=lambda v: (-var_elems(v) * dtype_bytes(v.var_dtype), v.id))
+    pinned = set()
+    for var in candidates:
+        if var in pinned:
+            continue
+        stopping = materialized_vars - set([var])
+        stmts = recompute_stmts(var, stopping)
+        if stmts is None:
+            continue
+        flops = recompute_flops(stmts, rebuilt)
+        saved = var_elems(var) * dtype_bytes(var.var_dtype)
+        if flops > MAX_RECOMPUTE_FLOPS_PER_BYTE * saved:
+            continue
+        materialized_vars = stopping
+        rebuilt = rebuilt.union(stmt.ret for stmt in stmts)
+        # The vars rebuilding var have to stay saved
+        for stmt in stmts:
+            pinned = pinned.union(arg for arg in stmt.args if not is_const_scalar(arg) and arg in stopping)
+        print_log('[red bold]MemPlanning[/red bold]: Rebuilding {} in backward with {} FLOPs instead of saving {} bytes per edge'.format(
+            var.id, flops, saved))
+    return materialized_vars
+
+def var_elems(var):
+    '''Number of elements stored per node or edge'''
+    elems = 1
+    for d in var.var_shape:
+        elems *= d
+    return elems
+
+def dtype_bytes(dtype):
+    return getattr(dtype, 'itemsize', 4)
+
+def var_bytes(var, num_nodes, num_edges):
+    '''Bytes of the buffer of var for a graph of the given size'''
+    rows = num_edges if var.is_edgevar() else (num_nodes if var.is_nodevar() else 1)
+    return rows * var_elems(var) * dtype_bytes(var.var_dtype)
+
+class MemSlot():
+    '''A node or edge sized buffer shared by vars whose live ranges do not overlap'''
+    def __init__(self, sid, is_edge, dtype, device):
+        self.sid = sid
+        self.is_edge = is_edge
+        self.dtype = dtype
+        self.device = device
+        self.elems = 0
+        self.vars = []
+        self.owner = None
+        self.last_use = -1
+
+    def key(self):
+        return (self.is_edge, str(self.dtype), str(self.device))
+
+    def rows(self, num_nodes, num_edges):
+        return num_edges if self.is_edge else num_nodes
+
+    def __repr__(self):
+        return 'MemSlot({}, {}, elems={}, vars={})'.format(self.sid, 'edge' if self.is_edge else 'node',
+                                                            self.elems, [var.id for var in self.vars])
+
+class StoragePlan():
+    r"""Assignment of the intermediate vars of a compiled program to shared slots
+
+    The execution units of the forward pass followed by those of the backward
+    pass form the timeline. The live range of a var spans from the first unit
+    writing it to the last unit reading or writing it. Vars with disjoint live
+    ranges are assigned to the same slot, so a slot needs to be as large as
+    the largest of its vars only.
+    """
+    def __init__(self, timeline):
+        self.timeline = timeline
+        self.positions = {unit: pos for pos, unit in enumerate(timeline)}
+        self.live_ranges = {}
+        self.slots = []
+        self.slot_of = {}
+        self.inplace = 0
+
+    def is_planned(self, var):
+        return var.id in self.slot_of
+
+    def starts_at(self, var, unit):
+        return self.live_ranges[var][0] == self.positions[unit]
+
+    def unplanned_bytes(self, num_nodes, num_edges):
+        '''Bytes needed when every planned var has a buffer of its own'''
+        return sum((num_edges if var.is_edgevar() else num_nodes) * var_elems(var) * dtype_bytes(var.var_dtype)
+                   for var in self.live_ranges)
+
+    def planned_bytes(self, num_nodes, num_edges):
+        return sum(slot.rows(num_nodes, num_edges) * slot.elems * dtype_bytes(slot.dtype) for slot in self.slots)
+
+    def live_bytes(self, num_nodes, num_edges):
+        '''Largest number of bytes live at any unit, no plan can go below it'''
+        peak = 0
+        for pos in range(len(self.timeline)):
+            live = sum((num_edges if var.is_edgevar() else num_nodes) * var_elems(var) * dtype_bytes(var.var_dtype)
+                       for var, (start, end) in self.live_ranges.items() if start <= pos <= end)
+            peak = max(peak, live)
+        return peak
+
+    def report(self, num_nodes, num_edges):
+        return {
+            'vars': len(self.live_ranges),
+            'slots': len(self.slots),
+            'inplace': self.inplace,
+            'peak_bytes_before': self.unplanned_bytes(num_nodes, num_edges),
+            'peak_bytes_after': self.planned_bytes(num_nodes, num_edges),
+            'live_bytes': self.live_bytes(num_nodes, num_edges),
+        }
+
+def compute_live_ranges(timeline, pinned):
+    '''
+        Live range [first write, last use] of every var written by a compiled unit.
+        Vars read by uncompiled units are handled by the backend and never planned.
+    '''
+    ranges = {}
+    pinned = set(pinned)
+    for pos, unit in enumerate(timeline):
+        if not unit.compiled:
+            pinned = pinned.union(unit.unit_args())
+            continue
+        for ret in unit.unit_rets():
+            if ret in ranges:
+                ranges[ret][1] = pos
+            else:
+                ranges[ret] = [pos, pos]
+        for arg in unit.unit_args():
+            if arg in ranges:
+                ranges[arg][1] = pos
+    return {var: tuple(r) for var, r in ranges.items()
+            if var not in pinned and (var.is_edgevar() or var.is_nodevar())}
+
+def can_update_inplace(unit, arg, ret):
+    '''
+        ret may take over the buffer of arg within unit when both are edge vars
+        of the same shape and ret is assigned by an edge-wise statement after
+        which arg is not read anymore. Every thread then reads arg and writes
+        ret at the same offset.
+    '''
+    if not (arg.is_edgevar() and ret.is_edgevar()):
+        return False
+    if list(arg.var_shape) != list(ret.var_shape) or arg.var_dtype != ret.var_dtype:
+        return False
+    if arg in unit.unit_rets() or ret in unit.accumulated_rets():
+        return False
+    stmts = [stmt for stmt in unit.program]
+    idx = [i for i, stmt in enumerate(stmts) if stmt.ret == ret]
+    if len(idx) != 1 or stmts[idx[0]].is_agg():
+        return False
+    for stmt in stmts[idx[0] + 1:]:
+        if arg in stmt.args:
+            return False
+    return True
+
+def plan_storage(forward_units, backward_units, pinned):
+    '''
+        Assigns the intermediates of forward_units and backward_units to shared
+        slots. pinned vars have buffers of their own, these are the vars handed
+        to or received from the backend.
+    '''
+    plan = StoragePlan(list(forward_units) + list(backward_units))
+    plan.live_ranges = compute_live_ranges(plan.timeline, pinned)
+
+    starting = {}
+    for var, (start, end) in plan.live_ranges.items():
+        starting.setdefault(start, []).append(var)
+
+    for pos, unit in enumerate(plan.timeline):
+        # Largest first so that small vars do not grow the slots
+        for var in sorted(starting.get(pos, []), key=lambda v: (-var_elems(v), v.id)):
+            key = (var.is_edgevar(), str(var.var_dtype), str(var.device))
+            slot = None
+            for arg in unit.unit_args():
+                owner_slot = plan.slot_of.get(arg.id, None)
+                if (owner_slot is not None and owner_slot.owner == arg and owner_slot.last_use == pos
+                        and can_update_inplace(unit, arg, var)):
+                    slot = owner_slot
+                    plan.inplace += 1
+                    break
+            if slot is None:
+                free = [s for s in plan.slots if s.key() == key and s.last_use < pos]
+                fitting = [s for s in free if s.elems >= var_elems(var)]
+                if fitting:
+                    slot = min(fitting, key=lambda s: (s.elems, s.sid))
+                elif free:
+                    slot = max(free, key=lambda s: (s.elems, -s.sid))
+                else:
+                    slot = MemSlot(len(plan.slots), var.is_edgevar(), var.var_dtype, var.device)
+                    plan.slots.append(slot)
+            slot.elems = max(slot.elems, var_elems(var))
+            slot.vars.append(var)
+            slot.owner = var
+            slot.last_use = plan.live_ranges[var][1]
+            plan.slot_of[var.id] = slot
+    return plan
@@ -1,7 +1,7 @@
 from collections.abc import Iterable
 from collections import namedtuple
 from .schema import Schema 
-from .utils import infer_op_type_from_args, val_seq, infer_val_type, is_const_scalar, OpType, ValType, bcast_dim, any_var, unused_ids, var_prefix, inb_attr_postfix, cen_attr_postfix
+from .utils import c_dtype, acc_c_dtype, infer_op_type_from_args, val_seq, infer_val_type, is_const_scalar, OpType, ValType, bcast_dim, any_var, unused_ids, var_prefix, inb_attr_postfix, cen_attr_postfix
 from .registry import look_up_registry, register_or_look_up_backend_cb
 
 class Var(object):
@@ -30,7 +30,9 @@ class Var(object):
         self._val_type = val_type
         self._var_shape = var_shape
         self._var_dtype = var_dtype
-        self.dtype_str = 'float' if 'float' in str(self._var_dtype).lower() else 'int'
+        # Type of the var in memory and of its values inside the kernels
+        self.dtype_str = c_dtype(self._var_dtype)
+        self.acc_dtype_str = acc_c_dtype(self.dtype_str)
         self._device = device
         self._requires_grad = requires_grad
         self._grad = None
@@ -0,0 +1,126 @@
+"""Process-wide registry of compiled programs shared between contexts"""
+
+from collections import namedtuple, OrderedDict
+
+from .utils import is_const_scalar
+
+from stgraph.compiler.debugging.stgraph_logger import print_log
+
+CompiledProgram = namedtuple('CompiledProgram', ['forward_exe_units', 'backward_exe_units', 'compiled_module', 'rets', 'input_ids', 'source'])
+CompiledProgram.__doc__ = '''
+Everything the Executor of a context needs, as produced by the context that first compiled the program.
+
+forward_exe_units - list of ExecutionUnit. fused forward units
+backward_exe_units - list of ExecutionUnit. fused backward units
+compiled_module - the loaded CUDA/OpenMP module, None for the CPU target
+rets - list of Var. output vars of the program
+input_ids - list of str. ids of the program inputs in canonical order
+source - str. rendered source of compiled_module, None for the CPU target
+'''
+
+def canonicalize(prog, out_vars):
+    '''
+        Returns the structure of prog as a hashable tuple along with its input
+        vars in order of first use. Input ids (parameters and features) and
+        temporary ids are replaced by their position, so programs traced by
+        different layer instances compare equal whenever they compute the
+        same thing on equally typed inputs.
+    '''
+    inputs = {}
+    tmps = {}
+
+    def canon(var):
+        if is_const_scalar(var):
+            return ('c', repr(var))
+        if var in tmps:
+            kind, idx = 't', tmps[var]
+        else:
+            if var not in inputs:
+                inputs[var] = len(inputs)
+            kind, idx = 'i', inputs[var]
+        return (kind, idx, str(var.val_type), tuple(var.var_shape), str(var.var_dtype), str(var.device), var.requires_grad)
+
+    stmts = []
+    for stmt in prog:
+        params = tuple(sorted((k, repr(v)) for k, v in stmt.op_schema._params.items()))
+        args = tuple(canon(arg) for arg in stmt.args)
+        tmps[stmt.ret] = len(tmps)
+        stmts.append((stmt.op_name, params, str(stmt.op_type), args, canon(stmt.ret)))
+    rets = tuple(canon(var) for var in out_vars)
+    input_vars = sorted(inputs, key=lambda var: inputs[var])
+    return (tuple(stmts), rets), input_vars
+
+class ProgramRegistry():
+    r"""Shares compiled programs between contexts
+
+    Layers of the same type trace the same program, e.g. the ``conv_z``,
+    ``conv_r`` and ``conv_h`` GCNConv layers of TGCN. The first context to
+    compile a program registers its execution units and compiled module
+    under the canonical form of the optimized program; later contexts
+    look it up and only build their own Executor around them.
+
+    Every lookup hit and registration counts as a use of the program,
+    contexts release it when they evict the executor built around it. Of
+    the programs no executor uses any more only the ``max_unused`` most
+    recently released ones are kept, so that the registry stays bounded.
+
+    The execution units of a shared program hold mutable launch state:
+    the kernel built for the graph (``_K``) and its LaunchPlan with the
+    graph pointers. Executors therefore rebind every unit to their own
+    graph with ``reset_graph_info`` right before launching it, in the
+    forward as well as in the backward pass, and never rely on the graph
+    a unit was bound to before.
+    """
+    # Number of programs kept once no executor uses them
+    MAX_UNUSED = 16
+
+    def __init__(self, max_unused=MAX_UNUSED):
+        self._programs = OrderedDict()
+        self._users = {}
+        self.max_unused = max_unused
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, prog, out_vars, graph_type, target):
+        structure, input_vars = canonicalize(prog, out_vars)
+        return (structure, graph_type, str(target)), input_vars
+
+    def lookup(self, key):
+        compiled = self._programs.get(key, None)
+        if compiled is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._users[key] += 1
+            self._programs.move_to_end(key)
+            print_log('[magenta bold]Program Registry[/magenta bold]: Reusing compiled program')
+        return compiled
+
+    def register(self, key, compiled):
+        self._programs[key] = compiled
+        self._users[key] = 1
+
+    def release(self, key):
+        '''Ends a use of the program registered under key, see lookup and register'''
+        if key not in self._users:
+            # Dropped by clear in the meantime
+            return
+        self._users[key] -= 1
+        if self._users[key] == 0:
+            self._programs.move_to_end(key)
+            unused = [k for k in self._programs if self._users[k] == 0]
+            for k in unused[:max(0, len(unused) - self.max_unused)]:
+                del self._programs[k]
+                del self._users[k]
+
+    def clear(self):
+        self._programs.clear()
+        self._users.clear()
+
+    def __len__(self):
+        return len(self._programs)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'programs': len(self._programs)}
+
+program_registry = ProgramRegistry()
@@ -56,10 +56,13 @@ class OpImpl(abc.ABC):
         if is_const_scalar(var):
             return str(var)
         if var == self.ret:
-            prefix = '' if 'agg' in var.stmt.op_name.lower() else var.dtype_str  + ' '
+            prefix = '' if 'agg' in var.stmt.op_name.lower() else var.acc_dtype_str  + ' '
             return  prefix  + var.id + TMP_SUFFIX
         else:
             if var in ctx.kernel_arguments:
+                if var.dtype_str != var.acc_dtype_str:
+                    # Reduced precision vars are computed on as float
+                    return '(({acc}){var}{offset})'.format(acc=var.acc_dtype_str, var=var.id, offset=kctx.query_offset(var))
                 return var.id + kctx.query_offset(var)
             else:
                 return var.id + TMP_SUFFIX
@@ -78,7 +81,11 @@ class OpImpl(abc.ABC):
             var_split = var.split('[')
             # replacing var[offset] with var + offset
             new_var = var_split[0]  + '+' + var_split[1][:-1] 
-            divisor=''
+            if self.ret.dtype_str != self.ret.acc_dtype_str:
+                # Atomics on reduced precision take a value of the same type
+                delta = '({dtype}){delta}'.format(dtype=self.ret.dtype_str, delta=delta)
+                if 'sum' not in self.fstmt.op_name.lower() and 'mean' not in self.fstmt.op_name.lower():
+                    raise NotImplementedError('Atomic instruction for', self.fstmt.op_name, 'is not implemented for', self.ret.dtype_str)
             if 'sum' in self.fstmt.op_name.lower():
                 op = 'Add' 
             elif 'max' in self.fstmt.op_name.lower():
@@ -86,13 +93,13 @@ class OpImpl(abc.ABC):
             elif 'min' in self.fstmt.op_name.lower():
                 op = 'Min'
             elif 'mean' in self.fstmt.op_name.lower():
+                # Finalized before the write, see CountedAggImpl
                 op = 'Add'
-                divisor='/(end_off-start_off)'
                 if ctx.write_location != WriteLocation.OUTER:
                   raise NotImplementedError('Cannot support innter write of mean result due to unknown number of edges')
             else:
                 raise NotImplementedError('Atomic instruction for', self.fstmt.op_name, 'is not implemented')
-            val = 'atomic{op}({var}, {delta}{divisor});'.format(var=new_var, delta=delta, op=op, divisor=divisor)
+            val = 'atomic{op}({var}, {delta});'.format(var=new_var, delta=delta, op=op)
         elif ctx.write_type == WriteType.ASSIGN:
             val = '{var} = {delta};'.format(var=var, delta=delta)
 
@@ -106,7 +113,7 @@ class OpImpl(abc.ABC):
         v=''
         for arg in self.args:
             if arg in ctx.cur_stmt_ctx.kernel_arguments and arg not in ctx.loaded_args:
-                v += '{type} {var_tmp} = {var}; '.format(type=arg.dtype_str, var_tmp=arg.id+TMP_SUFFIX, var=arg.id+ctx.query_offset(arg))
+                v += '{type} {var_tmp} = {var}; '.format(type=arg.acc_dtype_str, var_tmp=arg.id+TMP_SUFFIX, var=arg.id+ctx.query_offset(arg))
                 ctx.loaded_args.add(arg)
         return k, v.strip(' ')
     
@@ -122,6 +129,8 @@ class OpImpl(abc.ABC):
         m = {'init':'', 'compute':'', 'inner_write':'', 'outter_write':''}
         key,val = self.gen_write(ctx)
         m[key] = val
+        # Vars declared by init that hold the aggregation across the edges
+        m['state'] = [(self.ret.acc_dtype_str, self.ret.id + TMP_SUFFIX)]
         return m
     
 
@@ -277,7 +286,8 @@ class AggSumOp(OpImpl):
 
     def gen_init(self, var):
         key = 'init'
-        val = var.dtype_str + ' '+ var.id + TMP_SUFFIX  + ' = 0;'
+        # Accumulated as float for reduced precision vars
+        val = var.acc_dtype_str + ' '+ var.id + TMP_SUFFIX  + ' = 0;'
         return key, val
 
     def gen_code(self, ctx):
@@ -292,23 +302,21 @@ class AggSumOp(OpImpl):
         gen_info[initk] = initv
         return gen_info
 
-class AggMaxOp(OpImpl):
-    def grad_impl(self, pos, x, y, grad_y):
-        '''y = AggMax(x) => dydx = (x)'''
-        grad_stmt_list = []
-        # More precisely, the type of ret should be of type.E but it's OK as long as we don't materialize it.
-        ret = self.create_var_like(x)
-        ret._val_type = ValType.EDGE
-        grad_stmt_list.append(self.create_stmt(Schema('BackwardAMax'), args=[x, y], ret=ret))
-        grad_stmt_list += self.multiply_grad(dzdy=grad_y, dydx=grad_stmt_list[-1].ret, x=x)
-        if not x.is_edgevar():
-            last_stmt = grad_stmt_list[-1]
-            grad_stmt_list.append(self.create_stmt(Schema('AggSum'), args=[last_stmt.ret], ret=self.create_var_like(x)))
-        return grad_stmt_list
+class CountedAggImpl(OpImpl):
+    '''
+        Aggregations that count the edges they reduce next to their accumulator.
+        Their result is only complete at the outer write, where final_code
+        finalizes it. Nodes without edges get 0 as in the CPU reference.
+    '''
+    identity = '0'
+
+    def counter(self):
+        return self.ret.id + '_cnt'
 
     def gen_init(self, var):
         key = 'init'
-        val = var.dtype_str + ' '+ var.id + TMP_SUFFIX  + ' = 0xff800000;' # 0x7f800000 for inf. 0xff800000 for -inf
+        val = '{dtype} {var} = {identity}; int {cnt} = 0;'.format(dtype=var.acc_dtype_str, var=var.id + TMP_SUFFIX,
+                                                                  identity=self.identity, cnt=self.counter())
         return key, val
 
     def gen_code(self, ctx):
@@ -316,13 +324,94 @@ class AggMaxOp(OpImpl):
         ret = self.gen_var(self.ret, ctx)
         initk,initv = self.gen_init(self.ret)
         gen_info =self.gen_agg_info_map(ctx)
+        gen_info['state'].append(('int', self.counter()))
         if ctx.cur_stmt_ctx.write_location == WriteLocation.INNER:
             gen_info['compute'] = '{ret} = {val};'.format(ret=ret, val=val0)
         else:
-            gen_info['compute'] = '{ret} = max({val}, {ret});'.format(ret=ret, val=val0)
+            gen_info['compute'] = '{reduce} ++{cnt};'.format(reduce=self.reduce_code(ret, val0), cnt=self.counter())
+            # Also finalized when the result only feeds the node-wise stmts of the unit
+            gen_info['outter_write'] = '{ret} = {cnt} > 0 ? {final} : 0; {write}'.format(ret=ret, cnt=self.counter(),
+                                                                                       final=self.final_code(ret),
+                                                                                       write=gen_info['outter_write'])
         gen_info[initk] = initv
         return gen_info
 
+    @abc.abstractmethod
+    def reduce_code(self, ret, val):
+        '''Folds the value of an edge into the accumulator'''
+
+    def final_code(self, ret):
+        return ret
+
+class AggMaxOp(CountedAggImpl):
+    # -inf, also compiled by nvrtc which has no INFINITY
+    identity = '(-1.0f/0.0f)'
+
+    def grad_impl(self, pos, x, y, grad_y):
+        '''y = AggMax(x) => dydx = (x)'''
+        grad_stmt_list = []
+        # More precisely, the type of ret should be of type.E but it's OK as long as we don't materialize it.
+        ret = self.create_var_like(x)
+        ret._val_type = ValType.EDGE
+        grad_stmt_list.append(self.create_stmt(Schema('BackwardAMax'), args=[x, y], ret=ret))
+        grad_stmt_list += self.multiply_grad(dzdy=grad_y, dydx=grad_stmt_list[-1].ret, x=x)
+        if not x.is_edgevar():
+            last_stmt = grad_stmt_list[-1]
+            grad_stmt_list.append(self.create_stmt(Schema('AggSum'), args=[last_stmt.ret], ret=self.create_var_like(x)))
+        return grad_stmt_list
+
+    def reduce_code(self, ret, val):
+        return '{ret} = max({val}, {ret});'.format(ret=ret, val=val)
+
+class AggMinOp(AggMaxOp):
+    '''y = AggMin(x) => dydx = (x), the edges holding the min get the grad as for AggMax'''
+    identity = '(1.0f/0.0f)'
+
+    def reduce_code(self, ret, val):
+        return '{ret} = min({val}, {ret});'.format(ret=ret, val=val)
+
+class AggMeanOp(CountedAggImpl):
+    def grad_impl(self, pos, x, y, grad_y):
+        '''y = AggMean(x) => dydx = 1/AggCount(x), the in-degree is counted again in the backward'''
+        grad_stmt_list = []
+        degree = self.create_var(var_shape=[1]*len(y.var_shape), var_dtype=y.var_dtype, val_type=y.val_type, device=y.device)
+        grad_stmt_list.append(self.create_stmt(Schema('AggCount'), args=[grad_y], ret=degree))
+        grad_stmt_list.append(self.create_stmt(Schema('TrueDiv'), args=[grad_y, degree], ret=self.create_var_like(grad_y)))
+        grad_stmt_list += self.multiply_grad(dzdy=grad_stmt_list[-1].ret, dydx=1, x=x)
+        if not x.is_edgevar():
+            last_stmt = grad_stmt_list[-1]
+            grad_stmt_list.append(self.create_stmt(Schema('AggSum'), args=[last_stmt.ret], ret=self.create_var_like(x)))
+        return grad_stmt_list
+
+    def reduce_code(self, ret, val):
+        return '{ret} += {val};'.format(ret=ret, val=val)
+
+    def final_code(self, ret):
+        return '{ret}/{cnt}'.format(ret=ret, cnt=self.counter())
+
+class AggCountOp(CountedAggImpl):
+    '''Number of edges aggregated into each node, its arg only places it on the side of the row'''
+    def grad_impl(self, pos, x, y, grad_y):
+        ''''''
+        raise NotImplementedError('Grad of grad is not supported')
+
+    def gen_write(self, ctx):
+        kctx = ctx
+        ctx = kctx.cur_stmt_ctx
+        if ctx.write_type != WriteType.ATOMIC:
+            return super().gen_write(kctx)
+        if ctx.write_location != WriteLocation.OUTER:
+            raise NotImplementedError('Cannot support innter write of edge count due to unknown number of edges')
+        # Every feature thread counts the same edges, the first one writes the count
+        val = 'if (tx == 0) {var} = {delta};'.format(var=self.ret.id + kctx.query_offset(self.ret), delta=self.ret.id + TMP_SUFFIX)
+        return 'outter_write', val
+
+    def reduce_code(self, ret, val):
+        return ''
+
+    def final_code(self, ret):
+        return self.counter()
+
 class BackwardAMaxOp(OpImpl):
     def grad_impl(self, pos, x, y, grad_y):
         '''''' 
@@ -331,6 +420,10 @@ class BackwardAMaxOp(OpImpl):
     def gen_code(self, ctx):
         forward_x = self.gen_var(self.args[0], ctx)
         forward_y = self.gen_var(self.args[1], ctx)
+        y = self.args[1]
+        if y.dtype_str != y.acc_dtype_str:
+            # The stored result was rounded, so are the values compared with it
+            forward_x = '(({acc})({dtype}){x})'.format(acc=y.acc_dtype_str, dtype=y.dtype_str, x=forward_x)
         ret = self.gen_var(self.ret, ctx)
         gen_info = self.gen_edge_info_map(ctx)
         gen_info['compute'] = '{ret} = {forward_x} == {forward_y} ? 1 : 0;'.format(ret=ret, forward_x=forward_x, forward_y=forward_y)
@@ -405,6 +498,115 @@ class BackwardLeakyReluOp(OpImpl):
         gen_info['compute'] = '{ret} = {x}>0?1:{slope};'.format(ret=ret,x=x,slope=self.op_schema._params['negative_slope'])
         return gen_info
 
+class SigmoidOp(OpImpl):
+    def grad_impl(self, pos, x, y, grad_y):
+        '''y = sigmoid(x) => dydx = y*(1-y)'''
+        stmt_list = []
+        var1 = self.create_var_like(y)
+        stmt_list.append(self.create_stmt(Schema('BackwardSigmoid'), args=[y], ret=var1))
+        stmt_list += self.multiply_grad(grad_y, var1, x)
+        return stmt_list
+
+    def gen_code(self, ctx):
+        arg = self.gen_var(self.args[0], ctx)
+        ret = self.gen_var(self.ret, ctx)
+        gen_info = self.gen_edge_info_map(ctx)
+        gen_info['compute'] = '{ret} = 1/(1+exp(-{val}));'.format(ret=ret, val=arg)
+        return gen_info
+
+class BackwardSigmoidOp(OpImpl):
+    def grad_impl(self, pos, x, y, grad_y):
+        raise NotImplementedError('Grad of grad is not supported')
+
+    def gen_code(self, ctx):
+        forward_y = self.gen_var(self.args[0], ctx)
+        ret = self.gen_var(self.ret, ctx)
+        gen_info = self.gen_edge_info_map(ctx)
+        gen_info['compute'] = '{ret} = {y}*(1-{y});'.format(ret=ret, y=forward_y)
+        return gen_info
+
+class TanhOp(OpImpl):
+    def grad_impl(self, pos, x, y, grad_y):
+        '''y = tanh(x) => dydx = 1-y*y'''
+        stmt_list = []
+        var1 = self.create_var_like(y)
+        stmt_list.append(self.create_stmt(Schema('BackwardTanh'), args=[y], ret=var1))
+        stmt_list += self.multiply_grad(grad_y, var1, x)
+        return stmt_list
+
+    def gen_code(self, ctx):
+        arg = self.gen_var(self.args[0], ctx)
+        ret = self.gen_var(self.ret, ctx)
+        gen_info = self.gen_edge_info_map(ctx)
+        gen_info['compute'] = '{ret} = tanh({val});'.format(ret=ret, val=arg)
+        return gen_info
+
+class BackwardTanhOp(OpImpl):
+    def grad_impl(self, pos, x, y, grad_y):
+        raise NotImplementedError('Grad of grad is not supported')
+
+    def gen_code(self, ctx):
+        forward_y = self.gen_var(self.args[0], ctx)
+        ret = self.gen_var(self.ret, ctx)
+        gen_info = self.gen_edge_info_map(ctx)
+        gen_info['compute'] = '{ret} = 1-{y}*{y};'.format(ret=ret, y=forward_y)
+        return gen_info
+
+def clamp_code(val, low, high):
+    '''Clamps val into [low, high], a bound of None is left open'''
+    code = val
+    if high is not None:
+        code = '({val}>{high}?{high}:{code})'.format(val=val, high=high, code=code)
+    if low is not None:
+        code = '({val}<{low}?{low}:{code})'.format(val=val, low=low, code=code)
+    return code
+
+class ClampOp(OpImpl):
+    def bounds(self):
+        return self.op_schema._params.get('min'), self.op_schema._params.get('max')
+
+    def grad_impl(self, pos, x, y, grad_y):
+        '''y = clamp(x, low, high) => dydx = low <= x <= high'''
+        low, high = self.bounds()
+        stmt_list = []
+        var1 = self.create_var_like(x)
+        stmt_list.append(self.create_stmt(Schema('BackwardClamp', min=low, max=high), args=[x], ret=var1))
+        stmt_list += self.multiply_grad(grad_y, var1, x)
+        return stmt_list
+
+    def gen_code(self, ctx):
+        arg = self.gen_var(self.args[0], ctx)
+        ret = self.gen_var(self.ret, ctx)
+        gen_info = self.gen_edge_info_map(ctx)
+        gen_info['compute'] = '{ret} = {val};'.format(ret=ret, val=clamp_code(arg, *self.bounds()))
+        return gen_info
+
+class HardtanhOp(ClampOp):
+    '''Hardtanh and ReLU6 modules are clamps with their bounds stored as min_val and max_val'''
+    def bounds(self):
+        return self.op_schema._params['min_val'], self.op_schema._params['max_val']
+
+class ReLU6Op(HardtanhOp):
+    pass
+
+class BackwardClampOp(OpImpl):
+    def grad_impl(self, pos, x, y, grad_y):
+        raise NotImplementedError('Grad of grad is not supported')
+
+    def gen_code(self, ctx):
+        x = self.gen_var(self.args[0], ctx)
+        low = self.op_schema._params['min']
+        high = self.op_schema._params['max']
+        conds = []
+        if low is not None:
+            conds.append('{x}>={low}'.format(x=x, low=low))
+        if high is not None:
+            conds.append('{x}<={high}'.format(x=x, high=high))
+        ret = self.gen_var(self.ret, ctx)
+        gen_info = self.gen_edge_info_map(ctx)
+        gen_info['compute'] = '{ret} = {cond}?1:0;'.format(ret=ret, cond=' && '.join(conds) or '1')
+        return gen_info
+
 def register_ops():
     for name, obj in inspect.getmembers(sys.modules[__name__]):
         if inspect.isclass(obj) and name.endswith('Op'):
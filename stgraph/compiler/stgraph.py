@@ -1,32 +1,76 @@
 import functools
-from collections import defaultdict, namedtuple
+from collections import defaultdict, namedtuple, OrderedDict
 from collections.abc import Iterable
 
 from .node import CentralNode
 # from .op.op import create_op, AggMaxOp, AggMinOp, AggMeanOp
 from .program import Var, Stmt, Program
-from .passes import optimize, CF, fuse, visualize
+from .passes import optimize, joint_optimize, CF, fuse, visualize
 from .schema import Schema
 from .autodiff import diff
 from .code_gen import code_gen 
 from .executor import Executor
+from .program_registry import program_registry, CompiledProgram
+from .artifact import context_key, export_program, import_program, to_tuple
+from .debugging.compile_profiler import compile_profiler, count_stmts
 from .utils import var_prefix, cen_attr_postfix, inb_attr_postfix
 import gc
+import os
+import shutil
 import torch
 
 from stgraph.compiler.backend.callback import STGraphBackend
-from stgraph.compiler.utils import ValType
+from stgraph.compiler.utils import ValType, ExecutionTarget
 from stgraph.compiler.val.val_factory import ValFactory
 from stgraph.compiler.op.op_factory import OpFactory
 
 import snoop
 
+# Number of compiled executors kept alive per Context
+EXECUTOR_CACHE_SIZE = 8
+
+
+def _target_from_env():
+    name = os.environ.get('STGRAPH_TARGET', '')
+    return ExecutionTarget[name.upper()] if name else None
+
+# Target the compiled functions run on, None picks it from the device of the features
+_execution_target = _target_from_env()
+
+def get_execution_target():
+    '''Returns the process wide execution target, None if it follows the features'''
+    return _execution_target
+
+def set_execution_target(target):
+    r"""Sets the target the compiled functions run on
+
+    By default GPU features run on ExecutionTarget.CUDA and host features
+    on the reference ExecutionTarget.CPU backend. The generated OpenMP
+    kernels are opted into with ExecutionTarget.OPENMP, or by setting the
+    environment variable STGRAPH_TARGET=openmp. None restores the default.
+    """
+    global _execution_target
+    _execution_target = target
+    return _execution_target
+
+ContextProgram = namedtuple('ContextProgram', ['compiled', 'target', 'input_alias', 'registry_key'])
+ContextProgram.__doc__ = '''
+The compiled program an Executor of a context is built from.
+
+compiled - CompiledProgram. units and module, possibly shared with other contexts
+target - ExecutionTarget. device the units run on
+input_alias - dict. maps the input ids of the context to the ids used by the shared units
+registry_key - key of compiled in the program registry, released once the executor is evicted. None for imported programs
+'''
+
 
 class Context():
     def __init__(self, func, nspace, run_cb):
         functools.update_wrapper(self, func)
         self._f = func
         self._nspace = nspace
+        # Tells apart the contexts of equally named functions in compile profiles
+        self._label = '{}.{}@{:x}'.format(type(nspace[0]).__name__, func.__name__, id(self))
         self._entry_count = 0
         self._run_cb = run_cb
         self.val_factory = ValFactory()
@@ -34,7 +78,12 @@ class Context():
         # Hold reference to parameters of current module to avoid repeated lookup
         self._input_cache = {}
         self._graph_info_cache = None
-        self._executor_cache = None
+        # Executors keyed on the signature of the inputs they were traced with
+        self._executor_cache = OrderedDict()
+        # Programs of the cached executors, kept for export
+        self._programs = {}
+        # Programs loaded from an artifact, built into executors without tracing
+        self._imported = {}
 
     def __call__(self, **kwargs):
         executor = self._setup_executor(**kwargs)
@@ -49,21 +98,58 @@ class Context():
         edge_feats = kwargs.get('e_feats', {})
         if not graph:
             raise NameError('Need to provide the graph as one of keyward arguments')
-        if self._entry_count == 0:
-            fprog = Program()
-            ret = self._trace(node_feats, edge_feats, self._input_cache, fprog)
-            # print('TracedProgram' + str(fprog), 'Ret value:', ret)
-            # pretty_print_GIR(fprog,"TGCN GIR")
-            self._executor_cache = self._diff_then_compile(ret, fprog, graph)
+        target = self._find_target(node_feats, edge_feats, graph)
+        signature = self._signature(node_feats, edge_feats, graph, target)
+        executor = self._executor_cache.get(signature, None)
+        if executor is None:
+            program = self._imported.get(signature, None)
+            if program is None:
+                with compile_profiler.context(self._label), compile_profiler.phase('compile_context'):
+                    fprog = Program()
+                    with compile_profiler.phase('trace') as stats:
+                        ret = self._trace(node_feats, edge_feats, self._input_cache, fprog)
+                        stats['stmts_after'] = count_stmts(fprog)
+                    # print('TracedProgram' + str(fprog), 'Ret value:', ret)
+                    # pretty_print_GIR(fprog,"TGCN GIR")
+                    program = self._diff_then_compile(ret, fprog, graph, target)
+            compiled = program.compiled
+            executor = Executor(graph, compiled.forward_exe_units, compiled.backward_exe_units,
+                                compiled.compiled_module, compiled.rets, program.target, program.input_alias)
+            self._executor_cache[signature] = executor
+            self._programs[signature] = program
+            if len(self._executor_cache) > EXECUTOR_CACHE_SIZE:
+                self._drop_executor(next(iter(self._executor_cache)))
+        else:
+            self._executor_cache.move_to_end(signature)
         
         for k, v in node_feats.items():
             self._input_cache[var_prefix + k + cen_attr_postfix] = v
             self._input_cache[var_prefix + k + inb_attr_postfix] = v
         for k, v in edge_feats.items():
             self._input_cache[var_prefix+k] = v
-        self._executor_cache.restart(self._input_cache, graph)
+        executor.restart(self._input_cache, graph)
         self._entry_count += 1
-        return self._executor_cache
+        return executor
+
+    def _signature(self, nfeats, efeats, graph, target):
+        """ Computes the key under which the executor for these inputs is cached
+
+            The traced program depends on the per node (or per edge) shape
+            and dtype of every feature, on which features are present and on
+            the device they live on, and likewise on the parameters and
+            buffers of the module, which are traced as inputs too. The
+            generated kernels additionally depend on the graph type and the
+            execution target.
+        """
+        def feat_signature(feats):
+            return tuple(sorted((k, tuple(v.shape[1:]), str(v.dtype), str(v.device)) for k, v in feats.items()))
+        def param_signature(module):
+            if not isinstance(module, torch.nn.Module):
+                return ()
+            params = list(module.named_parameters()) + list(module.named_buffers())
+            return tuple((k, tuple(v.shape), str(v.dtype), str(v.device)) for k, v in params)
+        return (feat_signature(nfeats), feat_signature(efeats), graph.graph_type(), target.name,
+                param_signature(self._nspace[0]))
 
     def _trace(self, nfeats, efeats, input_cache, fprog):
         backend = self._find_backend()
@@ -79,22 +165,85 @@ class Context():
             raise NameError('Ret is none. Execution is aborted')
         return [ret.var] if not isinstance(ret, Iterable) else ret.var
 
-    def _diff_then_compile(self, out_set, fprog, graph):
+    def _diff_then_compile(self, out_set, fprog, graph, target=ExecutionTarget.CUDA):
         optimize(fprog)
         vars = []
         for var in out_set:
             vars.append(var)
-        forward_exe_units = fuse([fprog], vars)
+
+        key, input_vars = program_registry.key(fprog, vars, graph.graph_type(), target)
+        compiled = program_registry.lookup(key)
+        if compiled is not None:
+            # Feed our inputs under the ids of the context that compiled the program
+            input_alias = {var.id: shared_id for var, shared_id in zip(input_vars, compiled.input_ids) if var.id != shared_id}
+            return ContextProgram(compiled, target, input_alias, key)
+
+        with compile_profiler.phase('fuse', stmts_before=count_stmts(fprog)) as stats:
+            forward_exe_units = fuse([fprog], vars)
+            stats['units'] = len(forward_exe_units)
         grads = []
         for var in vars:
             grads.append(Var.create_var(var_shape=var.var_shape, var_dtype=var.var_dtype, val_type=var.val_type, device=var.device))
-        backward_exe_units = diff(vars, grads, forward_exe_units, fprog)
+        with compile_profiler.phase('diff') as stats:
+            backward_exe_units = diff(vars, grads, forward_exe_units, fprog)
+            stats['units'] = len(backward_exe_units)
+        forward_exe_units, backward_exe_units, _ = joint_optimize(forward_exe_units, backward_exe_units, vars,
+                                                                  graph.get_num_nodes(), graph.get_num_edges())
         # visualize.plot_exec_units(forward_exe_units + backward_exe_units)
         
-        # NOTE: The last parameter here was ('int' if graph.nbits == 32 else 'long long int') but we changed
-        # it to just 'int' since that should be sufficient for all use case that we can think of now
-        compiled_module = code_gen.gen_code(forward_exe_units + backward_exe_units, 'int', graph.graph_type())
-        return Executor(graph, forward_exe_units, backward_exe_units, compiled_module, vars)
+        if target == ExecutionTarget.CPU:
+            # CPU kernels evaluate the execution units directly, nothing to generate
+            source, compiled_module = None, None
+        else:
+            # NOTE: The last parameter here was ('int' if graph.nbits == 32 else 'long long int') but we changed
+            # it to just 'int' since that should be sufficient for all use case that we can think of now
+            with compile_profiler.phase('gen_code', units=len(forward_exe_units) + len(backward_exe_units)):
+                source = code_gen.render_code(forward_exe_units + backward_exe_units, 'int', graph.graph_type(), target)
+                compiled_module = code_gen.compile_code(source, 'int', graph.graph_type(), target)
+        compiled = CompiledProgram(forward_exe_units, backward_exe_units, compiled_module,
+                                   vars, [var.id for var in input_vars], source)
+        program_registry.register(key, compiled)
+        return ContextProgram(compiled, target, {}, key)
+
+    def _drop_executor(self, signature):
+        executor = self._executor_cache.pop(signature)
+        # Frees the buffers it recycles, nothing else hands them out
+        executor.arena.clear()
+        program = self._programs.pop(signature)
+        if program.registry_key is not None:
+            program_registry.release(program.registry_key)
+
+    def export_programs(self):
+        """ Serializes the programs of the cached executors
+
+            Returns:    A list with one entry per input signature, holding
+                        the optimized execution units, the target and the
+                        rendered kernel source
+        """
+        return [{
+            'signature': signature,
+            'target': program.target.name,
+            'input_alias': program.input_alias,
+            'program': export_program(program.compiled, self._nspace),
+        } for signature, program in self._programs.items()]
+
+    def import_programs(self, entries):
+        """Loads programs serialized by export_programs, later calls with their signatures skip tracing"""
+        self._cache_module_inputs()
+        for entry in entries:
+            signature = to_tuple(entry['signature'])
+            target = ExecutionTarget[entry['target']]
+            compiled = import_program(entry['program'], signature[2], target, self._nspace)
+            self._imported[signature] = ContextProgram(compiled, target, entry['input_alias'], None)
+            # Rebuilt from the imported program on the next call
+            if signature in self._executor_cache:
+                self._drop_executor(signature)
+
+    def _cache_module_inputs(self):
+        """Caches the parameters and buffers of the module as tracing does"""
+        module = self._nspace[0]
+        for key, val in list(module._parameters.items()) + list(module._buffers.items()):
+            self._input_cache[var_prefix + key] = val
         
     def _init_central_node(self, nfeats, efeats, fprog, backend):
         cen = CentralNode()
@@ -202,6 +351,39 @@ class Context():
         backend_name = backend_module.__name__
         return (backend_name, backend_module)
 
+    def _find_target(self, nfeats, efeats, graph):
+        """ Finds the device the compiled execution units run on
+
+            Returns:    ExecutionTarget.CUDA for GPU features and
+                        ExecutionTarget.CPU for host features, unless
+                        set_execution_target chose ExecutionTarget.OPENMP
+                        for them. The graph has to be stored on the same
+                        kind of device as the features.
+        """
+        devices = sorted({feat.device.type for feat in list(nfeats.values()) + list(efeats.values())})
+        if len(devices) > 1:
+            raise RuntimeError('Features of a compiled function must live on one device, got ' + ' and '.join(devices))
+        target = get_execution_target()
+        if devices != ['cpu']:
+            if target not in (None, ExecutionTarget.CUDA):
+                raise RuntimeError('The ' + target.name + ' target needs host features, got ' + ' and '.join(devices))
+            if graph.host_memory:
+                raise RuntimeError('The graph is stored in host memory but the features are not, '
+                                   'build the graph with device="cuda" or move the features to the CPU')
+            return ExecutionTarget.CUDA
+        if target == ExecutionTarget.CUDA:
+            raise RuntimeError('The CUDA target needs GPU features, got host features')
+        if graph.graph_type() not in ('csr', 'csr_unsorted'):
+            raise NotImplementedError('CPU execution is not supported for ' + graph.graph_type() + ' graphs')
+        if not graph.host_memory:
+            raise RuntimeError('The features are in host memory but the graph is not, '
+                               'build the graph with device="cpu" or move the features to the GPU')
+        if target == ExecutionTarget.OPENMP:
+            if not shutil.which('g++'):
+                raise RuntimeError('The OPENMP target needs g++ on PATH')
+            return ExecutionTarget.OPENMP
+        return ExecutionTarget.CPU
+
     def _mapping_key(self, name_space_id, original_key):
         return str(name_space_id) + str(original_key)
 
@@ -209,6 +391,8 @@ class Context():
 class STGraph():
     def __init__(self, backend_framework: STGraphBackend):
         self._ctx_map = {}
+        # Programs loaded by load_programs, keyed on the function they trace
+        self._loaded = {}
         self._backend_framework = backend_framework
         self._run_cb = backend_framework.backend_cb
     
@@ -218,10 +402,27 @@ class STGraph():
         namespace = [gnn_module, self._backend_framework.backend_module]
         
         def wrapper(func):
-            if not func.__name__ in self._ctx_map:
+            # Keyed on the code object, as distinct functions may share a name
+            # (e.g. the weighted and unweighted nb_compute of GCNConv) while a
+            # function redefined on every forward call keeps its code object
+            key = func.__code__
+            if not key in self._ctx_map:
                 if not hetero_graph:
-                    self._ctx_map[func.__name__] = Context(func, namespace, self._run_cb)
+                    self._ctx_map[key] = Context(func, namespace, self._run_cb)
+                    if context_key(func) in self._loaded:
+                        self._ctx_map[key].import_programs(self._loaded[context_key(func)])
                 else:
                     raise NotImplementedError('Heterogeneous graph is not supported yet')
-            return self._ctx_map[func.__name__]
-        return wrapper
\ No newline at end of file
+            return self._ctx_map[key]
+        return wrapper
+
+    def export_programs(self):
+        '''Serializes the programs compiled by every context, keyed on the function they trace'''
+        return {context_key(ctx._f): ctx.export_programs() for ctx in self._ctx_map.values()}
+
+    def load_programs(self, programs):
+        '''Loads programs serialized by export_programs, contexts are built around them without tracing'''
+        self._loaded.update(programs)
+        for ctx in self._ctx_map.values():
+            if context_key(ctx._f) in programs:
+                ctx.import_programs(programs[context_key(ctx._f)])
\ No newline at end of file
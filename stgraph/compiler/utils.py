@@ -4,6 +4,11 @@ unused_ids = set()
 val_seq = 0
 MAX_THREAD_PER_BLOCK=1024
 MAX_BLOCK=65535
+# Graph types with an edge-balanced (merge path) variant of their kernels
+EDGE_PARALLEL_GRAPH_TYPES=('csr', 'csr_unsorted')
+# Merge path items, i.e. row ends and edges, walked by each CUDA thread group
+# of an edge-balanced kernel
+EDGE_PARALLEL_ITEMS_PER_WORKER=64
 var_prefix='V'
 cen_attr_postfix='cen'
 inb_attr_postfix='inb'
@@ -33,6 +38,16 @@ class ParallelMode(Enum):
     SrcParallel = 0
     DstParallel = 1
 
+class ExecutionTarget(Enum):
+    CUDA = 0
+    CPU = 1
+    OPENMP = 2
+
+class CheckpointMode(Enum):
+    NONE = 0
+    RECOMPUTE = 1
+    OFFLOAD = 2
+
 class WriteType(Enum):
     ADD = 0
     ATOMIC = 1
@@ -44,6 +59,28 @@ class WriteLocation(Enum):
     OUTER = 1
     NONE = 2
 
+# C types the generated kernels store the vars of each dtype in. The reduced
+# precision ones are defined by the kernel headers, their values are loaded
+# into and accumulated as float
+C_DTYPES = {
+    'torch.float32': 'float',
+    'torch.float64': 'double',
+    'torch.float16': 'stg_half',
+    'torch.bfloat16': 'stg_bfloat16',
+    'torch.int32': 'int',
+    'torch.int64': 'long long',
+}
+REDUCED_PRECISION_C_DTYPES = ('stg_half', 'stg_bfloat16')
+
+def c_dtype(dtype):
+    key = str(dtype)
+    if key in C_DTYPES:
+        return C_DTYPES[key]
+    return 'float' if 'float' in key.lower() else 'int'
+
+def acc_c_dtype(c_type):
+    return 'float' if c_type in REDUCED_PRECISION_C_DTYPES else c_type
+
 def is_const_scalar(val):
     return type(val) in (str, int, float, bool)
 
@@ -169,6 +169,43 @@ class TorchVal(Val):
     def __floordiv__(self, other):
         raise NotImplementedError("__floordiv__ Op not supported")
 
+    def _unary(self, schema, ret_v, call):
+        ret_val = self.val_factory.create(
+            self.val_type, ret_v, self.backend, None, self.fprog, False
+        )
+        self.fprog.append_stmt(
+            Stmt.create_stmt(schema, args=[self.var], ret=ret_val.var, callback=call)
+        )
+        return ret_val
+
+    def relu(self):
+        return self._unary(Schema("Relu"), self.v.relu(), lambda arg0: arg0.relu())
+
+    def sigmoid(self):
+        return self._unary(
+            Schema("Sigmoid"), self.v.sigmoid(), lambda arg0: arg0.sigmoid()
+        )
+
+    def tanh(self):
+        return self._unary(Schema("Tanh"), self.v.tanh(), lambda arg0: arg0.tanh())
+
+    def leaky_relu(self, negative_slope=0.01):
+        def call(arg0):
+            return self._th.nn.functional.leaky_relu(arg0, negative_slope)
+
+        return self._unary(
+            Schema("LeakyRelu", negative_slope=negative_slope),
+            call(self.v),
+            call,
+        )
+
+    def clamp(self, min=None, max=None):
+        return self._unary(
+            Schema("Clamp", min=min, max=max),
+            self.v.clamp(min, max),
+            lambda arg0: arg0.clamp(min, max),
+        )
+
     def sum(self, *args, **kargs):
         ret_val = self.val_factory.create(
             self.val_type,
@@ -0,0 +1,153 @@
+"""Checkpoints of the structure of a dynamic graph."""
+
+from __future__ import annotations
+
+import math
+from typing import Callable
+
+SCHEDULES = ("every_k", "sqrt", "binomial")
+
+
+def binomial_split(num_states: int, num_slots: int) -> int:
+    r"""Offset of the next checkpoint when reversing ``num_states`` states.
+
+    Follows the binomial checkpointing of Griewank. With ``s`` slots, the
+    first of them holding the first state, and ``r`` recomputations per
+    state at most ``C(s + r, s)`` states can be reversed. The offset is
+    chosen so that the states after it can be reversed with one slot less
+    and the states before it with one recomputation less.
+    """
+    repeats = 0
+    while math.comb(num_slots + repeats, num_slots) < num_states:
+        repeats += 1
+    return max(1, num_states - math.comb(num_slots - 1 + repeats, num_slots - 1))
+
+
+class SnapshotCheckpoints:
+    r"""Checkpoints of a dynamic graph structure along its timestamps.
+
+    Copies of the structure are kept at scheduled timestamps. Any timestamp
+    is reconstructed by copying the nearest checkpoint before it and
+    replaying the updates in between, instead of reverting the updates of
+    every timestamp after it. The structure itself is opaque, it is only
+    handled through ``copy_state`` and ``advance_state``.
+
+    The schedule trades memory for replayed updates:
+
+    - ``every_k`` keeps every ``interval``-th timestamp, ``T / k``
+      checkpoints and at most ``k - 1`` replayed updates per timestamp
+    - ``sqrt`` is ``every_k`` with ``k = ceil(sqrt(T))``
+    - ``binomial`` keeps the start of the current forward window and
+      places at most ``budget - 1`` further checkpoints while timestamps
+      are reconstructed in descending order, as during backprop. The
+      checkpoints after a reconstructed timestamp are released.
+
+    Parameters
+    ----------
+    num_timestamps : int
+        Number of timestamps T of the graph
+    copy_state : callable
+        Returns an independent copy of a structure
+    advance_state : callable
+        Called with a structure at timestamp t - 1 and t, applies the
+        updates of timestamp t to the structure in place
+    schedule : str
+        One of ``every_k``, ``sqrt`` and ``binomial``
+    interval : int, optional
+        Number of timestamps between the checkpoints of ``every_k``
+    budget : int, optional
+        Number of checkpoints of ``binomial``, ``ceil(log2(T)) + 1`` by default
+
+    """
+
+    def __init__(
+        self: SnapshotCheckpoints,
+        num_timestamps: int,
+        copy_state: Callable,
+        advance_state: Callable,
+        *,
+        schedule: str = "sqrt",
+        interval: int | None = None,
+        budget: int | None = None,
+    ) -> None:
+        r"""Checkpoints of a dynamic graph structure along its timestamps."""
+        if schedule not in SCHEDULES:
+            msg = f"Unknown checkpoint schedule {schedule}"
+            raise ValueError(msg)
+        self.schedule = schedule
+        self.copy_state = copy_state
+        self.advance_state = advance_state
+
+        if schedule == "sqrt":
+            interval = max(1, math.ceil(math.sqrt(num_timestamps)))
+        if schedule == "every_k" and (interval is None or interval < 1):
+            raise ValueError("The every_k schedule needs an interval of at least 1")
+        if schedule == "binomial" and budget is None:
+            budget = math.ceil(math.log2(max(num_timestamps, 1))) + 1
+        if schedule == "binomial" and budget < 1:
+            raise ValueError("The binomial schedule needs at least one checkpoint")
+
+        self.interval = interval
+        self.budget = budget
+        self._states = {}
+
+        # Number of updates replayed by restore
+        self.replayed = 0
+
+    def __len__(self: SnapshotCheckpoints) -> int:
+        r"""Return the number of stored checkpoints."""
+        return len(self._states)
+
+    def timestamps(self: SnapshotCheckpoints) -> list:
+        r"""Return the timestamps of the stored checkpoints."""
+        return sorted(self._states)
+
+    def start_window(self: SnapshotCheckpoints, timestamp: int, state: object) -> None:
+        r"""Note the first timestamp of a forward window."""
+        if self.schedule == "binomial":
+            self._states = {timestamp: self.copy_state(state)}
+        else:
+            self.record(timestamp, state)
+
+    def record(self: SnapshotCheckpoints, timestamp: int, state: object) -> None:
+        r"""Store a copy of the structure at ``timestamp`` if it is scheduled."""
+        if self.schedule == "binomial" or timestamp in self._states:
+            return
+        if timestamp % self.interval == 0:
+            self._states[timestamp] = self.copy_state(state)
+
+    def nearest(self: SnapshotCheckpoints, timestamp: int) -> int | None:
+        r"""Return the latest checkpointed timestamp not after ``timestamp``."""
+        return max((t for t in self._states if t <= timestamp), default=None)
+
+    def release_after(self: SnapshotCheckpoints, timestamp: int) -> None:
+        r"""Free the checkpoints placed after ``timestamp`` by ``binomial``."""
+        if self.schedule == "binomial":
+            for t in [t for t in self._states if t > timestamp]:
+                del self._states[t]
+
+    def restore(self: SnapshotCheckpoints, timestamp: int) -> object:
+        r"""Return a new copy of the structure at ``timestamp``."""
+        current = self.nearest(timestamp)
+        if current is None:
+            msg = f"⏰ No checkpoint before timestamp {timestamp}"
+            raise RuntimeError(msg)
+        state = self.copy_state(self._states[current])
+
+        while current < timestamp:
+            target = timestamp
+            free_slots = (
+                self.budget - len(self._states) if self.schedule == "binomial" else 0
+            )
+            if free_slots > 0:
+                target = current + binomial_split(timestamp - current + 1, free_slots + 1)
+
+            while current < target:
+                current += 1
+                self.advance_state(state, current)
+                self.replayed += 1
+
+            if current < timestamp:
+                self._states[current] = self.copy_state(state)
+
+        return state
@@ -2,17 +2,34 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
-
-if TYPE_CHECKING:
-    import numpy as np
-
+import copy
 import time
 from abc import abstractmethod
 
+import numpy as np
+
+from stgraph.graph.dynamic.checkpoints import SnapshotCheckpoints
 from stgraph.graph.stgraph_base import STGraphBase
 
 
+def pack_edges(edges: list | np.ndarray) -> np.ndarray:
+    r"""Encode (src, dst) pairs as int64 keys with dst in the upper 32 bits.
+
+    Ordering the keys orders the edges by (dst, src), the order GPMA expects
+    its updates in.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    return (edges[:, 1] << 32) | edges[:, 0]
+
+
+def unpack_edges(keys: np.ndarray) -> np.ndarray:
+    r"""Decode keys of ``pack_edges`` into an int32 array of (src, dst) rows."""
+    edges = np.empty((len(keys), 2), dtype=np.int32)
+    edges[:, 0] = keys & 0xFFFFFFFF
+    edges[:, 1] = keys >> 32
+    return edges
+
+
 class DynamicGraph(STGraphBase):
     r"""Represent Dynamic Graphs in STGraph.
 
@@ -26,6 +43,12 @@ class DynamicGraph(STGraphBase):
 
     Please note that this documentation is still work in progress.
 
+    By default an earlier timestamp is reached by reverting the updates of
+    every timestamp after it. ``enable_checkpointing`` keeps copies of the
+    structure along a schedule instead, an earlier timestamp is then
+    rebuilt from the nearest copy before it whenever fewer updates have to
+    be replayed than reverted.
+
     """
 
     def __init__(
@@ -37,15 +60,16 @@ class DynamicGraph(STGraphBase):
         super().__init__()
         self.graph_updates = {}
         self.max_num_nodes = max_num_nodes
-        self.graph_attr = {
-            str(t): (self.max_num_nodes, len(set(edge_list[t])))
-            for t in range(len(edge_list))
-        }
+        self.graph_attr = {}
 
         # Indicates whether the graph is currently undergoing backprop
         self._is_backprop_state = False
         self.current_timestamp = 0
 
+        # Copies of the structure, see enable_checkpointing
+        self._checkpoints = None
+        self._window_start = True
+
         # Measuring time for operations
         self.get_fwd_graph_time = 0
         self.get_bwd_graph_time = 0
@@ -54,34 +78,86 @@ class DynamicGraph(STGraphBase):
         self._preprocess_graph_structure(edge_list)
 
     def _preprocess_graph_structure(self: DynamicGraph, edge_list: list) -> None:
-        r"""TODO:."""
-        edge_dict = {}
-        for i in range(len(edge_list)):
-            edge_set = set()
-            for j in range(len(edge_list[i])):
-                edge_set.add((edge_list[i][j][0], edge_list[i][j][1]))
-            edge_dict[str(i)] = edge_set
-
+        r"""Compute the edges added and deleted at every timestamp.
+
+        The edges of each snapshot are packed into sorted unique int64 keys,
+        so the deltas against the previous snapshot come out of
+        ``np.setdiff1d`` already sorted by (dst, src), which is mandatory
+        for GPMA. The deltas are kept as int32 arrays of (src, dst) rows
+        and the number of edges of every snapshot is derived from them.
+        """
         self.graph_updates = {}
-
-        # Presorting additions and deletions (is a manadatory step for GPMA)
-        additions = list(edge_dict["0"])
-        additions.sort(key=lambda x: (x[1], x[0]))
-        self.graph_updates["0"] = {"add": additions, "delete": []}
-        for i in range(1, len(edge_list)):
-            additions = list(edge_dict[str(i)].difference(edge_dict[str(i - 1)]))
-            additions.sort(key=lambda x: (x[1], x[0]))
-            deletions = list(edge_dict[str(i - 1)].difference(edge_dict[str(i)]))
-            deletions.sort(key=lambda x: (x[1], x[0]))
-            self.graph_updates[str(i)] = {
-                "add": additions,
-                "delete": deletions,
+        self.graph_attr = {}
+
+        prev_keys = np.empty(0, dtype=np.int64)
+        num_edges = 0
+        for t in range(len(edge_list)):
+            keys = np.unique(pack_edges(edge_list[t]))
+            additions = np.setdiff1d(keys, prev_keys, assume_unique=True)
+            deletions = np.setdiff1d(prev_keys, keys, assume_unique=True)
+            self.graph_updates[str(t)] = {
+                "add": unpack_edges(additions),
+                "delete": unpack_edges(deletions),
             }
+            num_edges += len(additions) - len(deletions)
+            self.graph_attr[str(t)] = (self.max_num_nodes, num_edges)
+            prev_keys = keys
+
+    def enable_checkpointing(
+        self: DynamicGraph,
+        schedule: str = "sqrt",
+        interval: int | None = None,
+        budget: int | None = None,
+    ) -> SnapshotCheckpoints:
+        r"""Keep copies of the graph structure to reach earlier timestamps.
+
+        More checkpoints, a smaller ``interval`` or a larger ``budget``,
+        cost memory and save replayed updates. See ``SnapshotCheckpoints``
+        for the schedules. The graph is then no longer copied when backprop
+        starts, the forward pass after it resumes from the nearest checkpoint.
+
+        Parameters
+        ----------
+        schedule : str
+            One of ``every_k``, ``sqrt`` and ``binomial``
+        interval : int, optional
+            Number of timestamps between the checkpoints of ``every_k``
+        budget : int, optional
+            Number of checkpoints of ``binomial``
+
+        """
+        if self._is_backprop_state:
+            raise RuntimeError(
+                "⏰ Checkpointing can only be enabled during the forward pass",
+            )
+        self._checkpoints = SnapshotCheckpoints(
+            len(self.graph_updates),
+            copy.deepcopy,
+            self._advance_structure,
+            schedule=schedule,
+            interval=interval,
+            budget=budget,
+        )
+        self._checkpoints.start_window(self.current_timestamp, self._structure())
+        self._window_start = False
+        return self._checkpoints
+
+    def _restore_checkpoint(self: DynamicGraph, timestamp: int, steps: int) -> bool:
+        r"""Rebuild ``timestamp`` from a checkpoint if it replays fewer than ``steps`` updates."""
+        if self._checkpoints is None:
+            return False
+        nearest = self._checkpoints.nearest(timestamp)
+        if nearest is None or timestamp - nearest >= steps:
+            return False
+        self._load_structure(self._checkpoints.restore(timestamp))
+        self.current_timestamp = timestamp
+        return True
 
     def reset_graph(self: DynamicGraph) -> None:
         r"""TODO:."""
         self._get_cached_graph("base")
         self.current_timestamp = 0
+        self._window_start = True
 
         self.get_fwd_graph_time = 0
         self.get_bwd_graph_time = 0
@@ -101,9 +177,17 @@ class DynamicGraph(STGraphBase):
         if self._get_cached_graph(timestamp - 1):
             self.current_timestamp = timestamp - 1
 
+        self._restore_checkpoint(timestamp, timestamp - self.current_timestamp)
+
         while self.current_timestamp < timestamp:
             self._update_graph_forward()
             self.current_timestamp += 1
+            if self._checkpoints is not None:
+                self._checkpoints.record(self.current_timestamp, self._structure())
+
+        if self._window_start and self._checkpoints is not None:
+            self._checkpoints.start_window(self.current_timestamp, self._structure())
+        self._window_start = False
 
         self.get_fwd_graph_time += time.time() - t0
 
@@ -115,18 +199,46 @@ class DynamicGraph(STGraphBase):
             self._cache_graph()
             self._is_backprop_state = True
             self._init_reverse_graph()
+            self._window_start = True
 
         if timestamp > self.current_timestamp:
             raise RuntimeError(
                 "⏰ Invalid timestamp during STGraphBase.update_graph_backward()",
             )
 
+        if self._checkpoints is not None:
+            self._checkpoints.release_after(timestamp)
+        self._restore_checkpoint(timestamp, self.current_timestamp - timestamp)
+
         while self.current_timestamp > timestamp:
             self._update_graph_backward()
             self.current_timestamp -= 1
 
         self.get_bwd_graph_time += time.time() - t0
 
+    def get_graph_for_recompute(self: DynamicGraph, timestamp: int) -> None:
+        r"""Expose the forward CSR of a timestamp while backpropagating.
+
+        Moves the graph to ``timestamp`` like ``get_backward_graph`` and
+        additionally points the ``fwd_*`` pointers to this snapshot, so that
+        forward kernels of the timestamp can be recomputed. The backward CSR
+        is restored by ``end_recompute``.
+        """
+        self.get_backward_graph(timestamp)
+        self._expose_forward_csr()
+
+    def end_recompute(self: DynamicGraph) -> None:
+        r"""Restore the backward CSR after ``get_graph_for_recompute``."""
+        self._restore_backward_csr()
+
+    def _expose_forward_csr(self: DynamicGraph) -> None:
+        r"""Point the forward CSR pointers to the current snapshot during backprop."""
+        pass
+
+    def _restore_backward_csr(self: DynamicGraph) -> None:
+        r"""Undo ``_expose_forward_csr``."""
+        pass
+
     def get_num_nodes(self: DynamicGraph) -> int:
         r"""TODO:."""
         return self.graph_attr[str(self.current_timestamp)][0]
@@ -152,6 +264,21 @@ class DynamicGraph(STGraphBase):
         else:
             self._ndata[str(self.current_timestamp)] = {field: val}
 
+    @abstractmethod
+    def _structure(self: DynamicGraph) -> object:
+        r"""Return the structure holding the edges of the current timestamp."""
+        pass
+
+    @abstractmethod
+    def _advance_structure(self: DynamicGraph, structure: object, timestamp: int) -> None:
+        r"""Apply the updates of ``timestamp`` to a copy of the structure."""
+        pass
+
+    @abstractmethod
+    def _load_structure(self: DynamicGraph, structure: object) -> None:
+        r"""Make a structure returned by the checkpoints the current graph."""
+        pass
+
     @abstractmethod
     def in_degrees(self: DynamicGraph) -> np.ndarray:
         r"""TODO:."""
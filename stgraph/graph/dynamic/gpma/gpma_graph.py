@@ -60,7 +60,12 @@ class GPMAGraph(DynamicGraph):
         # forward graph for GPMA
         self._forward_graph = GPMA()
         init_gpma(self._forward_graph, self.max_num_nodes)
-        init_graph_updates(self._forward_graph, self.graph_updates, reverse_edges=True)
+        # The bindings take the updates as lists of (src, dst) pairs
+        updates = {
+            t: {kind: edges.tolist() for kind, edges in update.items()}
+            for t, update in self.graph_updates.items()
+        }
+        init_graph_updates(self._forward_graph, updates, reverse_edges=True)
 
         # base forward graph at t=0
         edge_update_t(self._forward_graph, 0)
@@ -76,7 +81,13 @@ class GPMAGraph(DynamicGraph):
         return "gpma"
 
     def _cache_graph(self: GPMAGraph) -> None:
-        r"""TODO:."""
+        r"""Keep a copy of the graph the forward pass resumes from after backprop.
+
+        With checkpointing enabled no copy is made, the forward pass resumes
+        from the nearest checkpoint instead.
+        """
+        if self._checkpoints is not None:
+            return
         self.graph_cache[str(self.current_timestamp)] = copy.deepcopy(
             self._forward_graph,
         )
@@ -131,6 +142,25 @@ class GPMAGraph(DynamicGraph):
         label_edges(self._forward_graph)
         self._get_graph_csr_ptrs()
 
+    def _structure(self: GPMAGraph) -> GPMA:
+        r"""Return the GPMA of the current timestamp."""
+        return self._forward_graph
+
+    def _advance_structure(self: GPMAGraph, structure: GPMA, timestamp: int) -> None:
+        r"""Apply the updates of ``timestamp`` to a copy of the GPMA."""
+        edge_update_t(structure, timestamp)
+
+    def _load_structure(self: GPMAGraph, structure: GPMA) -> None:
+        r"""Make a restored GPMA the current graph and build its CSR."""
+        if self._is_backprop_state:
+            # Freeing resources from previous CSR
+            free_backward_csr(self._forward_graph)
+        self._forward_graph = structure
+        label_edges(self._forward_graph)
+        if self._is_backprop_state:
+            build_backward_csr(self._forward_graph)
+        self._get_graph_csr_ptrs()
+
     def _init_reverse_graph(self: GPMAGraph) -> None:
         r"""Generate the reverse of the base graph."""
         free_backward_csr(self._forward_graph)
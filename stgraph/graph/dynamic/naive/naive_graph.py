@@ -3,11 +3,33 @@
 from __future__ import annotations
 
 import copy
+from collections import OrderedDict
+from typing import TYPE_CHECKING, NamedTuple
 
 import numpy as np
 
-from stgraph.graph.dynamic.dynamic_graph import DynamicGraph
-from stgraph.graph.static.csr import CSR
+from stgraph.graph.dynamic.dynamic_graph import DynamicGraph, pack_edges, unpack_edges
+from stgraph.graph.partitioning import is_degree_skewed
+from stgraph.graph.static.host_csr import (
+    HostCSR,
+    counting_argsort,
+    csr_bytes,
+    csr_from_arrays,
+    select_csr,
+)
+
+if TYPE_CHECKING:
+    import torch
+
+
+class Snapshot(NamedTuple):
+    r"""The CSRs of a timestamp, keys are the packed edges it was built from."""
+
+    keys: np.ndarray | None
+    forward: object
+    backward: object
+    fwd_edge_parallel: bool
+    bwd_edge_parallel: bool
 
 
 class NaiveGraph(DynamicGraph):
@@ -29,12 +51,30 @@ class NaiveGraph(DynamicGraph):
             max_num_nodes = max(eng_covid.gdata["num_nodes"]),
         )
 
+    By default the forward and backward CSR of every timestamp are built
+    up front. With ``keyframe_interval`` set, only the edges of every k-th
+    snapshot are kept along with the add/delete deltas of the others. The
+    CSRs of a snapshot are then built when it is requested and the last
+    ``cache_size`` of them are kept, so memory no longer grows with the
+    number of edges of every timestamp. ``resident_bytes`` reports the
+    memory of both modes.
+
+    The CSRs are stored on ``device``, on the GPU when one is available if
+    it is not given.
+
     Parameters
     ----------
     edge_list : list
         Edge list of the graph across all timestamps
     max_num_nodes : int
         Maximum number of nodes present in the graph across all timestamps
+    keyframe_interval : int, optional
+        Number of timestamps between the stored snapshots, None builds the
+        CSRs of all timestamps up front
+    cache_size : int
+        Number of snapshots whose CSRs are kept when keyframe_interval is set
+    device : str or torch.device, optional
+        Device the CSRs are stored on
 
     Attributes
     ----------
@@ -42,10 +82,45 @@ class NaiveGraph(DynamicGraph):
 
     """
 
-    def __init__(self: NaiveGraph, edge_list: list, max_num_nodes: int) -> None:
+    def __init__(
+        self: NaiveGraph,
+        edge_list: list,
+        max_num_nodes: int,
+        keyframe_interval: int | None = None,
+        cache_size: int = 4,
+        device: str | torch.device | None = None,
+    ) -> None:
         r"""Represent Dynamic Graphs using CSR in STGraph."""
         super().__init__(edge_list, max_num_nodes)
+        self._csr_class = select_csr(device)
+        self.host_memory = self._csr_class is HostCSR
+        self.keyframe_interval = keyframe_interval
+        self.cache_size = cache_size
+
+        if keyframe_interval is None:
+            self._build_all_snapshots(edge_list)
+        else:
+            if keyframe_interval < 1 or cache_size < 1:
+                raise ValueError(
+                    "Keyframes and the snapshot cache need a size of at least one",
+                )
+            self._keyframes = {
+                t: np.unique(pack_edges(edge_list[t]))
+                for t in range(0, len(edge_list), keyframe_interval)
+            }
+            self._snapshot_cache = OrderedDict()
+            # Snapshots whose CSRs the graph pointers currently refer to
+            self._exposed = {}
+
+        # for benchmarking purposes
+        self._update_count = 0
+        self._total_update_time = 0
+        self._gpu_move_time = 0
+
+        self._get_graph_csr_ptrs(0)
 
+    def _build_all_snapshots(self: NaiveGraph, edge_list: list) -> None:
+        r"""Build the forward and backward CSR of every timestamp."""
         self._prepare_edge_lst_fwd(edge_list)
         self._prepare_edge_lst_bwd(self.fwd_edge_list)
 
@@ -53,7 +128,7 @@ class NaiveGraph(DynamicGraph):
         edge_weight_lst = [[1 for _ in edge_list_t] for edge_list_t in edge_list]
 
         self._forward_graph = [
-            CSR(
+            self._csr_class(
                 self.fwd_edge_list[i],
                 edge_weight_lst[i],
                 self.graph_attr[str(i)][0],
@@ -62,16 +137,108 @@ class NaiveGraph(DynamicGraph):
             for i in range(len(self.fwd_edge_list))
         ]
         self._backward_graph = [
-            CSR(self.bwd_edge_list[i], edge_weight_lst[i], self.graph_attr[str(i)][0])
+            self._csr_class(
+                self.bwd_edge_list[i], edge_weight_lst[i], self.graph_attr[str(i)][0],
+            )
             for i in range(len(self.bwd_edge_list))
         ]
 
-        # for benchmarking purposes
-        self._update_count = 0
-        self._total_update_time = 0
-        self._gpu_move_time = 0
+        # The out degrees of a CSR are the lengths of its rows
+        self._fwd_edge_parallel = [
+            is_degree_skewed(csr.out_degrees) for csr in self._forward_graph
+        ]
+        self._bwd_edge_parallel = [
+            is_degree_skewed(csr.out_degrees) for csr in self._backward_graph
+        ]
 
-        self._get_graph_csr_ptrs(0)
+    def _snapshot(self: NaiveGraph, timestamp: int) -> Snapshot:
+        r"""Return the CSRs of a timestamp, building them from the deltas if needed."""
+        if self.keyframe_interval is None:
+            return Snapshot(
+                None,
+                self._forward_graph[timestamp],
+                self._backward_graph[timestamp],
+                self._fwd_edge_parallel[timestamp],
+                self._bwd_edge_parallel[timestamp],
+            )
+
+        if timestamp in self._snapshot_cache:
+            self._snapshot_cache.move_to_end(timestamp)
+            return self._snapshot_cache[timestamp]
+
+        # Replay the deltas from the closest keyframe or cached snapshot before
+        base = timestamp - timestamp % self.keyframe_interval
+        cached = [t for t in self._snapshot_cache if base < t < timestamp]
+        if cached:
+            base = max(cached)
+            keys = self._snapshot_cache[base].keys
+        else:
+            keys = self._keyframes[base]
+        for t in range(base + 1, timestamp + 1):
+            keys = self._apply_update(keys, t)
+
+        return self._cache_snapshot(timestamp, keys)
+
+    def _apply_update(self: NaiveGraph, keys: np.ndarray, timestamp: int) -> np.ndarray:
+        r"""Return the edge keys after the updates of ``timestamp``."""
+        update = self.graph_updates[str(timestamp)]
+        keys = np.setdiff1d(keys, pack_edges(update["delete"]), assume_unique=True)
+        return np.union1d(keys, pack_edges(update["add"]))
+
+    def _cache_snapshot(self: NaiveGraph, timestamp: int, keys: np.ndarray) -> Snapshot:
+        r"""Build the snapshot of ``timestamp`` and keep it in the snapshot cache."""
+        snapshot = self._build_snapshot(keys, self.graph_attr[str(timestamp)][0])
+        self._snapshot_cache[timestamp] = snapshot
+        while len(self._snapshot_cache) > self.cache_size:
+            self._snapshot_cache.popitem(last=False)
+        return snapshot
+
+    def _build_snapshot(self: NaiveGraph, keys: np.ndarray, num_nodes: int) -> Snapshot:
+        r"""Build the CSRs of the edges of a snapshot, keys sorted by (dst, src)."""
+        edges = unpack_edges(keys)
+        # (src, dst, eid) rows, the backward ones stably sorted by src
+        fwd_edges = np.stack(
+            [edges[:, 0], edges[:, 1], np.arange(len(keys), dtype=np.int32)], axis=1,
+        )
+        bwd_edges = fwd_edges[counting_argsort(fwd_edges[:, 0])]
+        edge_weight = np.ones(len(keys), dtype=np.float32)
+
+        forward = csr_from_arrays(self._csr_class, fwd_edges, edge_weight, num_nodes, is_edge_reverse=True)
+        backward = csr_from_arrays(self._csr_class, bwd_edges, edge_weight, num_nodes)
+        return Snapshot(
+            keys,
+            forward,
+            backward,
+            is_degree_skewed(forward.out_degrees),
+            is_degree_skewed(backward.out_degrees),
+        )
+
+    def resident_bytes(self: NaiveGraph) -> dict:
+        r"""Return the bytes held by the snapshots, by kind of storage."""
+        num_nodes = self.max_num_nodes
+        if self.keyframe_interval is None:
+            return {
+                "keyframes": 0,
+                "deltas": 0,
+                "csr": 2 * sum(
+                    csr_bytes(num_nodes, len(edges)) for edges in self.fwd_edge_list
+                ),
+            }
+
+        exposed = {id(snapshot): snapshot for snapshot in self._exposed.values()}
+        exposed.update({id(snapshot): snapshot for snapshot in self._snapshot_cache.values()})
+        return {
+            "keyframes": sum(keys.nbytes for keys in self._keyframes.values()),
+            "deltas": sum(
+                update["add"].nbytes + update["delete"].nbytes
+                for t, update in self.graph_updates.items()
+                if int(t) not in self._keyframes
+            ),
+            "csr": sum(
+                snapshot.keys.nbytes + 2 * csr_bytes(num_nodes, len(snapshot.keys))
+                for snapshot in exposed.values()
+            ),
+        }
 
     def _prepare_edge_lst_fwd(self: NaiveGraph, edge_list: list) -> None:
         r"""TODO:."""
@@ -100,35 +267,85 @@ class NaiveGraph(DynamicGraph):
     def _cache_graph(self: NaiveGraph) -> None:
         pass
 
-    def _get_cached_graph(self: NaiveGraph) -> None:
-        return False
+    def _get_cached_graph(self: NaiveGraph, timestamp: int | str) -> bool:
+        r"""Point the forward CSR back to timestamp 0 when the graph is reset.
+
+        Any other timestamp is reached through ``_snapshot`` without a copy
+        of the graph, so nothing is served from here.
+        """
+        if timestamp != "base":
+            return False
+        self._expose_forward(self._snapshot(0))
+        return True
 
     def in_degrees(self: NaiveGraph) -> np.ndarray:
         r"""TODO:."""
         return np.array(
-            self._forward_graph[self.current_timestamp].out_degrees, dtype="int32",
+            self._snapshot(self.current_timestamp).forward.out_degrees, dtype="int32",
         )
 
     def out_degrees(self: NaiveGraph) -> np.ndarray:
         r"""TODO:."""
         return np.array(
-            self._forward_graph[self.current_timestamp].in_degrees, dtype="int32",
+            self._snapshot(self.current_timestamp).forward.in_degrees, dtype="int32",
         )
 
     def _get_graph_csr_ptrs(self: NaiveGraph, timestamp: int) -> None:
         r"""TODO:."""
+        snapshot = self._snapshot(timestamp)
         if self._is_backprop_state:
-            bwd_csr_ptrs = self._backward_graph[timestamp]
-            self.bwd_row_offset_ptr = bwd_csr_ptrs.row_offset_ptr
-            self.bwd_column_indices_ptr = bwd_csr_ptrs.column_indices_ptr
-            self.bwd_eids_ptr = bwd_csr_ptrs.eids_ptr
-            self.bwd_node_ids_ptr = bwd_csr_ptrs.node_ids_ptr
+            self._expose_backward(snapshot)
         else:
-            fwd_csr_ptrs = self._forward_graph[timestamp]
-            self.fwd_row_offset_ptr = fwd_csr_ptrs.row_offset_ptr
-            self.fwd_column_indices_ptr = fwd_csr_ptrs.column_indices_ptr
-            self.fwd_eids_ptr = fwd_csr_ptrs.eids_ptr
-            self.fwd_node_ids_ptr = fwd_csr_ptrs.node_ids_ptr
+            self._expose_forward(snapshot)
+
+    def _expose_forward(self: NaiveGraph, snapshot: Snapshot) -> None:
+        fwd_csr_ptrs = snapshot.forward
+        self.fwd_row_offset_ptr = fwd_csr_ptrs.row_offset_ptr
+        self.fwd_column_indices_ptr = fwd_csr_ptrs.column_indices_ptr
+        self.fwd_eids_ptr = fwd_csr_ptrs.eids_ptr
+        self.fwd_node_ids_ptr = fwd_csr_ptrs.node_ids_ptr
+        self.fwd_edge_parallel = snapshot.fwd_edge_parallel
+        if self.keyframe_interval is not None:
+            # Evicting it from the cache must not free the CSR the kernels read
+            self._exposed["fwd"] = snapshot
+
+    def _expose_backward(self: NaiveGraph, snapshot: Snapshot) -> None:
+        bwd_csr_ptrs = snapshot.backward
+        self.bwd_row_offset_ptr = bwd_csr_ptrs.row_offset_ptr
+        self.bwd_column_indices_ptr = bwd_csr_ptrs.column_indices_ptr
+        self.bwd_eids_ptr = bwd_csr_ptrs.eids_ptr
+        self.bwd_node_ids_ptr = bwd_csr_ptrs.node_ids_ptr
+        self.bwd_edge_parallel = snapshot.bwd_edge_parallel
+        if self.keyframe_interval is not None:
+            self._exposed["bwd"] = snapshot
+
+    def _structure(self: NaiveGraph) -> dict:
+        r"""Return the timestamp and the edge keys of the current snapshot.
+
+        The keys are None when the CSRs of every timestamp are built up
+        front, a checkpoint then only records the timestamp.
+        """
+        return {
+            "timestamp": self.current_timestamp,
+            "keys": self._snapshot(self.current_timestamp).keys,
+        }
+
+    def _advance_structure(self: NaiveGraph, structure: dict, timestamp: int) -> None:
+        r"""Apply the updates of ``timestamp`` to a checkpointed structure."""
+        if structure["keys"] is not None:
+            structure["keys"] = self._apply_update(structure["keys"], timestamp)
+        structure["timestamp"] = timestamp
+
+    def _load_structure(self: NaiveGraph, structure: dict) -> None:
+        r"""Expose the CSRs of a restored snapshot, building them from its keys."""
+        timestamp = structure["timestamp"]
+        if structure["keys"] is not None and timestamp not in self._snapshot_cache:
+            self._cache_snapshot(timestamp, structure["keys"])
+        self._get_graph_csr_ptrs(timestamp)
+
+    def _expose_forward_csr(self: NaiveGraph) -> None:
+        r"""Point the forward CSR pointers to the current snapshot during backprop."""
+        self._expose_forward(self._snapshot(self.current_timestamp))
 
     def _update_graph_forward(self: NaiveGraph) -> None:
         """Update the current base graph to the next timestamp."""
@@ -6,7 +6,7 @@ import copy
 
 import numpy as np
 
-from stgraph.graph.dynamic.dynamic_graph import DynamicGraph
+from stgraph.graph.dynamic.dynamic_graph import DynamicGraph, pack_edges
 from stgraph.graph.dynamic.pcsr.pcsr import PCSR
 
 
@@ -51,7 +51,7 @@ class PCSRGraph(DynamicGraph):
 
         self._forward_graph = PCSR(self.max_num_nodes, self.max_num_edges)
         self._forward_graph.edge_update_list(
-            self.graph_updates["0"]["add"],
+            self.graph_updates["0"]["add"].tolist(),
             is_reverse_edge=True,
         )
         self._forward_graph.label_edges()
@@ -62,20 +62,23 @@ class PCSRGraph(DynamicGraph):
         self.graph_cache["base"] = copy.deepcopy(self._forward_graph)
 
     def _get_max_num_edges(self: PCSRGraph) -> None:
-        r"""TODO:."""
+        r"""Count the distinct edges added across all timestamps."""
         updates = self.graph_updates
-        edge_set = set()
-        for i in range(len(updates)):
-            for j in range(len(updates[str(i)]["add"])):
-                edge_set.add(updates[str(i)]["add"][j])
-        self.max_num_edges = len(edge_set)
+        keys = [pack_edges(updates[str(i)]["add"]) for i in range(len(updates))]
+        self.max_num_edges = len(np.unique(np.concatenate(keys))) if keys else 0
 
     def graph_type(self: PCSRGraph) -> str:
         r"""Return the graph type."""
         return "pcsr"
 
     def _cache_graph(self: PCSRGraph) -> None:
-        r"""TODO:."""
+        r"""Keep a copy of the graph the forward pass resumes from after backprop.
+
+        With checkpointing enabled no copy is made, the forward pass resumes
+        from the nearest checkpoint instead.
+        """
+        if self._checkpoints is not None:
+            return
         self.graph_cache[str(self.current_timestamp)] = copy.deepcopy(
             self._forward_graph,
         )
@@ -117,6 +120,22 @@ class PCSRGraph(DynamicGraph):
             self.fwd_eids_ptr = csr_ptrs[2]
             self.fwd_node_ids_ptr = csr_ptrs[3]
 
+    def _expose_forward_csr(self: PCSRGraph) -> None:
+        r"""Build the forward CSR of the current snapshot during backprop."""
+        move_to_gpu_time = self._forward_graph.build_csr()
+        self.move_to_gpu_time += move_to_gpu_time
+        csr_ptrs = self._forward_graph.get_csr_ptrs()
+        self.fwd_row_offset_ptr = csr_ptrs[0]
+        self.fwd_column_indices_ptr = csr_ptrs[1]
+        self.fwd_eids_ptr = csr_ptrs[2]
+        self.fwd_node_ids_ptr = csr_ptrs[3]
+
+    def _restore_backward_csr(self: PCSRGraph) -> None:
+        r"""Rebuild the reverse CSR replaced by ``_expose_forward_csr``."""
+        move_to_gpu_time = self._forward_graph.build_reverse_csr()
+        self.move_to_gpu_time += move_to_gpu_time
+        self._get_graph_csr_ptrs()
+
     def _update_graph_forward(self: PCSRGraph) -> None:
         r"""Update the current base graph to the next timestamp."""
         if str(self.current_timestamp + 1) not in self.graph_updates:
@@ -127,9 +146,12 @@ class PCSRGraph(DynamicGraph):
         graph_additions = self.graph_updates[str(self.current_timestamp + 1)]["add"]
         graph_deletions = self.graph_updates[str(self.current_timestamp + 1)]["delete"]
 
-        self._forward_graph.edge_update_list(graph_additions, is_reverse_edge=True)
         self._forward_graph.edge_update_list(
-            graph_deletions,
+            graph_additions.tolist(),
+            is_reverse_edge=True,
+        )
+        self._forward_graph.edge_update_list(
+            graph_deletions.tolist(),
             is_delete=True,
             is_reverse_edge=True,
         )
@@ -138,6 +160,33 @@ class PCSRGraph(DynamicGraph):
         self.move_to_gpu_time += move_to_gpu_time
         self._get_graph_csr_ptrs()
 
+    def _structure(self: PCSRGraph) -> PCSR:
+        r"""Return the PCSR of the current timestamp."""
+        return self._forward_graph
+
+    def _advance_structure(self: PCSRGraph, structure: PCSR, timestamp: int) -> None:
+        r"""Apply the updates of ``timestamp`` to a copy of the PCSR."""
+        structure.edge_update_list(
+            self.graph_updates[str(timestamp)]["add"].tolist(),
+            is_reverse_edge=True,
+        )
+        structure.edge_update_list(
+            self.graph_updates[str(timestamp)]["delete"].tolist(),
+            is_delete=True,
+            is_reverse_edge=True,
+        )
+
+    def _load_structure(self: PCSRGraph, structure: PCSR) -> None:
+        r"""Make a restored PCSR the current graph and build its CSR."""
+        self._forward_graph = structure
+        self._forward_graph.label_edges()
+        if self._is_backprop_state:
+            move_to_gpu_time = self._forward_graph.build_reverse_csr()
+        else:
+            move_to_gpu_time = self._forward_graph.build_csr()
+        self.move_to_gpu_time += move_to_gpu_time
+        self._get_graph_csr_ptrs()
+
     def _init_reverse_graph(self: PCSRGraph) -> None:
         """Generate the reverse of the base graph."""
         move_to_gpu_time = self._forward_graph.build_reverse_csr()
@@ -154,9 +203,12 @@ class PCSRGraph(DynamicGraph):
         graph_additions = self.graph_updates[str(self.current_timestamp)]["delete"]
         graph_deletions = self.graph_updates[str(self.current_timestamp)]["add"]
 
-        self._forward_graph.edge_update_list(graph_additions, is_reverse_edge=True)
         self._forward_graph.edge_update_list(
-            graph_deletions,
+            graph_additions.tolist(),
+            is_reverse_edge=True,
+        )
+        self._forward_graph.edge_update_list(
+            graph_deletions.tolist(),
             is_delete=True,
             is_reverse_edge=True,
         )
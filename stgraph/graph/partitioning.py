@@ -0,0 +1,43 @@
+"""Choose how the kernels partition the rows of a CSR between workers."""
+
+from __future__ import annotations
+
+import numpy as np
+
+# A row this many times longer than the average keeps its worker busy long
+# after the others are done when rows are assigned to workers
+EDGE_PARALLEL_SKEW = 16.0
+
+# Rows shorter than this are cheap to walk however skewed the graph is
+EDGE_PARALLEL_MIN_DEGREE = 128
+
+
+def is_degree_skewed(degrees: list | np.ndarray) -> bool:
+    r"""Return whether the rows of a CSR should be split evenly by edges.
+
+    Node-parallel kernels assign whole rows to workers, their runtime is
+    bounded by the longest row. Once the longest row is both long and far
+    longer than the average one, the edge-balanced kernels, which split the
+    edge range evenly between workers and add up the partial aggregates of
+    the rows split between them, are used instead.
+
+    Parameters
+    ----------
+    degrees : list | np.ndarray
+        Number of edges in every row of the CSR
+
+    Returns
+    -------
+    bool
+        True if the edge-balanced kernels should be used
+
+    """
+    degrees = np.asarray(degrees)
+    if degrees.size == 0:
+        return False
+
+    max_degree = int(degrees.max())
+    return (
+        max_degree >= EDGE_PARALLEL_MIN_DEGREE
+        and max_degree >= EDGE_PARALLEL_SKEW * float(degrees.mean())
+    )
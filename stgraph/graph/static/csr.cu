@@ -3,6 +3,7 @@
 #include <tuple>
 #include <chrono>
 #include <cstdint>
+#include <stdexcept>
 
 #include <thrust/device_vector.h>
 #include <thrust/host_vector.h>
@@ -13,6 +14,7 @@
 
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 
 namespace py = pybind11;
 using namespace pybind11::literals;
@@ -55,9 +57,16 @@ public:
     std::uintptr_t node_ids_ptr;
 
     CSR(std::vector<std::tuple<int, int, int>> edge_list, std::vector<float> edge_weight, int num_nodes, bool is_edge_reverse);
+    CSR(const int64_t *edges, int num_edges, const float *edge_weight, int num_nodes, bool is_edge_reverse);
     void get_csr_ptrs();
+
+private:
+    void build(const int64_t *edges, int num_edges, const float *edge_weight, int num_nodes, bool is_edge_reverse);
 };
 
+typedef py::array_t<int64_t, py::array::c_style | py::array::forcecast> EDGE_ARRAY;
+typedef py::array_t<float, py::array::c_style | py::array::forcecast> WEIGHT_ARRAY;
+
 bool sort_by_sec(const std::tuple<int, int> &a,
                  const std::tuple<int, int> &b)
 {
@@ -66,11 +75,30 @@ bool sort_by_sec(const std::tuple<int, int> &a,
 }
 
 CSR::CSR(std::vector<std::tuple<int, int, int>> edge_list, std::vector<float> edge_weight, int num_nodes, bool is_edge_reverse = false)
+{
+    // flattening the (src, dst, eid) tuples into rows of an array
+    std::vector<int64_t> edges(3 * edge_list.size());
+    for (int i = 0; i < edge_list.size(); ++i)
+    {
+        edges[3 * i] = std::get<0>(edge_list[i]);
+        edges[3 * i + 1] = std::get<1>(edge_list[i]);
+        edges[3 * i + 2] = std::get<2>(edge_list[i]);
+    }
+    build(edges.data(), edge_list.size(), edge_weight.data(), num_nodes, is_edge_reverse);
+}
+
+CSR::CSR(const int64_t *edges, int num_edges, const float *edge_weight, int num_nodes, bool is_edge_reverse = false)
+{
+    build(edges, num_edges, edge_weight, num_nodes, is_edge_reverse);
+}
+
+// edges holds num_edges (src, dst, eid) rows
+void CSR::build(const int64_t *edges, int num_edges, const float *edge_weight, int num_nodes, bool is_edge_reverse)
 {
     // initialising row_offset values all to -1
     row_offset.resize(num_nodes + 1);
-    column_indices.resize(edge_list.size());
-    eids.resize(edge_list.size());
+    column_indices.resize(num_edges);
+    eids.resize(num_edges);
     node_ids.resize(num_nodes);
 
     // allocating memory on the gpu
@@ -93,11 +121,11 @@ CSR::CSR(std::vector<std::tuple<int, int, int>> edge_list, std::vector<float> ed
     int end = 0;
 
     // iterating through the edge_list
-    for (int i = 0; i < edge_list.size(); ++i)
+    for (int i = 0; i < num_edges; ++i)
     {
-        int src = is_edge_reverse ? std::get<1>(edge_list[i]) : std::get<0>(edge_list[i]);
-        int dst = is_edge_reverse ? std::get<0>(edge_list[i]) : std::get<1>(edge_list[i]);
-        int eid = std::get<2>(edge_list[i]);
+        int src = is_edge_reverse ? edges[3 * i + 1] : edges[3 * i];
+        int dst = is_edge_reverse ? edges[3 * i] : edges[3 * i + 1];
+        int eid = edges[3 * i + 2];
 
         // first edge
         if (beg == 0 && end == 0)
@@ -178,6 +206,15 @@ std::vector<int> get_array(std::uintptr_t ptr, int size)
     return vec;
 }
 
+// Builds a CSR from an (E, 3) array of (src, dst, eid) rows without
+// creating Python objects per edge
+CSR csr_from_arrays(EDGE_ARRAY edges, WEIGHT_ARRAY edge_weight, int num_nodes, bool is_edge_reverse)
+{
+    if (edges.ndim() != 2 || edges.shape(1) != 3)
+        throw std::invalid_argument("Edge arrays need the shape (E, 3)");
+    return CSR(edges.data(), edges.shape(0), edge_weight.data(), num_nodes, is_edge_reverse);
+}
+
 PYBIND11_MODULE(csr, m)
 {
     m.doc() = "CPython module for CSR"; // optional module docstring
@@ -185,6 +222,7 @@ PYBIND11_MODULE(csr, m)
 
     py::class_<CSR>(m, "CSR")
         .def(py::init<std::vector<std::tuple<int, int, int>>, std::vector<float>, int, bool>(), py::arg("edge_list"), py::arg("edge_weight"), py::arg("num_nodes"), py::arg("is_edge_reverse") = false)
+        .def_static("from_arrays", &csr_from_arrays, py::arg("edges"), py::arg("edge_weight"), py::arg("num_nodes"), py::arg("is_edge_reverse") = false)
         .def_readwrite("row_offset_ptr", &CSR::row_offset_ptr)
         .def_readwrite("column_indices_ptr", &CSR::column_indices_ptr)
         .def_readwrite("eids_ptr", &CSR::eids_ptr)
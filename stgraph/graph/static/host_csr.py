@@ -0,0 +1,173 @@
+"""CSR built with NumPy in host memory."""
+
+from __future__ import annotations
+
+import numpy as np
+import torch
+
+try:
+    from stgraph.graph.static.csr import CSR
+except ImportError:
+    # csr.so is only built where CUDA is installed
+    CSR = None
+
+RADIX_BITS = 16
+
+
+def counting_argsort(keys: np.ndarray) -> np.ndarray:
+    r"""Stable argsort of non-negative integer keys in O(n).
+
+    Least significant digit radix sort over 16 bit digits. NumPy sorts
+    16 bit integers with a counting sort when asked for a stable sort, so
+    every pass is linear in the number of keys.
+    """
+    keys = np.asarray(keys)
+    if len(keys) == 0:
+        return np.arange(0, dtype=np.int64)
+    if keys.min() < 0:
+        raise ValueError("Counting sort needs non-negative keys")
+    max_key = int(keys.max())
+    order = np.argsort((keys & ((1 << RADIX_BITS) - 1)).astype(np.uint16), kind="stable")
+    shift = RADIX_BITS
+    while (max_key >> shift) > 0:
+        digits = ((keys[order] >> shift) & ((1 << RADIX_BITS) - 1)).astype(np.uint16)
+        order = order[np.argsort(digits, kind="stable")]
+        shift += RADIX_BITS
+    return order
+
+
+class HostCSR:
+    r"""CSR with the interface of the CUDA ``CSR`` of ``csr.so``.
+
+    Nothing is copied to a GPU, the ``*_ptr`` attributes point to the
+    arrays in host memory, which is what the OpenMP and CPU kernels read.
+    The rows are grouped with a counting sort, edges that share a row keep
+    the order they are given in.
+
+    Parameters
+    ----------
+    edge_list : list
+        (src, dst, eid) triples
+    edge_weight : list
+        Weights of the edges, indexed by eid
+    num_nodes : int
+        Number of nodes of the graph
+    is_edge_reverse : bool
+        Whether dst is the row of the edges instead of src
+
+    """
+
+    def __init__(
+        self: HostCSR,
+        edge_list: list | np.ndarray,
+        edge_weight: list | np.ndarray,
+        num_nodes: int,
+        is_edge_reverse: bool = False,
+    ) -> None:
+        r"""CSR with the interface of the CUDA ``CSR`` of ``csr.so``."""
+        edges = np.asarray(edge_list, dtype=np.int64).reshape(-1, 3)
+        src, dst = (edges[:, 1], edges[:, 0]) if is_edge_reverse else (edges[:, 0], edges[:, 1])
+        eids = edges[:, 2]
+
+        if (np.diff(src) >= 0).all():
+            # Already grouped into rows, as the edges of StaticGraph and NaiveGraph
+            self.column_indices = dst.astype(np.int32)
+            self.eids = eids.astype(np.int32)
+        else:
+            order = counting_argsort(src)
+            self.column_indices = dst[order].astype(np.int32)
+            self.eids = eids[order].astype(np.int32)
+
+        self.out_degrees = np.bincount(src, minlength=num_nodes).astype(np.int32)
+        self.in_degrees = np.bincount(dst, minlength=num_nodes).astype(np.int32)
+        weights = np.asarray(edge_weight, dtype=np.float32).reshape(-1)
+        self.weighted_out_degrees = np.bincount(
+            src, weights=weights[eids] if len(eids) else None, minlength=num_nodes,
+        ).astype(np.float32)
+
+        self.row_offset = np.zeros(num_nodes + 1, dtype=np.int32)
+        np.cumsum(self.out_degrees, out=self.row_offset[1:])
+
+        # Node ids by descending out degree
+        self.node_ids = counting_argsort(
+            self.out_degrees.max(initial=0) - self.out_degrees,
+        ).astype(np.int32)
+
+    @classmethod
+    def from_arrays(
+        cls: type[HostCSR],
+        edges: np.ndarray,
+        edge_weight: np.ndarray,
+        num_nodes: int,
+        is_edge_reverse: bool = False,
+    ) -> HostCSR:
+        r"""Build a CSR from an ``(E, 3)`` array, like ``CSR.from_arrays``."""
+        return cls(edges, edge_weight, num_nodes, is_edge_reverse=is_edge_reverse)
+
+    @property
+    def row_offset_ptr(self: HostCSR) -> int:
+        r"""Address of the row offsets."""
+        return self.row_offset.ctypes.data
+
+    @property
+    def column_indices_ptr(self: HostCSR) -> int:
+        r"""Address of the column indices."""
+        return self.column_indices.ctypes.data
+
+    @property
+    def eids_ptr(self: HostCSR) -> int:
+        r"""Address of the edge ids."""
+        return self.eids.ctypes.data
+
+    @property
+    def node_ids_ptr(self: HostCSR) -> int:
+        r"""Address of the degree sorted node ids."""
+        return self.node_ids.ctypes.data
+
+
+def csr_from_arrays(
+    csr_class: type,
+    edges: np.ndarray,
+    edge_weight: np.ndarray,
+    num_nodes: int,
+    is_edge_reverse: bool = False,
+) -> object:
+    r"""Build a ``csr_class`` from an ``(E, 3)`` array of (src, dst, eid) rows.
+
+    The arrays are read in place, by ``HostCSR`` and by the ``from_arrays``
+    binding of the CUDA ``CSR``. A ``csr.so`` built without that binding
+    only takes lists, which costs Python objects per edge, rebuild it from
+    ``csr.cu`` to avoid them.
+    """
+    if not hasattr(csr_class, "from_arrays"):
+        edges, edge_weight = edges.tolist(), np.asarray(edge_weight).tolist()
+        return csr_class(edges, edge_weight, num_nodes, is_edge_reverse=is_edge_reverse)
+    return csr_class.from_arrays(
+        edges,
+        np.asarray(edge_weight, dtype=np.float32),
+        num_nodes,
+        is_edge_reverse=is_edge_reverse,
+    )
+
+
+def csr_bytes(num_nodes: int, num_edges: int) -> int:
+    r"""Host bytes of a CSR, its index arrays and its degree arrays."""
+    return 4 * ((num_nodes + 1) + 2 * num_edges + num_nodes + 3 * num_nodes)
+
+
+def select_csr(device: str | torch.device | None = None) -> type:
+    r"""Return the CSR class storing a graph on ``device``.
+
+    ``cpu`` selects ``HostCSR`` and ``cuda`` the CUDA ``CSR`` of ``csr.so``.
+    Without a device the CUDA ``CSR`` is used when a GPU is available and
+    ``csr.so`` is built, ``HostCSR`` otherwise.
+    """
+    if device is None:
+        if not torch.cuda.is_available() or CSR is None:
+            return HostCSR
+        return CSR
+    if torch.device(device).type == "cpu":
+        return HostCSR
+    if CSR is None:
+        raise ImportError("Storing graphs on the GPU needs csr.so, built with CUDA")
+    return CSR
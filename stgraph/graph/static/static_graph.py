@@ -3,15 +3,29 @@
 from __future__ import annotations
 
 import copy
+from typing import TYPE_CHECKING
 
 import numpy as np
 from rich.console import Console
 
-from stgraph.graph.static.csr import CSR
+from stgraph.graph.partitioning import is_degree_skewed
+from stgraph.graph.static.host_csr import (
+    HostCSR,
+    counting_argsort,
+    csr_from_arrays,
+    select_csr,
+)
 from stgraph.graph.stgraph_base import STGraphBase
 
+if TYPE_CHECKING:
+    import torch
+
 console = Console()
 
+# Edge arrays are given as a src row and a dst row
+EDGE_ARRAY_NDIM = 2
+EDGE_ARRAY_ROWS = 2
+
 
 class StaticGraph(STGraphBase):
     r"""Represent Static graphs in STGraph.
@@ -20,6 +34,17 @@ class StaticGraph(STGraphBase):
     used in STGraph. As of now the static graph is implemented using the
     Compressed Sparse Row (CSR) format.
 
+    The edges are given either as a list of (src, dst) tuples presorted by
+    (dst, src), with the weights in that order, or as a ``(2, E)`` array
+    of src and dst rows in any order, with the weights in the order of its
+    columns. Edges are numbered by their position in the (dst, src) order,
+    for array input ``edge_perm`` maps these eids to the columns of the
+    array, so ``efeat[graph.edge_perm]`` aligns the features of the edges.
+
+    The CSRs are stored on ``device``, on the GPU when one is available if
+    it is not given. Features of a compiled function have to live on the
+    same kind of device as the graph.
+
     Example:
     -------
     .. code-block:: python
@@ -39,25 +64,37 @@ class StaticGraph(STGraphBase):
 
     def __init__(
         self: StaticGraph,
-        edge_list: list,
-        edge_weights: list,
+        edge_list: list | np.ndarray,
+        edge_weights: list | np.ndarray,
         num_nodes: int,
+        device: str | torch.device | None = None,
     ) -> None:
         r"""Represent Static graphs in STGraph."""
         super().__init__()
         self._num_nodes = num_nodes
-        self._num_edges = len(set(edge_list))
-
-        self._prepare_edge_lst_fwd(edge_list)
-        self._forward_graph = CSR(
-            self.fwd_edge_list,
-            edge_weights,
-            self._num_nodes,
-            is_edge_reverse=True,
-        )
-
-        self._prepare_edge_lst_bwd(self.fwd_edge_list)
-        self._backward_graph = CSR(self.bwd_edge_list, edge_weights, self._num_nodes)
+        self.edge_perm = None
+        self._csr_class = select_csr(device)
+        self.host_memory = self._csr_class is HostCSR
+
+        if isinstance(edge_list, np.ndarray):
+            self._num_edges = edge_list.shape[1]
+            self._build_csr_from_array(edge_list, edge_weights)
+        else:
+            self._num_edges = len(set(edge_list))
+            self._prepare_edge_lst_fwd(edge_list)
+            self._forward_graph = self._csr_class(
+                self.fwd_edge_list,
+                edge_weights,
+                self._num_nodes,
+                is_edge_reverse=True,
+            )
+
+            self._prepare_edge_lst_bwd(self.fwd_edge_list)
+            self._backward_graph = self._csr_class(self.bwd_edge_list, edge_weights, self._num_nodes)
+
+        # The out degrees of a CSR are the lengths of its rows
+        self.fwd_edge_parallel = is_degree_skewed(self._forward_graph.out_degrees)
+        self.bwd_edge_parallel = is_degree_skewed(self._backward_graph.out_degrees)
 
         self._get_graph_csr_ptrs()
 
@@ -71,6 +108,39 @@ class StaticGraph(STGraphBase):
         ]
         self.fwd_edge_list = edge_list_for_t
 
+    def _build_csr_from_array(
+        self: StaticGraph,
+        edges: np.ndarray,
+        edge_weights: list | np.ndarray,
+    ) -> None:
+        r"""Build both CSRs from a ``(2, E)`` array of src and dst rows.
+
+        The (dst, src) order of the edges comes from two counting sorts and
+        the backward edges are the forward ones stably sorted by src, i.e.
+        ordered by (src, dst), so no Python objects are created per edge.
+        """
+        if edges.ndim != EDGE_ARRAY_NDIM or edges.shape[0] != EDGE_ARRAY_ROWS:
+            raise ValueError("Edge arrays need the shape (2, E)")
+        src = edges[0].astype(np.int64)
+        dst = edges[1].astype(np.int64)
+        order = counting_argsort(src)
+        order = order[counting_argsort(dst[order])]
+        self.edge_perm = order
+
+        # (src, dst, eid) rows, eids numbering the edges in (dst, src) order
+        self.fwd_edge_list = np.stack(
+            [src[order], dst[order], np.arange(len(order), dtype=np.int64)], axis=1,
+        )
+        self.bwd_edge_list = self.fwd_edge_list[counting_argsort(self.fwd_edge_list[:, 0])]
+        edge_weights = np.asarray(edge_weights, dtype=np.float32).reshape(-1)[order]
+
+        self._forward_graph = csr_from_arrays(
+            self._csr_class, self.fwd_edge_list, edge_weights, self._num_nodes, is_edge_reverse=True,
+        )
+        self._backward_graph = csr_from_arrays(
+            self._csr_class, self.bwd_edge_list, edge_weights, self._num_nodes,
+        )
+
     # TODO-DOCS @nithin:
     def _prepare_edge_lst_bwd(self: STGraphBase, edge_list: list) -> None:
         edge_list_for_t = copy.deepcopy(edge_list)
@@ -42,6 +42,19 @@ class STGraphBase(ABC):
         bwd_node_ids_ptr
             Pointer to the backward graphs node ID array
 
+        fwd_edge_parallel
+            Whether the kernels split the edges of the forward graph evenly
+            between workers instead of assigning rows to them, set from the
+            degree skew of its rows when the CSR is built
+
+        bwd_edge_parallel
+            Whether the kernels split the edges of the backward graph evenly
+            between workers
+
+        host_memory
+            Whether the CSR pointers point to host memory instead of device
+            memory, only host graphs can run on the CPU targets
+
         """
         self._ndata = {}
 
@@ -58,6 +71,11 @@ class STGraphBase(ABC):
         self.bwd_eids_ptr = None
         self.bwd_node_ids_ptr = None
 
+        self.fwd_edge_parallel = False
+        self.bwd_edge_parallel = False
+
+        self.host_memory = False
+
     @abstractmethod
     def _get_graph_csr_ptrs(self: STGraphBase) -> None:
         r"""TODO:."""
@@ -0,0 +1,83 @@
+"""Bias and activation epilogues that can be fused into aggregation kernels."""
+
+from __future__ import annotations
+
+from typing import Callable
+
+from torch import Tensor, nn
+
+# Maps activation modules and torch functions to the traced op applying them
+# on a symbolized value. The compiler has registered ops for each of them
+FUSABLE_ACTIVATIONS = {
+    "ReLU": lambda activation, h: h.relu(),
+    "relu": lambda activation, h: h.relu(),
+    "Sigmoid": lambda activation, h: h.sigmoid(),
+    "sigmoid": lambda activation, h: h.sigmoid(),
+    "Tanh": lambda activation, h: h.tanh(),
+    "tanh": lambda activation, h: h.tanh(),
+    "LeakyReLU": lambda activation, h: h.leaky_relu(activation.negative_slope),
+    "Hardtanh": lambda activation, h: h.clamp(activation.min_val, activation.max_val),
+    "ReLU6": lambda activation, h: h.clamp(activation.min_val, activation.max_val),
+}
+
+
+def _activation_name(activation: Callable[..., Tensor]) -> str | None:
+    if isinstance(activation, nn.Module):
+        return type(activation).__name__
+    if getattr(activation, "__module__", None) in ("torch", "torch.nn.functional"):
+        return getattr(activation, "__name__", None)
+    return None
+
+
+def is_fusable_activation(activation: Callable[..., Tensor] | None) -> bool:
+    r"""Check whether an activation can be traced into a compiled function.
+
+    Anything that is not a known torch activation, e.g. a lambda, has to be
+    applied on the output of the compiled function instead.
+
+    Parameters
+    ----------
+    activation : Callable, optional
+        Activation function of the layer
+
+    Returns
+    -------
+    bool
+        True if the activation can be fused into the aggregation kernel
+    """
+    return activation is None or _activation_name(activation) in FUSABLE_ACTIVATIONS
+
+
+def apply_epilogue(
+    h: Tensor,
+    bias: Tensor | None,
+    activation: Callable[..., Tensor] | None,
+) -> Tensor:
+    r"""Add the bias to ``h`` and apply the activation.
+
+    Called inside a compiled function the node-wise statements are appended
+    to the traced program, so that they are fused into the kernel that
+    aggregates ``h`` rather than being launched separately.
+
+    Parameters
+    ----------
+    h : Tensor
+        Aggregated node features, or their symbolized value while tracing
+    bias : Tensor, optional
+        Bias added to every node
+    activation : Callable, optional
+        Activation applied after the bias, it must be fusable when tracing.
+        It is the activation itself and not the symbolized sub-module.
+
+    Returns
+    -------
+    Tensor
+        Output of the epilogue
+    """
+    if bias is not None:
+        h = h + bias
+    if activation is None:
+        return h
+    if isinstance(h, Tensor):
+        return activation(h)
+    return FUSABLE_ACTIVATIONS[_activation_name(activation)](activation, h)
@@ -13,6 +13,7 @@ from torch import Tensor, nn
 
 from stgraph.compiler import STGraph
 from stgraph.compiler.backend.pytorch.torch_callback import STGraphBackendTorch
+from stgraph.nn.pytorch.epilogue import apply_epilogue, is_fusable_activation
 from stgraph.utils.constants import SizeConstants
 
 
@@ -91,6 +92,9 @@ class GCNConv(nn.Module):
             self.bias = None
         self.activation = activation
         self.stgraph = STGraph(STGraphBackendTorch())
+        # Traces the same functions without the epilogue, kept apart as
+        # compiled functions are cached per code object
+        self.stgraph_unfused = STGraph(STGraphBackendTorch())
         self.reset_parameters()
 
     def reset_parameters(self: GCNConv) -> None:
@@ -155,35 +159,89 @@ class GCNConv(nn.Module):
                 graph.get_ndata("norm").shape[0] != graph.get_num_nodes()):
             raise ValueError("Node data 'norm' passed to GCNConv should be of shape (num_nodes, 1)")
 
-        h = torch.mm(h, self.weight)
+        # The bias and a supported activation are traced into the compiled
+        # function, where they are fused into the aggregation kernel. The
+        # activation is read here as sub-modules are symbolized while tracing
+        activation = self.activation
+        aggregate_first, fuse_epilogue = self._schedule(graph, activation)
+
+        if not aggregate_first:
+            h = torch.mm(h, self.weight)
+        h = self._aggregate(graph, h, edge_weight, activation, fuse_epilogue)
+        if aggregate_first:
+            h = torch.mm(h, self.weight)
+        if not fuse_epilogue:
+            h = apply_epilogue(h, self.bias, activation)
+        return h
+
+    def _aggregate(
+        self: GCNConv,
+        graph: StaticGraph,
+        h: Tensor,
+        edge_weight: Tensor | None,
+        activation: Callable[..., torch.Tensor] | None,
+        fuse_epilogue: bool,
+    ) -> Tensor:
+        r"""Aggregate the normalized features of the in-neighbours of every node."""
+        stgraph = self.stgraph if fuse_epilogue else self.stgraph_unfused
 
         if edge_weight is None:
 
-            @self.stgraph.compile(gnn_module=self)
+            @stgraph.compile(gnn_module=self)
             def nb_compute(v: CentralNode) -> Tensor:
-                return sum([nb.h * nb.norm for nb in v.innbs]) * v.norm
+                h = sum([nb.h * nb.norm for nb in v.innbs]) * v.norm
+                if fuse_epilogue:
+                    h = apply_epilogue(h, self.bias, activation)
+                return h
 
-            h = nb_compute(g=graph, n_feats={"norm": graph.get_ndata("norm"), "h": h})
-        else:
+            return nb_compute(g=graph, n_feats={"norm": graph.get_ndata("norm"), "h": h})
+
+        @stgraph.compile(gnn_module=self)
+        def nb_compute(v: CentralNode) -> Tensor:
+            h = sum(
+                [
+                    nb_edge.src.norm * nb_edge.src.h * nb_edge.edge_weight
+                    for nb_edge in v.inedges
+                ],
+            ) * v.norm
+            if fuse_epilogue:
+                h = apply_epilogue(h, self.bias, activation)
+            return h
+
+        return nb_compute(
+            g=graph,
+            n_feats={"norm": graph.get_ndata("norm"), "h": h},
+            e_feats={"edge_weight": edge_weight},
+        )
+
+    def _schedule(
+        self: GCNConv,
+        graph: StaticGraph,
+        activation: Callable[..., torch.Tensor] | None,
+    ) -> tuple[bool, bool]:
+        r"""Return whether to aggregate first and whether to fuse the epilogue.
 
-            @self.stgraph.compile(gnn_module=self)
-            def nb_compute(v: CentralNode) -> Tensor:
-                return sum(
-                    [
-                        nb_edge.src.norm * nb_edge.src.h * nb_edge.edge_weight
-                        for nb_edge in v.inedges
-                    ],
-                ) * v.norm
-
-            h = nb_compute(
-                g=graph,
-                n_feats={"norm": graph.get_ndata("norm"), "h": h},
-                e_feats={"edge_weight": edge_weight},
-            )
-
-        # bias
-        if self.bias is not None:
-            h = h + self.bias
-        if self.activation:
-            h = self.activation(h)
-        return h
+        The bias and activation are only fused into the aggregation kernel
+        when it runs after the dense transform, over the output features.
+        """
+        if self._aggregate_first(graph):
+            return True, False
+        return False, is_fusable_activation(activation)
+
+    def _aggregate_first(self: GCNConv, graph: StaticGraph) -> bool:
+        r"""Decide whether to aggregate before the dense transform.
+
+        The aggregation is linear and commutes with multiplying by the
+        weight, so it can run over whichever of the input and output
+        features is narrower. The dense transform costs the same either
+        way. Aggregating first keeps the bias and activation from being
+        fused into the aggregation kernel, which then costs an extra pass
+        over the output features.
+        """
+        in_channels, out_channels = self.weight.shape
+        num_nodes, num_edges = graph.get_num_nodes(), graph.get_num_edges()
+        transform_first = num_edges * out_channels
+        aggregate_first = num_edges * in_channels
+        if self.bias is not None or self.activation is not None:
+            aggregate_first += 2 * num_nodes * out_channels
+        return aggregate_first < transform_first
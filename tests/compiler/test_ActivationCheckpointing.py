@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+import torch
+
+from stgraph.compiler import get_execution_target, set_execution_target
+from stgraph.compiler.checkpointing import (
+    ActivationCheckpointing,
+    get_activation_checkpointing,
+    set_activation_checkpointing,
+)
+from stgraph.compiler.executor import Executor
+from stgraph.compiler.utils import CheckpointMode, ExecutionTarget
+from stgraph.graph.dynamic.naive.naive_graph import NaiveGraph
+from stgraph.nn.pytorch.temporal.tgcn import TGCN
+
+
+def test_ActivationCheckpointingKeeps():
+    assert all(ActivationCheckpointing().keeps(i) for i in range(10))
+
+    checkpointing = ActivationCheckpointing(CheckpointMode.RECOMPUTE, every=4)
+    assert [i for i in range(10) if checkpointing.keeps(i)] == [0, 4, 8]
+
+
+def test_ActivationCheckpointingGlobal():
+    previous = get_activation_checkpointing()
+    try:
+        set_activation_checkpointing(CheckpointMode.OFFLOAD, every=2)
+        assert get_activation_checkpointing().mode == CheckpointMode.OFFLOAD
+        assert get_activation_checkpointing().every == 2
+    finally:
+        set_activation_checkpointing(previous.mode, previous.every)
+
+
+def snapshots(num_nodes, num_timestamps):
+    rng = np.random.default_rng(0)
+    edges = {tuple(e) for e in rng.integers(0, num_nodes, size=(120, 2)).tolist()}
+    edge_list = []
+    for _ in range(num_timestamps):
+        edges = set(sorted(edges)[5:]) | {tuple(e) for e in rng.integers(0, num_nodes, size=(6, 2)).tolist()}
+        edge_list.append([list(e) for e in sorted(edges)])
+    return edge_list
+
+
+def train_step(edge_list, num_nodes):
+    torch.manual_seed(0)
+    graph = NaiveGraph(edge_list, num_nodes, device="cpu")
+    model = TGCN(5, 4)
+    x = torch.randn(num_nodes, 5, requires_grad=True)
+    H, loss = None, 0
+    for t, edges in enumerate(edge_list):
+        graph.get_graph(t)
+        deg = np.bincount([dst for _, dst in edges], minlength=num_nodes)
+        graph.set_ndata("norm", torch.from_numpy(np.where(deg > 0, np.maximum(deg, 1) ** -0.5, 0)).float().view(-1, 1))
+        H = model(graph, x, H=H)
+        loss = loss + H.pow(2).sum()
+    params = [x] + list(model.parameters())
+    return [loss.detach()] + list(torch.autograd.grad(loss, params))
+
+
+@pytest.mark.parametrize("mode", [CheckpointMode.RECOMPUTE, CheckpointMode.OFFLOAD])
+def test_CheckpointingMatchesNone(mode, monkeypatch):
+    previous_target, previous = get_execution_target(), get_activation_checkpointing()
+    recomputed = []
+    recompute = Executor.recompute_intermediates
+    monkeypatch.setattr(Executor, "recompute_intermediates",
+                        lambda self, *args: recomputed.append(1) or recompute(self, *args))
+    edge_list = snapshots(30, 6)
+    try:
+        set_execution_target(ExecutionTarget.CPU)
+        set_activation_checkpointing(CheckpointMode.NONE)
+        reference = train_step(edge_list, 30)
+        for every in [2, 3]:
+            set_activation_checkpointing(mode, every=every)
+            for val, ref_val in zip(train_step(edge_list, 30), reference):
+                assert torch.allclose(val, ref_val, atol=1e-5)
+    finally:
+        set_execution_target(previous_target)
+        set_activation_checkpointing(previous.mode, previous.every)
+    assert bool(recomputed) == (mode == CheckpointMode.RECOMPUTE)
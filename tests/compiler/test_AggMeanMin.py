@@ -0,0 +1,122 @@
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from stgraph.compiler import STGraph, get_execution_target, set_execution_target
+from stgraph.compiler.autodiff import diff
+from stgraph.compiler.backend.pytorch.torch_callback import STGraphBackendTorch
+from stgraph.compiler.op.agg import agg_max, agg_mean, agg_min
+from stgraph.compiler.passes import fuse
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ExecutionTarget, ParallelMode, ValType
+from stgraph.graph.static.static_graph import StaticGraph
+
+
+def pooling(op_name):
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    norm = Var.create_var([1], torch.float32, ValType.DEST, var_id="normcen", requires_grad=False)
+    agg = Var.create_var([4], torch.float32, ValType.DEST)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema(op_name), args=[h], ret=agg))
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[agg, norm], ret=out))
+    return prog, agg, out
+
+
+def backward(prog, out, units):
+    grad = Var.create_var(out.var_shape, out.var_dtype, out.val_type)
+    return diff([out], [grad], units, prog)
+
+
+def test_AggMeanFusedWithEpilogue():
+    prog, agg, out = pooling("AggMean")
+    units = fuse([prog], [out])
+    assert len(units) == 1
+    assert units[0].parallel_mode() == ParallelMode.DstParallel
+    # The mean is not needed by the backward, hence not materialized
+    assert [ret.id for ret in units[0].unit_rets()] == [out.id]
+
+    bunits = backward(prog, out, units)
+    ops = [[stmt.op_name for stmt in unit.program] for unit in bunits]
+    # The in-degree is counted in a destination parallel unit, the source
+    # parallel unit scatters the grad divided by it
+    assert ops[0][-1] == "AggCount"
+    assert bunits[0].parallel_mode() == ParallelMode.DstParallel
+    assert ops[1][0] == "TrueDiv" and "AggSum" in ops[1]
+    assert bunits[1].parallel_mode() == ParallelMode.SrcParallel
+
+
+def test_AggMinMaterializedForBackward():
+    prog, agg, out = pooling("AggMin")
+    units = fuse([prog], [out])
+    assert len(units) == 1
+    assert {ret.id for ret in units[0].unit_rets()} == {agg.id, out.id}
+
+    bunits = backward(prog, out, units)
+    assert "BackwardAMax" in [stmt.op_name for unit in bunits for stmt in unit.program]
+
+
+def test_NodewiseStmtBetweenAggregationsNotFused():
+    prog = Program()
+    g = Var.create_var([4], torch.float32, ValType.DEST, var_id="gcen")
+    count = Var.create_var([1], torch.float32, ValType.DEST)
+    scaled = Var.create_var([4], torch.float32, ValType.DEST)
+    src = Var.create_var([4], torch.float32, ValType.SRC)
+    prog.append_stmt(Stmt.create_stmt(Schema("AggCount"), args=[g], ret=count))
+    prog.append_stmt(Stmt.create_stmt(Schema("TrueDiv"), args=[g, count], ret=scaled))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[scaled], ret=src))
+
+    units = fuse([prog], [src])
+    assert len(units) == 2
+    assert [unit.parallel_mode() for unit in units] == [ParallelMode.DstParallel, ParallelMode.SrcParallel]
+
+
+class Pooling(torch.nn.Module):
+    def __init__(self, agg):
+        super().__init__()
+        self.agg = agg
+        self.stgraph = STGraph(STGraphBackendTorch())
+
+    def forward(self, graph, h, w):
+        @self.stgraph.compile(gnn_module=self)
+        def nb_pool(v):
+            return self.agg([nb.h * nb.w for nb in v.innbs])
+        return nb_pool(g=graph, n_feats={"h": h, "w": w})
+
+
+def scatter_reference(val, dst, num_nodes, reduce):
+    index = dst.view(-1, 1).expand_as(val)
+    return val.new_zeros(num_nodes, val.shape[1]).scatter_reduce(0, index, val, reduce=reduce, include_self=False)
+
+
+@pytest.mark.parametrize("target", [
+    ExecutionTarget.CPU,
+    pytest.param(ExecutionTarget.OPENMP, marks=pytest.mark.skipif(shutil.which("g++") is None, reason="needs g++")),
+])
+@pytest.mark.parametrize("agg, reduce", [(agg_mean, "mean"), (agg_min, "amin"), (agg_max, "amax")])
+def test_AggMatchesScatterReduce(target, agg, reduce):
+    rng = np.random.default_rng(0)
+    edges = np.unique(rng.integers(0, 10, size=(40, 2)), axis=0)
+    # Nodes 10 to 14 only have out-edges and 15 to 19 none at all
+    edges = np.concatenate([edges, [[10 + i, i] for i in range(5)]]).T
+    graph = StaticGraph(edges, np.ones(edges.shape[1]), 20, device="cpu")
+    src, dst = torch.from_numpy(edges[0]), torch.from_numpy(edges[1])
+
+    torch.manual_seed(0)
+    h = torch.randn(20, 4, requires_grad=True)
+    w = torch.rand(20, 1) + 0.5
+    previous = get_execution_target()
+    try:
+        set_execution_target(target)
+        out = Pooling(agg)(graph, h, w)
+    finally:
+        set_execution_target(previous)
+    ref = scatter_reference((h * w)[src], dst, 20, reduce)
+    assert torch.allclose(out, ref, atol=1e-5)
+    assert not out[10:].any()
+
+    grad, ref_grad = (torch.autograd.grad(o.pow(2).sum(), h)[0] for o in (out, ref))
+    assert torch.allclose(grad, ref_grad, atol=1e-5)
@@ -0,0 +1,51 @@
+import json
+
+import torch
+
+from stgraph.compiler.artifact import export_program, import_program
+from stgraph.compiler.autodiff import diff
+from stgraph.compiler.passes import fuse
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.program_registry import CompiledProgram
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ExecutionTarget, ValType
+
+
+def compile_program():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    weight = Var.create_var([1], torch.float32, ValType.EDGE, var_id="w", requires_grad=False)
+    edge = Var.create_var([4], torch.float32, ValType.EDGE)
+    agg = Var.create_var([4], torch.float32, ValType.DEST)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[h, weight], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=agg))
+    prog.append_stmt(Stmt.create_stmt(Schema("LeakyRelu", negative_slope=0.2), args=[agg], ret=out))
+    units = fuse([prog], [out])
+    grad = Var.create_var(out.var_shape, out.var_dtype, out.val_type)
+    bunits = diff([out], [grad], units, prog)
+    return CompiledProgram(units, bunits, None, [out], [h.id, weight.id], None)
+
+
+def describe(unit):
+    return (unit.kernel_name, unit.compiled, unit.parallel_mode(),
+            [arg.id for arg in unit.kernel_args()],
+            [(stmt.op_name, stmt.op_schema._params) for stmt in unit.program])
+
+
+def test_ProgramRoundTrip():
+    compiled = compile_program()
+    nspace = [torch.nn.Module(), torch]
+    state = json.loads(json.dumps(export_program(compiled, nspace)))
+    loaded = import_program(state, "csr", ExecutionTarget.CPU, nspace)
+
+    for units, loaded_units in [(compiled.forward_exe_units, loaded.forward_exe_units),
+                                (compiled.backward_exe_units, loaded.backward_exe_units)]:
+        assert [describe(unit) for unit in units] == [describe(unit) for unit in loaded_units]
+    assert [ret.id for ret in loaded.rets] == [ret.id for ret in compiled.rets]
+
+    # The grads link the forward units to the backward units that compute them
+    h = [arg for arg in loaded.forward_exe_units[0].unit_args() if arg.id == "Vhinb"][0]
+    assert h.requires_grad and h._grad in loaded.backward_exe_units[-1].unit_rets()
+    w = [arg for arg in loaded.forward_exe_units[0].unit_args() if arg.id == "Vw"][0]
+    assert not w.requires_grad and w._grad is None
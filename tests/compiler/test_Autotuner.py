@@ -0,0 +1,71 @@
+import json
+import time
+
+from stgraph.compiler.autotuner import Autotuner
+from stgraph.compiler.execution_unit import FeatureAdaptiveKernel
+from stgraph.compiler.utils import ExecutionTarget
+
+
+class SleepKernel():
+    '''Stands in for a generated kernel whose launch time depends on its configuration'''
+    def __init__(self):
+        self.config = None
+        self.tuning_key = None
+
+    def candidate_configs(self):
+        return [{"delay": 0.004}, {"delay": 0.0}, {"delay": 0.002}]
+
+    def apply_config(self, config):
+        self.config = config
+
+    def run(self, tensor_ptrs):
+        time.sleep(self.config["delay"])
+
+
+def test_AutotunerPersistsWinner(tmp_path):
+    path = str(tmp_path / "autotune.json")
+    tuner = Autotuner(path=path, repeats=2)
+    key = tuner.key("AggSum", ExecutionTarget.OPENMP, "csr", 1000, 5000)
+    kernel = SleepKernel()
+    tuner.configure(kernel, key, [])
+    assert kernel.config == {"delay": 0.0} and kernel.tuning_key == key
+    with open(path) as f:
+        assert json.load(f)["results"] == {key: {"delay": 0.0}}
+
+    # Loaded by later processes without benchmarking again
+    cached = Autotuner(path=path, benchmark=False)
+    kernel = SleepKernel()
+    cached.configure(kernel, key, [])
+    assert kernel.config == {"delay": 0.0} and cached.tuned == 0
+
+    # Graphs of other sizes fall back to the heuristic configuration
+    kernel = SleepKernel()
+    cached.configure(kernel, cached.key("AggSum", ExecutionTarget.OPENMP, "csr", 100000, 5000), [])
+    assert kernel.config is None
+
+
+def test_AutotunerKey():
+    tuner = Autotuner(path="", benchmark=False)
+    key = tuner.key("AggSum", ExecutionTarget.CUDA, "csr", 1000, 5000)
+    assert key == tuner.key("AggSum", ExecutionTarget.CUDA, "csr", 1020, 4100)
+    assert key != tuner.key("AggSum", ExecutionTarget.CUDA, "csr", 3000, 5000)
+    assert key != tuner.key("AggMax", ExecutionTarget.CUDA, "csr", 1000, 5000)
+    assert key != tuner.key("AggSum", ExecutionTarget.OPENMP, "csr", 1000, 5000)
+
+
+def test_FeatureAdaptiveCandidates():
+    def candidates(feat_len):
+        kernel = FeatureAdaptiveKernel.__new__(FeatureAdaptiveKernel)
+        kernel.feat_len = feat_len
+        return kernel.candidate_configs()
+
+    for feat_len in [1, 8, 48, 512]:
+        configs = candidates(feat_len)
+        assert len(configs) > 1
+        for config in configs:
+            assert config["thrs_per_group"] * config["nodes_per_block"] == config["threads"]
+            # Groups are never wider than needed to cover the features at once
+            assert config["thrs_per_group"] < 2 * feat_len
+    # Narrow features pack many nodes into a block, wide ones use wide groups
+    assert max(config["nodes_per_block"] for config in candidates(8)) == 64
+    assert max(config["thrs_per_group"] for config in candidates(512)) == 512
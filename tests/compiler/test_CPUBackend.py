@@ -0,0 +1,156 @@
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from stgraph.compiler import STGraph, get_execution_target, set_execution_target
+from stgraph.compiler.backend.pytorch.torch_callback import STGraphBackendTorch
+from stgraph.compiler.code_gen.kernel_cache import KernelCache, get_kernel_cache, set_kernel_cache
+from stgraph.compiler.cpu_kernel import CPUKernel, fit_to_shape, merge_path_partition
+from stgraph.compiler.utils import ExecutionTarget
+from stgraph.graph.static.static_graph import StaticGraph
+from stgraph.nn.pytorch.static.gcn_conv import GCNConv
+
+
+class Attention(torch.nn.Module):
+    '''Softmax over the in-edges of the exponentiated edge scores, as in GAT'''
+    def __init__(self):
+        super().__init__()
+        self.leaky_relu = torch.nn.LeakyReLU(0.2)
+        self.stgraph = STGraph(STGraphBackendTorch())
+
+    def forward(self, graph, h, el, er):
+        @self.stgraph.compile(gnn_module=self)
+        def nb_forward(v):
+            coeff = [torch.exp(self.leaky_relu(nb.el + v.er)) for nb in v.innbs]
+            s = sum(coeff)
+            return sum([c / s * nb.h for c, nb in zip(coeff, v.innbs)])
+        return nb_forward(g=graph, n_feats={"h": h, "el": el, "er": er})
+
+
+def host_graph(num_nodes, num_edges, seed=0):
+    rng = np.random.default_rng(seed)
+    edges = np.unique(rng.integers(0, num_nodes, size=(num_edges, 2)), axis=0).T
+    graph = StaticGraph(edges, np.ones(edges.shape[1]), num_nodes, device="cpu")
+    src, dst = torch.from_numpy(edges[0]), torch.from_numpy(edges[1])
+    return graph, src, dst
+
+
+def scatter_sum(val, index, num_nodes):
+    return val.new_zeros([num_nodes] + list(val.shape[1:])).index_add_(0, index, val)
+
+
+@pytest.fixture
+def cpu_target():
+    previous = get_execution_target()
+    set_execution_target(ExecutionTarget.CPU)
+    yield
+    set_execution_target(previous)
+
+
+@pytest.mark.parametrize("edge_parallel", [False, True])
+def test_GCNConvMatchesReference(cpu_target, edge_parallel):
+    torch.manual_seed(0)
+    graph, src, dst = host_graph(30, 150)
+    graph.fwd_edge_parallel = graph.bwd_edge_parallel = edge_parallel
+    deg = scatter_sum(torch.ones(len(dst)), dst, 30)
+    norm = torch.where(deg > 0, deg.pow(-0.5), torch.zeros_like(deg)).view(-1, 1)
+    graph.set_ndata("norm", norm)
+
+    conv = GCNConv(5, 4, activation=torch.relu)
+    torch.nn.init.normal_(conv.bias)
+    x = torch.randn(30, 5, requires_grad=True)
+    out = conv(graph, x)
+    h = norm * (x @ conv.weight)
+    ref = torch.relu(norm * scatter_sum(h[src], dst, 30) + conv.bias)
+    assert torch.allclose(out, ref, atol=1e-5)
+
+    params = [x, conv.weight, conv.bias]
+    grads = torch.autograd.grad(out.pow(2).sum(), params)
+    ref_grads = torch.autograd.grad(ref.pow(2).sum(), params)
+    for grad, ref_grad in zip(grads, ref_grads):
+        assert torch.allclose(grad, ref_grad, atol=1e-4)
+
+
+def test_AttentionMatchesReference(cpu_target):
+    torch.manual_seed(0)
+    graph, src, dst = host_graph(20, 80)
+    h = torch.randn(20, 2, 3, requires_grad=True)
+    el = torch.randn(20, 2, 1, requires_grad=True)
+    er = torch.randn(20, 2, 1, requires_grad=True)
+    out = Attention()(graph, h, el, er)
+
+    coeff = torch.exp(torch.nn.functional.leaky_relu(el[src] + er[dst], 0.2))
+    alpha = coeff / scatter_sum(coeff, dst, 20)[dst]
+    ref = scatter_sum(alpha * h[src], dst, 20)
+    assert torch.allclose(out, ref, atol=1e-5)
+
+    grads = torch.autograd.grad(out.pow(2).sum(), [h, el, er])
+    ref_grads = torch.autograd.grad(ref.pow(2).sum(), [h, el, er])
+    for grad, ref_grad in zip(grads, ref_grads):
+        assert torch.allclose(grad, ref_grad, atol=1e-4)
+
+
+def run_on(target, module, inputs, *args):
+    set_execution_target(target)
+    out = module(*args, *inputs)
+    params = list(inputs) + list(module.parameters())
+    return [out] + list(torch.autograd.grad(out.pow(2).sum(), params))
+
+
+@pytest.mark.skipif(shutil.which("g++") is None, reason="OpenMP kernels are built with g++")
+@pytest.mark.parametrize("edge_parallel", [False, True])
+def test_OpenMPMatchesCPU(cpu_target, tmp_path, edge_parallel):
+    previous_cache = get_kernel_cache()
+    set_kernel_cache(KernelCache(cache_dir=str(tmp_path / "kernel_cache")))
+    try:
+        torch.manual_seed(0)
+        graph, src, dst = host_graph(30, 150)
+        graph.fwd_edge_parallel = graph.bwd_edge_parallel = edge_parallel
+        graph.set_ndata("norm", torch.rand(30, 1))
+
+        conv = GCNConv(5, 4, activation=torch.relu)
+        x = torch.randn(30, 5, requires_grad=True)
+        attention = Attention()
+        feats = [torch.randn(30, 2, 3, requires_grad=True), torch.randn(30, 2, 1, requires_grad=True),
+                 torch.randn(30, 2, 1, requires_grad=True)]
+
+        for module, inputs in [(conv, [x]), (attention, feats)]:
+            ref = run_on(ExecutionTarget.CPU, module, inputs, graph)
+            out = run_on(ExecutionTarget.OPENMP, module, inputs, graph)
+            for val, ref_val in zip(out, ref):
+                assert torch.allclose(val, ref_val, atol=1e-4)
+    finally:
+        set_kernel_cache(previous_cache)
+
+
+def test_MergePathPartition():
+    row_offsets = torch.tensor([0, 0, 7, 8, 8, 12])
+    rows, edges = merge_path_partition(row_offsets, 3)
+    assert rows.tolist() == [0, 1, 4, 5] and edges.tolist() == [0, 5, 8, 12]
+    # Every share walks the same number of row ends and edges
+    assert ((rows + edges).diff() <= 6).all()
+
+
+def test_PartitionSlots():
+    row_offsets = torch.tensor([0, 0, 7, 8, 8, 12])
+    row_ids = torch.repeat_interleave(torch.arange(5), row_offsets.diff())
+    num_slots, edge_slots, row_slots, carry_slots, carry_rows = CPUKernel.partition_slots(row_offsets, row_ids, 3)
+    # Shares end rows [0], [1, 2, 3] and [4], the first two stop in rows 1 and 4
+    assert num_slots == 8 and row_slots.tolist() == [0, 2, 3, 4, 6]
+    assert carry_slots.tolist() == [1, 5] and carry_rows.tolist() == [1, 4]
+    assert edge_slots.tolist() == [1] * 5 + [2, 2, 3] + [6] * 4
+
+    val = torch.arange(12.0)
+    partial = val.new_zeros(num_slots).index_add_(0, edge_slots, val)
+    out = partial[row_slots].index_add_(0, carry_rows, partial[carry_slots])
+    assert out.tolist() == scatter_sum(val, row_ids, 5).tolist()
+
+
+def test_FitToShape():
+    val = torch.ones(4, 3, 2)
+    # Narrower rets are reductions summed over the broadcast dimensions
+    assert fit_to_shape(val, [4, 1, 2]).tolist() == torch.full((4, 1, 2), 3.0).tolist()
+    assert fit_to_shape(torch.ones(4, 1), [4, 3]).shape == (4, 3)
+    assert fit_to_shape(val, [4, 3, 2]) is val
@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+import torch
+
+from stgraph.compiler.debugging.compile_profiler import CompileProfiler, compile_profiler
+from stgraph.graph.static.static_graph import StaticGraph
+from stgraph.nn.pytorch.static.gcn_conv import GCNConv
+
+
+def test_CompileProfilerDisabled():
+    profiler = CompileProfiler()
+    with profiler.phase("optimize", stmts_before=3) as stats:
+        stats["stmts_after"] = 2
+
+    assert profiler.records == []
+
+
+def test_CompileProfilerRecords(tmp_path):
+    profiler = CompileProfiler()
+    profiler.enable()
+
+    with profiler.context("nb_compute"):
+        with profiler.phase("compile_context"):
+            with profiler.phase("optimize", stmts_before=3) as stats:
+                stats["stmts_after"] = 2
+            with profiler.phase("compiler", source_bytes=128):
+                pass
+
+    assert [record["phase"] for record in profiler.records] == ["optimize", "compiler", "compile_context"]
+    optimize = profiler.records[0]
+    assert optimize["context"] == "nb_compute"
+    assert optimize["stmts_before"] == 3 and optimize["stmts_after"] == 2
+    assert profiler.summary()["compiler"]["count"] == 1
+
+    profiler.export_json(str(tmp_path / "profile.json"))
+    profile = json.load(open(tmp_path / "profile.json"))
+    assert len(profile["records"]) == 3
+
+    profiler.export_chrome_trace(str(tmp_path / "trace.json"))
+    events = json.load(open(tmp_path / "trace.json"))["traceEvents"]
+    assert len(events) == 3
+    assert all(event["ph"] == "X" for event in events)
+    assert events[1]["args"]["source_bytes"] == 128
+
+
+def test_CompileProfilerContextLabels():
+    graph = StaticGraph(np.array([[0, 1, 2], [1, 2, 0]]), np.ones(3), 3, device="cpu")
+    compile_profiler.enable()
+    try:
+        # Both layers compile a function named nb_compute
+        for conv in [GCNConv(2, 2), GCNConv(2, 2)]:
+            graph.set_ndata("norm", torch.ones(3, 1))
+            conv(graph, torch.rand(3, 2))
+        labels = {record["context"] for record in compile_profiler.records if record["phase"] == "compile_context"}
+    finally:
+        compile_profiler.disable()
+        compile_profiler.clear()
+
+    assert len(labels) == 2
+    assert all(label.startswith("GCNConv.nb_compute@") for label in labels)
@@ -0,0 +1,83 @@
+import numpy as np
+import torch
+
+from stgraph.compiler.cpu_kernel import CPUKernel, merge_path_partition
+from stgraph.compiler.passes import fuse
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ValType
+from stgraph.graph.partitioning import is_degree_skewed
+
+
+def weighted_sum(op_name="AggSum"):
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    w = Var.create_var([1], torch.float32, ValType.EDGE, var_id="w", requires_grad=False)
+    edge = Var.create_var([4], torch.float32, ValType.EDGE)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[h, w], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema(op_name), args=[edge], ret=out))
+    return fuse([prog], [out])[0]
+
+
+def skewed_csr(num_nodes=50):
+    # Row 3 holds most of the edges, rows 10 to 19 none
+    rng = np.random.default_rng(0)
+    degrees = rng.integers(0, 4, size=num_nodes)
+    degrees[3] = 400
+    degrees[10:20] = 0
+    row_offsets = np.concatenate([[0], np.cumsum(degrees)]).astype(np.int32)
+    col_indices = rng.integers(0, num_nodes, size=row_offsets[-1]).astype(np.int32)
+    eids = rng.permutation(row_offsets[-1]).astype(np.int32)
+    return degrees, row_offsets, col_indices, eids
+
+
+def test_DegreeSkewHeuristic():
+    degrees, _, _, _ = skewed_csr()
+    assert is_degree_skewed(degrees)
+    assert not is_degree_skewed(np.full(50, 8))
+    # Short rows are not worth splitting however skewed
+    assert not is_degree_skewed([0] * 99 + [20])
+    assert not is_degree_skewed([])
+
+
+def test_MergePathPartition():
+    _, row_offsets, _, _ = skewed_csr()
+    row_offsets = torch.from_numpy(row_offsets).long()
+    for num_workers in [1, 3, 7, 64, 1000]:
+        rows, edges = merge_path_partition(row_offsets, num_workers)
+        assert int(rows[-1]) == len(row_offsets) - 1 and int(edges[-1]) == int(row_offsets[-1])
+        items = rows + edges
+        assert (items.diff() >= 0).all() and items.diff().max() <= (int(items[-1]) + num_workers - 1) // num_workers
+        for row, e in zip(rows.tolist(), edges.tolist()):
+            # Every share starts within its first row, shares past the end are empty
+            if row < len(row_offsets) - 1:
+                assert row_offsets[row] <= e <= row_offsets[row + 1]
+
+
+def test_EdgeParallelSupport():
+    assert weighted_sum().supports_edge_parallel()
+    # The partial maxima of split rows are not added up
+    assert not weighted_sum("AggMax").supports_edge_parallel()
+
+
+def test_CPUKernelEdgeParallelSum():
+    unit = weighted_sum()
+    degrees, row_offsets, col_indices, eids = skewed_csr()
+    num_nodes, num_edges = len(degrees), len(eids)
+    node_ids = np.argsort(-degrees).astype(np.int32)
+    ptrs = [a.ctypes.data for a in (row_offsets, col_indices, eids, node_ids)]
+    h = torch.randn(num_nodes, 4)
+    w = torch.rand(num_edges, 1)
+
+    outs = []
+    for edge_parallel in [False, True]:
+        K = CPUKernel(unit, num_nodes, *ptrs, edge_parallel=edge_parallel)
+        out = torch.full((num_nodes, 4), float("nan"))
+        K.run([h, w, out])
+        outs.append(out)
+    dst = torch.repeat_interleave(torch.arange(num_nodes), torch.from_numpy(degrees))
+    src = torch.from_numpy(col_indices).long()
+    ref = torch.zeros(num_nodes, 4).index_add_(0, dst, h[src] * w[torch.from_numpy(eids).long()])
+    assert torch.allclose(outs[0], ref, atol=1e-5)
+    assert torch.allclose(outs[1], ref, atol=1e-5)
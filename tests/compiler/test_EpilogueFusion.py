@@ -0,0 +1,69 @@
+import torch
+from torch import nn
+
+from stgraph.compiler.passes import fuse
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.registry import clamp_code
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ParallelMode, ValType
+from stgraph.nn.pytorch.epilogue import is_fusable_activation
+
+
+def test_EpilogueFusedIntoAggregation():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    weight = Var.create_var([4], torch.float32, ValType.EDGE, var_id="winb")
+    bias = Var.create_var([4], torch.float32, ValType.PARAM, var_id="bias")
+    edge = Var.create_var([4], torch.float32, ValType.EDGE)
+    agg = Var.create_var([4], torch.float32, ValType.DEST)
+    biased = Var.create_var([4], torch.float32, ValType.DEST)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[h, weight], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=agg))
+    prog.append_stmt(Stmt.create_stmt(Schema("Add"), args=[agg, bias], ret=biased))
+    prog.append_stmt(Stmt.create_stmt(Schema("Sigmoid"), args=[biased], ret=out))
+
+    units = fuse([prog], [out])
+    assert len(units) == 1
+    assert units[0].compiled
+    assert units[0].parallel_mode() == ParallelMode.DstParallel
+    assert [stmt.op_name for stmt in units[0].program] == ["Mul", "AggSum", "Add", "Sigmoid"]
+    assert [ret.id for ret in units[0].unit_rets()] == [out.id]
+
+
+def test_NodewiseOutputNotWrittenPerEdge():
+    prog = Program()
+    x = Var.create_var([4], torch.float32, ValType.DEST, var_id="xcen")
+    grad = Var.create_var([4], torch.float32, ValType.DEST, var_id="gcen")
+    norm = Var.create_var([1], torch.float32, ValType.SRC, var_id="norminb")
+    masked = Var.create_var([4], torch.float32, ValType.DEST)
+    edge = Var.create_var([4], torch.float32, ValType.EDGE)
+    src = Var.create_var([4], torch.float32, ValType.SRC)
+    prog.append_stmt(Stmt.create_stmt(Schema("BackwardRelu"), args=[x, grad], ret=masked))
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[masked, norm], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=src))
+
+    # Fused into the source parallel unit the masked grad would only be
+    # written for nodes that have an edge
+    units = fuse([prog], [masked, src])
+    assert len(units) == 2
+    agg_unit = [unit for unit in units if unit.compiled][0]
+    assert agg_unit.parallel_mode() == ParallelMode.SrcParallel
+    assert masked.id in [arg.id for arg in agg_unit.unit_args()]
+    assert masked.id not in [ret.id for ret in agg_unit.unit_rets()]
+
+    # Without being an output it is recomputed for each edge
+    assert len(fuse([prog], [src])) == 1
+
+
+def test_FusableActivation():
+    assert is_fusable_activation(None)
+    assert is_fusable_activation(torch.relu)
+    assert is_fusable_activation(torch.nn.functional.relu)
+    assert is_fusable_activation(nn.LeakyReLU(0.1))
+    assert is_fusable_activation(nn.ReLU6())
+    assert not is_fusable_activation(nn.GELU())
+    assert not is_fusable_activation(lambda h: h * 2)
+
+    assert clamp_code("x", 0, 6) == "(x<0?0:(x>6?6:x))"
+    assert clamp_code("x", None, 1) == "(x>1?1:x)"
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+import torch
+
+from stgraph.compiler import STGraph
+from stgraph.compiler.backend.pytorch.torch_callback import STGraphBackendTorch
+from stgraph.graph.static.static_graph import StaticGraph
+
+
+def host_graph(num_nodes=10):
+    rng = np.random.default_rng(0)
+    edges = rng.integers(0, num_nodes, size=(2, 40))
+    return StaticGraph(edges, np.ones(40), num_nodes, device="cpu")
+
+
+def aggregate(graph, feats):
+    stgraph = STGraph(STGraphBackendTorch())
+
+    @stgraph.compile(gnn_module=torch.nn.Module())
+    def nb_compute(v):
+        return sum([nb.h for nb in v.innbs])
+
+    return nb_compute(g=graph, n_feats={"h": feats})
+
+
+def test_GraphStorageMustMatchFeatures():
+    graph = host_graph()
+    assert graph.host_memory
+    assert aggregate(graph, torch.ones(10, 2)).shape == (10, 2)
+
+    # Features off the host with a host graph
+    with pytest.raises(RuntimeError, match="graph is stored in host memory"):
+        aggregate(graph, torch.ones(10, 2, device="meta"))
+
+    # Host features with a graph whose pointers are device memory
+    graph.host_memory = False
+    with pytest.raises(RuntimeError, match="graph is not"):
+        aggregate(graph, torch.ones(10, 2))
@@ -0,0 +1,76 @@
+import numpy as np
+import torch
+
+from stgraph.compiler import STGraph
+from stgraph.compiler.backend.pytorch.torch_callback import STGraphBackendTorch
+from stgraph.compiler.stgraph import EXECUTOR_CACHE_SIZE
+from stgraph.graph.static.static_graph import StaticGraph
+
+
+class Scale(torch.nn.Module):
+    def __init__(self, width):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.rand(width))
+        self.stgraph = STGraph(STGraphBackendTorch())
+
+    def forward(self, graph, h):
+        @self.stgraph.compile(gnn_module=self)
+        def nb_compute(v):
+            return sum([nb.h * self.weight for nb in v.innbs])
+        return nb_compute(g=graph, n_feats={"h": h})
+
+    def context(self):
+        (ctx,) = self.stgraph._ctx_map.values()
+        return ctx
+
+
+def host_graph(num_nodes=10):
+    rng = np.random.default_rng(0)
+    edges = rng.integers(0, num_nodes, size=(2, 40))
+    return StaticGraph(edges, np.ones(40), num_nodes, device="cpu")
+
+
+def test_ExecutorCacheHit():
+    graph = host_graph()
+    module = Scale(4)
+    module(graph, torch.rand(10, 4))
+    (executor,) = module.context()._executor_cache.values()
+
+    module(graph, torch.rand(10, 4))
+    assert list(module.context()._executor_cache.values()) == [executor]
+
+
+def test_ExecutorCacheRetraces():
+    graph = host_graph()
+    module = Scale(1)
+    module(graph, torch.rand(10, 4))
+
+    # A new feature width is traced again
+    out = module(graph, torch.rand(10, 3))
+    assert out.shape == (10, 3)
+    assert len(module.context()._executor_cache) == 2
+
+    # So is a parameter of a new shape, with the features unchanged
+    module.weight = torch.nn.Parameter(torch.rand(3))
+    module(graph, torch.rand(10, 3))
+    assert len(module.context()._executor_cache) == 3
+
+
+def test_ExecutorCacheEviction():
+    graph = host_graph()
+    module = Scale(1)
+    for width in range(1, EXECUTOR_CACHE_SIZE + 1):
+        module(graph, torch.rand(10, width))
+    ctx = module.context()
+    first, second = list(ctx._executor_cache)[:2]
+    evicted = ctx._executor_cache[second]
+    evicted.arena.release(torch.empty(16))
+
+    # A hit makes the first signature the most recently used one
+    module(graph, torch.rand(10, 1))
+    module(graph, torch.rand(10, EXECUTOR_CACHE_SIZE + 1))
+    assert len(ctx._executor_cache) == EXECUTOR_CACHE_SIZE
+    assert first in ctx._executor_cache and second not in ctx._executor_cache
+    assert set(ctx._programs) == set(ctx._executor_cache)
+    # Buffers recycled by the evicted executor are freed
+    assert evicted.arena.free_bytes == 0 and not evicted.arena.free
@@ -0,0 +1,70 @@
+import torch
+
+from stgraph.compiler.passes import fuse
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ParallelMode, ValType
+
+
+def aggregate(prog, src, weight, val_type=ValType.DEST):
+    edge = Var.create_var(list(src.var_shape), torch.float32, ValType.EDGE)
+    node = Var.create_var(list(src.var_shape), torch.float32, val_type)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[src, weight], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=node))
+    return node
+
+
+def test_SiblingAggregationsShareOneKernel():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    w1 = Var.create_var([4], torch.float32, ValType.EDGE, var_id="w1")
+    w2 = Var.create_var([4], torch.float32, ValType.EDGE, var_id="w2")
+    norm = Var.create_var([1], torch.float32, ValType.DEST, var_id="normcen")
+    first = aggregate(prog, h, w1)
+    second = aggregate(prog, h, w2)
+    scaled = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[second, norm], ret=scaled))
+
+    units = fuse([prog], [first, scaled])
+    assert len(units) == 1
+    unit = units[0]
+    assert unit.parallel_mode() == ParallelMode.DstParallel
+    assert {ret.id for ret in unit.unit_rets()} == {first.id, scaled.id}
+    # All edge-wise stmts precede the aggregations, the node-wise epilogue follows them
+    assert [stmt.op_name for stmt in unit.program] == ["Mul", "Mul", "AggSum", "AggSum", "Mul"]
+
+
+def test_IncompatibleParallelModesNotFused():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    g = Var.create_var([4], torch.float32, ValType.DEST, var_id="gcen")
+    w = Var.create_var([4], torch.float32, ValType.EDGE, var_id="w")
+    norm = Var.create_var([1], torch.float32, ValType.SRC, var_id="norminb")
+    dst = aggregate(prog, h, w)
+    src = aggregate(prog, g, w, val_type=ValType.SRC)
+    scaled = Var.create_var([4], torch.float32, ValType.SRC)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[src, norm], ret=scaled))
+
+    # The source aggregation would only be complete at the end of a
+    # destination parallel kernel, too late for its epilogue
+    units = fuse([prog], [dst, scaled])
+    assert len(units) == 2
+    assert {unit.parallel_mode() for unit in units} == {ParallelMode.DstParallel, ParallelMode.SrcParallel}
+
+    # Without the epilogue it is written atomically from the shared kernel
+    assert len(fuse([prog], [dst, src])) == 1
+
+
+def test_HorizontalFusionKeepsDependencies():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    w = Var.create_var([4], torch.float32, ValType.EDGE, var_id="w")
+    first = aggregate(prog, h, w)
+    second = aggregate(prog, first, w)
+    sibling = aggregate(prog, h, h)
+
+    units = fuse([prog], [second, sibling])
+    assert len(units) == 2
+    order = [{ret.id for ret in unit.unit_rets()} for unit in units]
+    # The sibling joins the first aggregation, which still runs before the second
+    assert order == [{first.id, sibling.id}, {second.id}]
@@ -0,0 +1,56 @@
+import torch
+
+from stgraph.compiler.autodiff import diff
+from stgraph.compiler.passes import fuse, joint_optimize
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ValType
+
+
+def backward(prog, out, units):
+    grad = Var.create_var(out.var_shape, out.var_dtype, out.val_type)
+    return diff([out], [grad], units, prog)
+
+
+def test_MaterializedAggregationRemovedWithoutGrad():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb", requires_grad=False)
+    norm = Var.create_var([1], torch.float32, ValType.DEST, var_id="normcen", requires_grad=False)
+    agg = Var.create_var([4], torch.float32, ValType.DEST)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("AggMax"), args=[h], ret=agg))
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[agg, norm], ret=out))
+    units = fuse([prog], [out])
+    assert {ret.id for ret in units[0].unit_rets()} == {agg.id, out.id}
+    bunits = backward(prog, out, units)
+    assert len(bunits) == 0
+
+    # Without a backward the max is not needed outside the kernel
+    units, bunits, report = joint_optimize(units, bunits, [out], 10, 30)
+    assert [ret.id for ret in units[0].unit_rets()] == [out.id]
+    assert [stmt.op_name for stmt in units[0].program] == ["AggMax", "Mul"]
+    assert report["units_removed"] == 0 and report["bytes_removed"] == 10 * 4 * 4
+
+
+def test_UnusedGradRemoved():
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    w = Var.create_var([4], torch.float32, ValType.EDGE, var_id="w")
+    edge = Var.create_var([4], torch.float32, ValType.EDGE)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[h, w], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=out))
+    units = fuse([prog], [out])
+    bunits = backward(prog, out, units)
+    assert len(bunits) == 1 and len(bunits[0].unit_rets()) == 2
+
+    # Once w stops requiring grad, neither its grad nor h, only read to compute it, are kept
+    for arg in units[0].unit_args():
+        if arg.id == w.id:
+            arg._requires_grad = False
+    h_grad = [arg for arg in units[0].unit_args() if arg.id == h.id][0]._grad
+    units, bunits, report = joint_optimize(units, bunits, [out], 10, 30)
+    assert [ret.id for ret in bunits[0].unit_rets()] == [h_grad.id]
+    assert h.id not in [arg.id for arg in bunits[0].unit_args()]
+    assert report["stmts_removed"] == 1
+    assert report["bytes_removed"] == 30 * 4 * 4 + 10 * 4 * 4
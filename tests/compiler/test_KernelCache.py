@@ -0,0 +1,72 @@
+import ctypes
+import os
+
+from stgraph.compiler.code_gen.kernel_cache import KernelCache
+
+
+def write_module(path, size):
+    with open(path, "wb") as f:
+        f.write(b"\0" * size)
+    return path
+
+
+def test_KernelCacheHitMiss(tmp_path):
+    cache = KernelCache(cache_dir=str(tmp_path / "cache"))
+    key = cache.key("extern void K0();", "int", "csr", ["-O3"], "x86_64")
+
+    assert cache.lookup(key, ".so") is None
+    path = cache.store(key, ".so", write_module(str(tmp_path / "K0.so"), 16))
+
+    assert os.path.exists(path)
+    assert cache.lookup(key, ".so") == path
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == 16
+
+
+def test_KernelCacheKey():
+    cache = KernelCache()
+    key = cache.key("src", "int", "csr", ["-O3"], "sm_80")
+
+    assert key == cache.key("src", "int", "csr", ["-O3"], "sm_80")
+    assert key != cache.key("src", "int", "pcsr", ["-O3"], "sm_80")
+    assert key != cache.key("src", "int", "csr", ["-O2"], "sm_80")
+    assert key != cache.key("src", "int", "csr", ["-O3"], "sm_90")
+    assert key != cache.key("src ", "int", "csr", ["-O3"], "sm_80")
+
+
+def test_KernelCacheEviction(tmp_path):
+    cache = KernelCache(cache_dir=str(tmp_path / "cache"), max_bytes=100)
+    keys = [cache.key(str(i), "int", "csr", [], "") for i in range(3)]
+
+    for i, key in enumerate(keys):
+        cache.store(key, ".ptx", write_module(str(tmp_path / f"K{i}.ptx"), 40))
+        os.utime(cache.path(key, ".ptx"), (i, i))
+
+    # Storing the third module exceeds the bound and evicts the oldest one
+    assert cache.lookup(keys[0], ".ptx") is None
+    assert cache.lookup(keys[2], ".ptx") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.size() <= 100
+
+
+def test_KernelCacheLoadFailureIsMiss(tmp_path):
+    cache = KernelCache(cache_dir=str(tmp_path / "cache"))
+    key = cache.key("extern void K0();", "int", "csr", ["-O3"], "x86_64")
+    path = cache.store(key, ".so", write_module(str(tmp_path / "K0.so"), 16))
+
+    assert cache.load(key, ".so", lambda p: p) == path
+    assert cache.stats()["hits"] == 1
+
+    # A damaged module is dropped so that the caller compiles it again
+    assert cache.load(key, ".so", ctypes.CDLL) is None
+    assert not os.path.exists(path)
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    def evicted(p):
+        raise FileNotFoundError(p)
+
+    cache.store(key, ".so", write_module(str(tmp_path / "K0.so"), 16))
+    assert cache.load(key, ".so", evicted) is None
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,24 @@
+from ctypes import c_int, c_void_p, cast, POINTER
+
+from stgraph.compiler.execution_unit import LaunchPlan
+
+
+def param_value(plan, i, ctype):
+    return cast(plan.params[i], POINTER(ctype)).contents.value
+
+
+def test_LaunchPlanPatchesPointers():
+    plan = LaunchPlan(2, [c_void_p(0x100), c_int(10)])
+    params = plan.params
+
+    plan.set_tensor_ptrs([0x1000, 0x2000])
+    assert param_value(plan, 0, c_void_p) == 0x1000
+    assert param_value(plan, 1, c_void_p) == 0x2000
+
+    # The argument array is reused, only the values behind it change
+    plan.set_tensor_ptrs([0x1000, 0x3000])
+    plan.set_const(1, 20)
+    assert plan.params is params
+    assert param_value(plan, 1, c_void_p) == 0x3000
+    assert param_value(plan, 2, c_void_p) == 0x100
+    assert param_value(plan, 3, c_int) == 20
@@ -0,0 +1,51 @@
+import importlib
+
+import torch
+
+from stgraph.compiler.autodiff import diff
+from stgraph.compiler.passes import fuse, joint_optimize, saved_vars
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ValType
+
+mem_planning = importlib.import_module("stgraph.compiler.passes.mem_planning")
+
+
+def attention():
+    # Softmax weighted sum as in GAT, the edge scores are read by both passes
+    prog = Program()
+    el = Var.create_var([2], torch.float32, ValType.SRC, var_id="elinb")
+    er = Var.create_var([2], torch.float32, ValType.DEST, var_id="ercen")
+    h = Var.create_var([2], torch.float32, ValType.SRC, var_id="hinb")
+    score = Var.create_var([2], torch.float32, ValType.EDGE)
+    coeff = Var.create_var([2], torch.float32, ValType.EDGE)
+    norm = Var.create_var([2], torch.float32, ValType.DEST)
+    alpha = Var.create_var([2], torch.float32, ValType.EDGE)
+    msg = Var.create_var([2], torch.float32, ValType.EDGE)
+    out = Var.create_var([2], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Add"), args=[el, er], ret=score))
+    prog.append_stmt(Stmt.create_stmt(Schema("exp"), args=[score], ret=coeff))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[coeff], ret=norm))
+    prog.append_stmt(Stmt.create_stmt(Schema("TrueDiv"), args=[coeff, norm], ret=alpha))
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[alpha, h], ret=msg))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[msg], ret=out))
+    units = fuse([prog], [out])
+    grad = Var.create_var(out.var_shape, out.var_dtype, out.val_type)
+    bunits = diff([out], [grad], units, prog)
+    return coeff, joint_optimize(units, bunits, [out], 10, 30)
+
+
+def test_CheapEdgeVarRebuilt():
+    coeff, (units, bunits, _) = attention()
+    assert coeff.id in [ret.id for unit in units for ret in unit.unit_rets()]
+    saved = {var.id for var in saved_vars(units, bunits)}
+    # The exp is evaluated again per edge instead of keeping its result
+    assert coeff.id not in saved
+    assert any(stmt.ret.id == coeff.id for unit in bunits for stmt in unit.program)
+    assert all(not var.is_edgevar() for var in saved_vars(units, bunits))
+
+
+def test_ExpensiveEdgeVarSaved(monkeypatch):
+    monkeypatch.setattr(mem_planning, "MAX_RECOMPUTE_FLOPS_PER_BYTE", 1.0)
+    coeff, (units, bunits, _) = attention()
+    assert coeff.id in {var.id for var in saved_vars(units, bunits)}
@@ -0,0 +1,70 @@
+import torch
+
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.program_registry import ProgramRegistry
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ExecutionTarget, ValType
+
+
+def build_program(feat_id, op_name="Mul"):
+    prog = Program()
+    h = Var.create_var([4], torch.float32, ValType.SRC, var_id=feat_id + "inb")
+    norm = Var.create_var([1], torch.float32, ValType.SRC, var_id="norminb")
+    tmp = Var.create_var([4], torch.float32, ValType.EDGE)
+    out = Var.create_var([4], torch.float32, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema(op_name), args=[h, norm], ret=tmp))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[tmp], ret=out))
+    return prog, out
+
+
+def test_ProgramRegistryKey():
+    registry = ProgramRegistry()
+    prog_a, out_a = build_program("h")
+    prog_b, out_b = build_program("x")
+    prog_c, out_c = build_program("h", op_name="Add")
+
+    key_a, inputs_a = registry.key(prog_a, [out_a], "csr", ExecutionTarget.CUDA)
+    key_b, inputs_b = registry.key(prog_b, [out_b], "csr", ExecutionTarget.CUDA)
+
+    # Temporary and input ids are abstracted away
+    assert key_a == key_b
+    assert [var.id for var in inputs_a] == ["Vhinb", "Vnorminb"]
+    assert [var.id for var in inputs_b] == ["Vxinb", "Vnorminb"]
+
+    assert key_a != registry.key(prog_c, [out_c], "csr", ExecutionTarget.CUDA)[0]
+    assert key_a != registry.key(prog_a, [out_a], "pcsr", ExecutionTarget.CUDA)[0]
+    assert key_a != registry.key(prog_a, [out_a], "csr", ExecutionTarget.OPENMP)[0]
+
+
+def test_ProgramRegistryLookup():
+    registry = ProgramRegistry()
+    prog, out = build_program("h")
+    key, _ = registry.key(prog, [out], "csr", ExecutionTarget.CUDA)
+
+    assert registry.lookup(key) is None
+    registry.register(key, "compiled")
+    assert registry.lookup(key) == "compiled"
+    assert registry.stats() == {"hits": 1, "misses": 1, "programs": 1}
+
+
+def test_ProgramRegistryReleasesUnused():
+    registry = ProgramRegistry(max_unused=1)
+    prog, out = build_program("h")
+    keys = [registry.key(prog, [out], graph_type, ExecutionTarget.CUDA)[0] for graph_type in ["csr", "pcsr", "gpma"]]
+    for key in keys:
+        registry.register(key, "compiled")
+
+    # Shared by a second context, still used once the first releases it
+    assert registry.lookup(keys[0]) == "compiled"
+    registry.release(keys[0])
+    registry.release(keys[1])
+    registry.release(keys[2])
+    assert len(registry) == 2
+    assert registry.lookup(keys[1]) is None
+    assert registry.lookup(keys[2]) == "compiled"
+
+    # The most recently released unused program is kept
+    registry.release(keys[2])
+    registry.release(keys[0])
+    assert len(registry) == 1
+    assert registry.lookup(keys[0]) == "compiled"
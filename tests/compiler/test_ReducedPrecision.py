@@ -0,0 +1,38 @@
+import torch
+
+from stgraph.compiler.passes import fuse
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ValType
+
+
+def test_VarDtypes():
+    assert Var.create_var([4], torch.float32, ValType.SRC).dtype_str == "float"
+    assert Var.create_var([4], torch.float64, ValType.SRC).dtype_str == "double"
+    half = Var.create_var([4], torch.float16, ValType.SRC)
+    bf16 = Var.create_var([4], torch.bfloat16, ValType.SRC)
+    assert (half.dtype_str, half.acc_dtype_str) == ("stg_half", "float")
+    assert (bf16.dtype_str, bf16.acc_dtype_str) == ("stg_bfloat16", "float")
+
+
+def test_ReducedPrecisionAccumulatedAsFloat():
+    prog = Program()
+    h = Var.create_var([4], torch.bfloat16, ValType.SRC, var_id="hinb")
+    w = Var.create_var([1], torch.bfloat16, ValType.EDGE, var_id="w")
+    edge = Var.create_var([4], torch.bfloat16, ValType.EDGE)
+    out = Var.create_var([4], torch.bfloat16, ValType.DEST)
+    prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[h, w], ret=edge))
+    prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=out))
+
+    unit = fuse([prog], [out])[0]
+    ctx = unit.create_context("int")
+    codes = []
+    for stmt in unit.program:
+        ctx.set_stmt_ctx(stmt)
+        codes.append(stmt.gen_code(ctx))
+    mul, agg = codes
+    # Loads are converted to float, the products and the sum stay in float
+    assert mul["compute"].startswith("float ")
+    assert "((float)Vhinb[" in mul["compute"] and "((float)Vw[" in mul["compute"]
+    assert agg["init"].startswith("float ")
+    assert agg["outter_write"].startswith("V" + str(out.int_id))
@@ -0,0 +1,56 @@
+import torch
+
+from stgraph.compiler.passes import fuse, plan_storage
+from stgraph.compiler.passes.mem_planning import can_update_inplace
+from stgraph.compiler.program import Program, Stmt, Var
+from stgraph.compiler.schema import Schema
+from stgraph.compiler.utils import ValType
+
+
+def build_chain(num_stages):
+    prog = Program()
+    weight = Var.create_var([4], torch.float32, ValType.EDGE, var_id="winb")
+    cur = Var.create_var([4], torch.float32, ValType.SRC, var_id="hinb")
+    for _ in range(num_stages):
+        edge = Var.create_var([4], torch.float32, ValType.EDGE)
+        node = Var.create_var([4], torch.float32, ValType.DEST)
+        prog.append_stmt(Stmt.create_stmt(Schema("Mul"), args=[cur, weight], ret=edge))
+        prog.append_stmt(Stmt.create_stmt(Schema("AggSum"), args=[edge], ret=node))
+        cur = node
+    return fuse([prog], [cur]), weight, cur
+
+
+def test_StoragePlanSharesDisjointRanges():
+    units, _, out = build_chain(4)
+    assert len(units) == 4
+
+    plan = plan_storage(units, [], {out})
+    first, second, third = [unit.unit_rets()[0] for unit in units[:3]]
+
+    assert plan.live_ranges[first] == (0, 1)
+    assert plan.live_ranges[second] == (1, 2)
+    assert not plan.is_planned(out)
+
+    # first is dead once third is written, second overlaps with both
+    assert plan.slot_of[first.id] is plan.slot_of[third.id]
+    assert plan.slot_of[second.id] is not plan.slot_of[first.id]
+
+    report = plan.report(num_nodes=10, num_edges=30)
+    assert report["vars"] == 3
+    assert report["slots"] == 2
+    assert report["peak_bytes_before"] == 3 * 10 * 4 * 4
+    assert report["peak_bytes_after"] == 2 * 10 * 4 * 4
+    assert report["live_bytes"] <= report["peak_bytes_after"]
+
+
+def test_StoragePlanInplace():
+    units, weight, _ = build_chain(1)
+    unit = units[0]
+    mul, agg = [stmt for stmt in unit.program]
+
+    # The product is computed per edge at the offsets the weight is read at
+    assert can_update_inplace(unit, weight, mul.ret)
+    # Node features are read by all edges of a node
+    assert not can_update_inplace(unit, mul.args[0], mul.ret)
+    # Aggregations write other rows than they read
+    assert not can_update_inplace(unit, mul.ret, agg.ret)
@@ -0,0 +1,82 @@
+import numpy as np
+import torch
+
+from stgraph.compiler.executor import TensorArena
+from stgraph.graph.static.static_graph import StaticGraph
+from stgraph.nn.pytorch.static.gat_conv import GATConv
+
+
+def host_arena(**kwargs):
+    arena = TensorArena(**kwargs)
+    arena.new_zeros = torch.zeros
+    arena.new_empty = torch.empty
+    arena.fill_zeros = lambda t: t.zero_()
+    return arena
+
+
+def host_graph(num_nodes, num_edges):
+    rng = np.random.default_rng(num_nodes)
+    edges = np.unique(rng.integers(0, num_nodes, size=(num_edges, 2)), axis=0).T
+    graph = StaticGraph(edges, np.ones(edges.shape[1]), num_nodes, device="cpu")
+    return graph, torch.from_numpy(edges[0]), torch.from_numpy(edges[1])
+
+
+def gat_reference(gat, x, src, dst):
+    num_nodes = x.shape[0]
+    h = gat.fc(x).view(num_nodes, 2, 3)
+    e = (h * gat.attn_l).sum(-1)[src] + (h * gat.attn_r).sum(-1)[dst]
+    # max(embs) of nb_forward is traced per edge
+    e = torch.exp(torch.nn.functional.leaky_relu(e - e.detach(), 0.2))
+    alpha = e / torch.zeros(num_nodes, 2).index_add(0, dst, e)[dst]
+    return torch.zeros(num_nodes, 2, 3).index_add(0, dst, alpha.unsqueeze(-1) * h[src])
+
+
+def test_TensorArenaBuckets():
+    assert [TensorArena.capacity(n) for n in [0, 1, 2, 100, 128, 129]] == [0, 1, 2, 112, 128, 160]
+
+    arena = host_arena()
+    buf = arena.acquire(100, torch.float32, "cpu", False)
+    assert buf.shape == (112,)
+    arena.release(buf)
+
+    # A slightly larger request of the same bucket reuses the buffer
+    again = arena.acquire(110, torch.float32, "cpu", True)
+    assert again.data_ptr() == buf.data_ptr() and not again.any()
+    assert arena.reused == 1 and arena.allocated == 1
+    assert arena.acquire(110, torch.float16, "cpu", False).data_ptr() != buf.data_ptr()
+
+
+def test_TensorArenaByteCap():
+    # Two buffers of 112 floats fit, a third one evicts the oldest
+    arena = host_arena(max_free_bytes=1000)
+    bufs = [arena.acquire(100, torch.float32, "cpu", False) for _ in range(3)]
+    for buf in bufs:
+        arena.release(buf)
+    assert arena.evicted == 1 and arena.free_bytes == 2 * 112 * 4
+    assert arena.acquire(100, torch.float32, "cpu", False).data_ptr() in [b.data_ptr() for b in bufs[1:]]
+
+    # Too large to be kept at all
+    arena.release(torch.empty(1000))
+    assert arena.free_bytes == 112 * 4
+
+    arena.clear()
+    assert arena.free_bytes == 0 and not arena.free
+
+
+def test_SlotsGrowAcrossGraphs():
+    torch.manual_seed(0)
+    gat = GATConv(5, 3, 2)
+
+    for graph, src, dst in [host_graph(40, 200), host_graph(20, 60), host_graph(30, 120)]:
+        x = torch.randn(graph.get_num_nodes(), 5, requires_grad=True)
+        out = gat(graph, x)
+        ref = gat_reference(gat, x, src, dst)
+        assert torch.allclose(out, ref, atol=1e-5)
+        grad, ref_grad = (torch.autograd.grad(o.pow(2).sum(), x)[0] for o in (out, ref))
+        assert torch.allclose(grad, ref_grad, atol=1e-4)
+
+    # Sized by the largest graph, the slots are recycled for the smaller ones
+    (ctx,) = gat.stgraph._ctx_map.values()
+    (executor,) = ctx._executor_cache.values()
+    assert executor.arena.allocated == len(executor.mem_plan.slots)
+    assert executor.arena.reused > 0
@@ -0,0 +1,27 @@
+from stgraph.nn.pytorch.static.gcn_conv import GCNConv
+
+
+class CountGraph:
+    def __init__(self, num_nodes, num_edges):
+        self.num_nodes = num_nodes
+        self.num_edges = num_edges
+
+    def get_num_nodes(self):
+        return self.num_nodes
+
+    def get_num_edges(self):
+        return self.num_edges
+
+
+def test_AggregateOverNarrowerFeatures():
+    graph = CountGraph(1000, 20000)
+    assert GCNConv(16, 64, bias=False)._aggregate_first(graph)
+    assert not GCNConv(64, 16, bias=False)._aggregate_first(graph)
+    assert not GCNConv(32, 32, bias=False)._aggregate_first(graph)
+
+
+def test_UnfusedEpilogueCost():
+    # With few edges per node the extra pass of the unfused epilogue outweighs
+    # aggregating over the narrower features
+    assert not GCNConv(16, 20)._aggregate_first(CountGraph(1000, 2000))
+    assert GCNConv(16, 20)._aggregate_first(CountGraph(1000, 20000))
@@ -0,0 +1,150 @@
+import copy
+
+import numpy as np
+import pytest
+import torch
+
+from stgraph.compiler.cpu_kernel import host_array
+from stgraph.graph.dynamic.checkpoints import SnapshotCheckpoints
+from stgraph.graph.dynamic.naive.naive_graph import NaiveGraph
+
+
+def snapshots(num_nodes=20, num_timestamps=12):
+    rng = np.random.default_rng(0)
+    edges = {tuple(e) for e in rng.integers(0, num_nodes, size=(60, 2)).tolist()}
+    edge_list = []
+    for _ in range(num_timestamps):
+        edges = set(sorted(edges)[3:]) | {tuple(e) for e in rng.integers(0, num_nodes, size=(4, 2)).tolist()}
+        edge_list.append([list(e) for e in sorted(edges, key=lambda x: (x[1], x[0]))])
+    return edge_list
+
+
+def in_degrees(edges, num_nodes=20):
+    return np.bincount([dst for _, dst in edges], minlength=num_nodes).tolist()
+
+
+def out_degrees(edges, num_nodes=20):
+    return np.bincount([src for src, _ in edges], minlength=num_nodes).tolist()
+
+
+def count_calls(obj, name):
+    calls = []
+    method = getattr(obj, name)
+
+    def counted(*args):
+        calls.append(args)
+        return method(*args)
+
+    setattr(obj, name, counted)
+    return calls
+
+
+def reverse_all(schedule, num_timestamps=64, **kwargs):
+    checkpoints = SnapshotCheckpoints(num_timestamps, list, lambda s, t: s.append(t), schedule=schedule, **kwargs)
+    state = [0]
+    checkpoints.start_window(0, state)
+    for t in range(1, num_timestamps):
+        state.append(t)
+        checkpoints.record(t, state)
+    peak = len(checkpoints)
+    for t in reversed(range(num_timestamps)):
+        checkpoints.release_after(t)
+        assert checkpoints.restore(t) == list(range(t + 1))
+        peak = max(peak, len(checkpoints))
+    return checkpoints.replayed, peak
+
+
+def test_ScheduleTradeOff():
+    assert reverse_all("every_k", interval=1) == (0, 64)
+    assert reverse_all("every_k", interval=64) == (sum(range(64)), 1)
+    sqrt_replayed, sqrt_peak = reverse_all("sqrt")
+    assert sqrt_peak == 8 and sqrt_replayed < sum(range(64)) // 8
+    # Fewer checkpoints than sqrt and fewer replayed updates
+    binomial_replayed, binomial_peak = reverse_all("binomial")
+    assert binomial_peak <= 7 and binomial_replayed < sqrt_replayed
+    replayed, peak = reverse_all("binomial", budget=3)
+    assert peak <= 3 and replayed < sum(range(64))
+
+
+@pytest.mark.parametrize("keyframe_interval", [None, 3])
+def test_NaiveGraphRestoresFromCheckpoints(keyframe_interval):
+    edge_list = snapshots()
+    G = NaiveGraph(copy.deepcopy(edge_list), 20, keyframe_interval=keyframe_interval,
+                   cache_size=2, device="cpu")
+    reverted = count_calls(G, "_update_graph_backward")
+    checkpoints = G.enable_checkpointing("every_k", interval=4)
+
+    for t in range(12):
+        G.get_graph(t)
+        assert G.in_degrees().tolist() == in_degrees(edge_list[t])
+    assert checkpoints.timestamps() == [0, 4, 8]
+
+    # Reverting a timestamp is cheaper than replaying 2 from timestamp 8
+    G.get_backward_graph(11)
+    G.get_backward_graph(10)
+    assert len(reverted) == 1 and checkpoints.replayed == 0
+    # Reverting 9 timestamps is replaced by replaying 1 from timestamp 0
+    G.get_backward_graph(1)
+    assert len(reverted) == 1 and checkpoints.replayed == 1
+    assert G.in_degrees().tolist() == in_degrees(edge_list[1])
+    # The backward CSR of the restored timestamp has a row per source
+    row_offsets = host_array(G.bwd_row_offset_ptr, 21)
+    assert row_offsets.diff().tolist() == out_degrees(edge_list[1])
+
+    # The next window resumes from timestamp 8 instead
+    G.get_graph(11)
+    assert checkpoints.replayed == 4
+    assert G.in_degrees().tolist() == in_degrees(edge_list[11])
+    row_offsets = host_array(G.fwd_row_offset_ptr, 21)
+    assert row_offsets.diff().tolist() == in_degrees(edge_list[11])
+
+    # Later epochs jump straight to their window
+    G.reset_graph()
+    G.get_graph(10)
+    assert checkpoints.replayed == 6
+    assert G.in_degrees().tolist() == in_degrees(edge_list[10])
+    assert G.get_num_edges() == len(edge_list[10])
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="PCSR and GPMA graphs are stored on the GPU")
+@pytest.mark.parametrize("graph_type", ["pcsr", "gpma"])
+def test_GPUGraphRestoresFromCheckpoints(graph_type):
+    if graph_type == "pcsr":
+        from stgraph.graph.dynamic.pcsr.pcsr_graph import PCSRGraph as Graph
+    else:
+        from stgraph.graph.dynamic.gpma.gpma_graph import GPMAGraph as Graph
+
+    edge_list = snapshots()
+    G = Graph(copy.deepcopy(edge_list), 20)
+    reverted = count_calls(G, "_update_graph_backward")
+    checkpoints = G.enable_checkpointing("every_k", interval=4)
+
+    for t in range(12):
+        G.get_graph(t)
+        assert G.in_degrees().tolist() == in_degrees(edge_list[t])
+
+    G.get_backward_graph(11)
+    G.get_backward_graph(10)
+    G.get_backward_graph(1)
+    assert len(reverted) == 1 and checkpoints.replayed == 1
+    # The graph was not copied when backprop started
+    assert list(G.graph_cache) == ["base"]
+
+    G.get_graph(11)
+    assert checkpoints.replayed == 4
+    assert G.in_degrees().tolist() == in_degrees(edge_list[11])
+
+    G.reset_graph()
+    G.get_graph(10)
+    assert checkpoints.replayed == 6
+    assert G.in_degrees().tolist() == in_degrees(edge_list[10])
+    assert G.get_num_edges() == len(edge_list[10])
+
+
+def test_ScheduleArguments():
+    with pytest.raises(ValueError, match="Unknown"):
+        SnapshotCheckpoints(8, list, list.append, schedule="every_other")
+    with pytest.raises(ValueError, match="interval"):
+        SnapshotCheckpoints(8, list, list.append, schedule="every_k")
+    with pytest.raises(ValueError, match="at least one"):
+        SnapshotCheckpoints(8, list, list.append, schedule="binomial", budget=0)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from stgraph.graph.static.host_csr import HostCSR, counting_argsort, select_csr
+
+
+def test_CountingArgsort():
+    rng = np.random.default_rng(0)
+    for high in [1, 7, 2**16, 2**31 - 1]:
+        keys = rng.integers(0, high, size=1000)
+        assert (counting_argsort(keys) == np.argsort(keys, kind="stable")).all()
+    assert len(counting_argsort(np.array([], dtype=np.int64))) == 0
+    with pytest.raises(ValueError, match="non-negative"):
+        counting_argsort(np.array([3, -1]))
+
+
+def test_SelectCSR():
+    assert select_csr("cpu") is HostCSR
+
+
+def test_HostCSR():
+    rng = np.random.default_rng(0)
+    num_nodes = 30
+    edges = sorted({tuple(e) for e in rng.integers(0, num_nodes, size=(200, 2)).tolist()}, key=lambda x: (x[1], x[0]))
+    weights = rng.random(len(edges))
+    edge_list = [(src, dst, eid) for eid, (src, dst) in enumerate(edges)]
+
+    # Rows are the dst of the edges, as for the forward graph
+    csr = HostCSR(edge_list, weights, num_nodes, is_edge_reverse=True)
+    src = np.array([e[0] for e in edges])
+    dst = np.array([e[1] for e in edges])
+    assert csr.row_offset.tolist() == [0] + np.cumsum(np.bincount(dst, minlength=num_nodes)).tolist()
+    assert csr.column_indices.tolist() == src.tolist()
+    assert csr.eids.tolist() == list(range(len(edges)))
+    assert (csr.out_degrees == np.bincount(dst, minlength=num_nodes)).all()
+    assert (csr.in_degrees == np.bincount(src, minlength=num_nodes)).all()
+    assert np.allclose(csr.weighted_out_degrees, np.bincount(dst, weights=weights, minlength=num_nodes))
+    assert sorted(csr.node_ids.tolist()) == list(range(num_nodes))
+    assert (np.diff(csr.out_degrees[csr.node_ids]) <= 0).all()
+
+    # Edges are grouped into rows whatever their order
+    shuffled = [edge_list[i] for i in rng.permutation(len(edge_list))]
+    csr2 = HostCSR(shuffled, weights, num_nodes, is_edge_reverse=True)
+    assert (csr2.row_offset == csr.row_offset).all()
+    for row in range(num_nodes):
+        beg, end = csr.row_offset[row], csr.row_offset[row + 1]
+        assert sorted(csr2.eids[beg:end].tolist()) == csr.eids[beg:end].tolist()
+    assert csr2.row_offset_ptr == csr2.row_offset.ctypes.data
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from stgraph.graph.dynamic.naive.naive_graph import NaiveGraph
+
+
+def snapshots(num_nodes=30, num_timestamps=8):
+    rng = np.random.default_rng(0)
+    edges = {tuple(e) for e in rng.integers(0, num_nodes, size=(120, 2)).tolist()}
+    edge_list = []
+    for _ in range(num_timestamps):
+        edges = set(sorted(edges)[4:]) | {tuple(e) for e in rng.integers(0, num_nodes, size=(5, 2)).tolist()}
+        edge_list.append(sorted(edges, key=lambda x: (x[1], x[0])))
+    return edge_list
+
+
+def degrees(G, t):
+    snapshot = G._snapshot(t)
+    return [np.asarray(csr.out_degrees).tolist() for csr in [snapshot.forward, snapshot.backward]]
+
+
+def test_DeltaSnapshotsMatchFullSnapshots():
+    edge_list = snapshots()
+    full = NaiveGraph([list(e) for e in edge_list], 30)
+    delta = NaiveGraph([list(e) for e in edge_list], 30, keyframe_interval=3, cache_size=2)
+
+    # In order, out of order and backwards as during backprop
+    for t in list(range(8)) + [5, 1, 7] + list(reversed(range(8))):
+        assert degrees(delta, t) == degrees(full, t)
+        assert len(delta._snapshot_cache) <= 2
+    assert sorted(delta._keyframes) == [0, 3, 6]
+
+    delta.get_graph(7)
+    assert delta.get_num_edges() == len(edge_list[7])
+    assert (delta.in_degrees() == full._snapshot(7).forward.out_degrees).all()
+
+    full_bytes = full.resident_bytes()
+    delta_bytes = delta.resident_bytes()
+    assert delta_bytes["keyframes"] == 8 * sum(len(edge_list[t]) for t in [0, 3, 6])
+    assert delta_bytes["deltas"] > 0
+    assert sum(delta_bytes.values()) < sum(full_bytes.values())
+
+
+def test_ResetExposesFirstSnapshot():
+    edge_list = snapshots()
+    G = NaiveGraph([list(e) for e in edge_list], 30, keyframe_interval=3, cache_size=2, device="cpu")
+    first = G.fwd_row_offset_ptr
+    G.get_graph(7)
+    assert G.fwd_row_offset_ptr != first
+    G.reset_graph()
+    G.get_graph(0)
+    assert G.in_degrees().tolist() == np.asarray(G._snapshot(0).forward.out_degrees).tolist()
+    assert G.fwd_row_offset_ptr == G._snapshot(0).forward.row_offset_ptr
+
+    with pytest.raises(ValueError, match="at least one"):
+        NaiveGraph([list(e) for e in edge_list], 30, keyframe_interval=0)
@@ -0,0 +1,83 @@
+import numpy as np
+
+from stgraph.graph.dynamic.dynamic_graph import DynamicGraph, pack_edges, unpack_edges
+
+
+class SnapshotGraph(DynamicGraph):
+    '''Keeps only the snapshot diffs of DynamicGraph'''
+    def graph_type(self):
+        return "snapshots"
+
+    def _get_graph_csr_ptrs(self):
+        pass
+
+    def in_degrees(self):
+        pass
+
+    def out_degrees(self):
+        pass
+
+    def _cache_graph(self):
+        pass
+
+    def _get_cached_graph(self, timestamp):
+        return False
+
+    def _update_graph_forward(self):
+        pass
+
+    def _init_reverse_graph(self):
+        pass
+
+    def _update_graph_backward(self):
+        pass
+
+    def _structure(self):
+        pass
+
+    def _advance_structure(self, structure, timestamp):
+        pass
+
+    def _load_structure(self, structure):
+        pass
+
+
+def reference_updates(edge_list):
+    updates = {}
+    prev = set()
+    for t, edges in enumerate(edge_list):
+        cur = set(map(tuple, edges))
+        updates[str(t)] = {
+            "add": sorted(cur - prev, key=lambda x: (x[1], x[0])),
+            "delete": sorted(prev - cur, key=lambda x: (x[1], x[0])),
+        }
+        prev = cur
+    return updates
+
+
+def test_PackEdges():
+    edges = np.array([[3, 1], [0, 2], [7, 1], [2**31 - 1, 0]])
+    keys = pack_edges(edges)
+    assert (unpack_edges(keys) == edges).all()
+    # Keys order the edges by (dst, src)
+    assert unpack_edges(np.sort(keys)).tolist() == [[2**31 - 1, 0], [3, 1], [7, 1], [0, 2]]
+    assert pack_edges([]).shape == (0,)
+
+
+def test_SnapshotDiff():
+    rng = np.random.default_rng(0)
+    edge_list = []
+    for t in range(6):
+        edges = rng.integers(0, 20, size=(60, 2))
+        # Tuple lists as produced by the dataloaders, with duplicate edges
+        edge_list.append([tuple(e) for e in edges.tolist()] + [tuple(edges[0].tolist())])
+    edge_list.append([])
+    G = SnapshotGraph(edge_list, 20)
+
+    ref = reference_updates(edge_list)
+    assert G.graph_updates.keys() == ref.keys()
+    for t, update in G.graph_updates.items():
+        for kind in ["add", "delete"]:
+            assert update[kind].dtype == np.int32 and update[kind].shape[1] == 2
+            assert [tuple(e) for e in update[kind].tolist()] == ref[t][kind]
+        assert G.graph_attr[t] == (20, len(set(edge_list[int(t)])))
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from stgraph.graph.static.static_graph import StaticGraph
+
+
+def csr_arrays(csr):
+    return [np.asarray(getattr(csr, name)).tolist() for name in
+            ["row_offset", "column_indices", "eids", "in_degrees", "out_degrees", "weighted_out_degrees"]]
+
+
+def test_ArrayInputMatchesTupleList():
+    rng = np.random.default_rng(0)
+    num_nodes = 25
+    edges = np.unique(rng.integers(0, num_nodes, size=(150, 2)), axis=0)
+    weights = rng.random(len(edges)).astype(np.float32)
+
+    # Tuple lists are presorted by (dst, src) along with their weights
+    presorted = np.lexsort((edges[:, 0], edges[:, 1]))
+    G_list = StaticGraph([tuple(e) for e in edges[presorted].tolist()], weights[presorted], num_nodes)
+
+    shuffle = rng.permutation(len(edges))
+    G = StaticGraph(edges[shuffle].T.copy(), weights[shuffle], num_nodes)
+    assert G.get_num_edges() == G_list.get_num_edges()
+    assert csr_arrays(G._forward_graph) == csr_arrays(G_list._forward_graph)
+    assert csr_arrays(G._backward_graph) == csr_arrays(G_list._backward_graph)
+
+    # The features of the array columns are brought to the eid order
+    assert (edges[shuffle][G.edge_perm] == edges[presorted]).all()
+    assert G_list.edge_perm is None
+
+
+def test_ArrayInputShape():
+    with pytest.raises(ValueError, match="shape"):
+        StaticGraph(np.zeros((3, 4), dtype=np.int64), np.ones(4), 5, device="cpu")